@@ -0,0 +1,86 @@
+# author: Arthur Loureiro <arthur.loureiro@fysik.su.se>
+# license: BSD 3-Clause
+'''
+Scaling of the multi-threaded encryption and decryption of large files.
+
+Encrypts and decrypts a random file with an increasing number of worker
+threads and reports the throughput and the speed-up over one worker::
+
+    python benchmarks/encryption_scaling.py --size_mb 1024 --workers 1 2 4 8 16
+
+Put the file on the disk you care about with ``--directory``: once the
+ciphers are fast enough, the scaling is limited by the disk bandwidth.
+'''
+import os
+import time
+import argparse
+import tempfile
+
+from smokescreen.encryption import encrypt_file, decrypt_file, DEFAULT_CHUNK_SIZE
+
+
+def _write_random_file(path, size_bytes, block=2**24):
+    with open(path, "wb") as file:
+        written = 0
+        while written < size_bytes:
+            chunk = os.urandom(min(block, size_bytes - written))
+            file.write(chunk)
+            written += len(chunk)
+
+
+def run(size_mb, workers_list, chunk_size=DEFAULT_CHUNK_SIZE, repeats=3, directory=None):
+    """
+    Times encryption and decryption for each number of workers.
+
+    Returns
+    -------
+    list
+        ``(workers, encrypt_seconds, decrypt_seconds)`` with the best of
+        ``repeats`` runs.
+    """
+    results = []
+    with tempfile.TemporaryDirectory(dir=directory) as tmp_dir:
+        path = os.path.join(tmp_dir, "benchmark.sacc")
+        _write_random_file(path, size_mb * 2**20)
+        encrypted_path = os.path.join(tmp_dir, "benchmark.encrpt")
+        key_path = os.path.join(tmp_dir, "benchmark.key")
+        for workers in workers_list:
+            encrypt_times, decrypt_times = [], []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                encrypt_file(path, save_file=True, keep_original=True, return_data=False,
+                             chunk_size=chunk_size, workers=workers)
+                encrypt_times.append(time.perf_counter() - start)
+                start = time.perf_counter()
+                decrypt_file(encrypted_path, key_path, save_file=True, return_data=False,
+                             workers=workers)
+                decrypt_times.append(time.perf_counter() - start)
+            results.append((workers, min(encrypt_times), min(decrypt_times)))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size_mb", type=int, default=256, help="size of the test file in MiB")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8],
+                        help="numbers of worker threads to time")
+    parser.add_argument("--chunk_size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="plaintext chunk size in bytes")
+    parser.add_argument("--repeats", type=int, default=3, help="runs per configuration")
+    parser.add_argument("--directory", default=None, help="directory of the test files")
+    args = parser.parse_args()
+
+    results = run(args.size_mb, args.workers, args.chunk_size, args.repeats, args.directory)
+    base_encrypt, base_decrypt = results[0][1], results[0][2]
+    print(f"{args.size_mb} MiB file, {args.chunk_size} byte chunks, {os.cpu_count()} CPUs")
+    print(f"{'workers':>8} {'encrypt MB/s':>13} {'speed-up':>9} {'decrypt MB/s':>13} {'speed-up':>9}")
+    for workers, encrypt_seconds, decrypt_seconds in results:
+        print(f"{workers:>8} {args.size_mb / encrypt_seconds:>13.1f} "
+              f"{base_encrypt / encrypt_seconds:>9.2f} "
+              f"{args.size_mb / decrypt_seconds:>13.1f} "
+              f"{base_decrypt / decrypt_seconds:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
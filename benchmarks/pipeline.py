@@ -0,0 +1,313 @@
+# author: Arthur Loureiro <arthur.loureiro@fysik.su.se>
+# license: BSD 3-Clause
+'''
+Timings of the stages of the concealment pipeline.
+
+Runs the examples shipped in ``examples/`` (cosmic shear, supernovae and
+the LSST Y1 3x2pt, if its SACC file is present) through the stages of
+``smokescreen datavector`` and times each of them:
+
+- ``load_sacc_file``
+- ``conceal_init``: ``ConcealDataVector.__init__`` (likelihood load and verification)
+- ``calculate_concealing_factor``
+- ``save_concealed_datavector`` (including applying the concealing factor)
+- ``encrypt_file`` and ``decrypt_file``
+
+The same stages, and the saving of the SACC file (``save_sacc``), are
+timed on synthetic 3x2pt inputs of growing size, made with
+:mod:`smokescreen.synthetic` (``--sizes`` source and lens tracers, ``--n_ell``
+ell bins) in FITS and HDF5, with the matching synthetic likelihood.
+
+The results are written to ``benchmarks/results/<version>.json``, so they
+can be kept for each release, and compared with earlier ones::
+
+    python benchmarks/pipeline.py --repeats 5
+    python benchmarks/pipeline.py --synthetic_only --sizes 5 10 --covariance dense
+    python benchmarks/pipeline.py --compare benchmarks/results/1.4.0.json
+
+The concealment stages need firecrown installed; ``--synthetic_only
+--io_only`` only times the SACC I/O and encryption of the synthetic inputs.
+'''
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import datetime
+import subprocess
+import numpy as np
+import yaml
+
+from smokescreen import __version__
+from smokescreen.encryption import encrypt_file, decrypt_file
+from smokescreen.utils import load_sacc_file, load_cosmology_from_partial_dict, _MODULE_CACHE
+from smokescreen.synthetic import make_synthetic_sacc, LIKELIHOOD_PATH as SYNTHETIC_LIKELIHOOD
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+EXAMPLES = {
+    "cosmic_shear": "examples/cosmic_shear/blind_cosmic_shear_example.yaml",
+    "supernovae": "examples/supernovae/blind_sn_example.yaml",
+    "lsst_3x2pt": "examples/lsst_3x2pt/conceal_lsst_y1_3x2pt_blind_A.yaml",
+}
+# shifts of the synthetic benchmarks, the synthetic likelihood uses sigma8
+SYNTHETIC_SHIFTS = {"Omega_c": (0.20, 0.39), "sigma8": (0.70, 0.90)}
+
+
+class _StageTimer():
+    """
+    Collects the wall time of named stages over several repeats.
+    """
+    def __init__(self):
+        self.times = {}
+
+    def __call__(self, stage, function, *args, **kwargs):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        self.times.setdefault(stage, []).append(time.perf_counter() - start)
+        return result
+
+    def summary(self):
+        return {stage: {"best": min(times), "mean": float(np.mean(times)), "runs": len(times)}
+                for stage, times in self.times.items()}
+
+
+def _encryption_stages(timer, path, tmp_dir):
+    root_name = os.path.splitext(os.path.basename(path))[0]
+    timer("encrypt_file", encrypt_file, path, tmp_dir, save_file=True,
+          keep_original=True, return_data=False)
+    timer("decrypt_file", decrypt_file, os.path.join(tmp_dir, f"{root_name}.encrpt"),
+          os.path.join(tmp_dir, f"{root_name}.key"), save_file=True, return_data=False)
+
+
+def _load_config(config_path):
+    """
+    Reads an example configuration, resolving its paths relative to it.
+    """
+    with open(config_path) as file:
+        config = yaml.safe_load(file)
+    directory = os.path.dirname(config_path)
+    for key in ("path_to_sacc", "likelihood_path"):
+        config[key] = os.path.normpath(os.path.join(directory, config[key]))
+    return config
+
+
+def _conceal_stages(timer, cosmo, likelihood_path, shifts_dict, sacc_path, tmp_dir,
+                    systematics=None, seed=2112, shift_distribution="flat", shift_type="add"):
+    """
+    Times the stages of ``smokescreen datavector`` on a SACC file.
+
+    Returns
+    -------
+    int
+        Size of the data vector.
+    """
+    # imported here so the I/O benchmarks run without firecrown
+    from smokescreen.datavector import ConcealDataVector
+
+    root_name = os.path.splitext(os.path.basename(sacc_path))[0]
+    sacc_data, input_format = timer("load_sacc_file", load_sacc_file, sacc_path)
+    # ConcealDataVector caches the likelihood module by path, so without this
+    # every repeat after the first would only time a cache hit
+    _MODULE_CACHE.clear()
+    smoke = timer("conceal_init", ConcealDataVector, cosmo, likelihood_path, shifts_dict,
+                  sacc_data, systematics, seed, shift_distr=shift_distribution,
+                  input_format=input_format)
+    timer("calculate_concealing_factor", smoke.calculate_concealing_factor,
+          factor_type=shift_type)
+
+    def save():
+        smoke.apply_concealing_to_likelihood_datavec()
+        smoke.save_concealed_datavector(tmp_dir, root_name, output_format=input_format)
+    timer("save_concealed_datavector", save)
+    _encryption_stages(timer, sacc_path, tmp_dir)
+    return len(sacc_data)
+
+
+def benchmark_example(config_path, repeats):
+    """
+    Times the stages of the concealment of an example.
+
+    Returns
+    -------
+    dict or None
+        Size of the data vector and timings of each stage, or None if the
+        SACC file of the example is not available.
+    """
+    import pyccl as ccl
+
+    config = _load_config(config_path)
+    if not os.path.exists(config["path_to_sacc"]):
+        print(f"Skipping {config_path}: {config['path_to_sacc']} not found")
+        return None
+    reference_cosmology = config.get("reference_cosmology")
+    if reference_cosmology:
+        cosmo = load_cosmology_from_partial_dict(reference_cosmology)
+    else:
+        cosmo = ccl.CosmologyVanillaLCDM()
+    shifts_dict = {k: tuple(v) if isinstance(v, list) else v
+                   for k, v in config["shifts_dict"].items()}
+
+    timer = _StageTimer()
+    for _ in range(repeats):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            n_data = _conceal_stages(timer, cosmo, config["likelihood_path"], shifts_dict,
+                                     config["path_to_sacc"], tmp_dir,
+                                     systematics=config.get("systematics"),
+                                     seed=config.get("seed", 2112),
+                                     shift_distribution=config.get("shift_distribution", "flat"),
+                                     shift_type=config.get("shift_type", "add"))
+    return {"n_data": n_data, "stages": timer.summary()}
+
+
+def benchmark_synthetic(n_tracers, n_ell, covariance, file_format, repeats, io_only=False):
+    """
+    Times the stages of the concealment of a synthetic 3x2pt input with
+    ``n_tracers`` source and lens tracers.
+
+    With ``io_only``, only the SACC I/O and encryption are timed.
+    """
+    synthetic = make_synthetic_sacc(n_source=n_tracers, n_lens=n_tracers, n_ell=n_ell,
+                                    covariance=covariance)
+    timer = _StageTimer()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, f"synthetic.{file_format}")
+        getattr(synthetic, f"save_{file_format}")(path)
+        size_bytes = os.path.getsize(path)
+        for _ in range(repeats):
+            output_dir = os.path.join(tmp_dir, "output")
+            os.makedirs(output_dir)
+            if io_only:
+                sacc_data, _ = timer("load_sacc_file", load_sacc_file, path)
+                _encryption_stages(timer, path, output_dir)
+            else:
+                import pyccl as ccl
+                _conceal_stages(timer, ccl.CosmologyVanillaLCDM(), SYNTHETIC_LIKELIHOOD,
+                                SYNTHETIC_SHIFTS, path, output_dir)
+                sacc_data = synthetic
+            timer("save_sacc", getattr(sacc_data, f"save_{file_format}"),
+                  os.path.join(output_dir, f"saved.{file_format}"))
+            shutil.rmtree(output_dir)
+    return {"n_data": len(synthetic), "file_bytes": size_bytes, "stages": timer.summary()}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(examples, sizes, formats, repeats, n_ell=20, covariance="block", io_only=False):
+    """
+    Runs the benchmarks and returns the results with the environment.
+    """
+    benchmarks = {}
+    for name in examples:
+        result = benchmark_example(os.path.join(REPO_ROOT, EXAMPLES[name]), repeats)
+        if result is not None:
+            benchmarks[name] = result
+    for n_tracers in sizes:
+        for file_format in formats:
+            name = f"synthetic_{n_tracers}x{n_tracers}_{covariance}_{file_format}"
+            benchmarks[name] = benchmark_synthetic(n_tracers, n_ell, covariance, file_format,
+                                                   repeats, io_only=io_only)
+    return {
+        "smokescreen_version": __version__,
+        "git_commit": _git_commit(),
+        "date": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "repeats": repeats,
+        "benchmarks": benchmarks,
+    }
+
+
+def compare(results, reference, threshold):
+    """
+    Prints the best times of ``results`` against those of ``reference``,
+    flagging stages slower by more than ``threshold``.
+
+    Returns
+    -------
+    list
+        ``(benchmark, stage, ratio)`` of the regressions.
+    """
+    regressions = []
+    print(f"\nCompared with {reference['smokescreen_version']} "
+          f"({reference.get('git_commit') or 'unknown commit'}):")
+    print(f"{'benchmark':<24} {'stage':<28} {'before [s]':>11} {'after [s]':>11} {'ratio':>7}")
+    for name, benchmark in results["benchmarks"].items():
+        reference_stages = reference["benchmarks"].get(name, {}).get("stages", {})
+        for stage, timing in benchmark["stages"].items():
+            if stage not in reference_stages:
+                continue
+            before = reference_stages[stage]["best"]
+            ratio = timing["best"] / before if before > 0 else float("inf")
+            flag = " <-- slower" if ratio > threshold else ""
+            print(f"{name:<24} {stage:<28} {before:>11.4f} {timing['best']:>11.4f} "
+                  f"{ratio:>7.2f}{flag}")
+            if ratio > threshold:
+                regressions.append((name, stage, ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--examples", nargs="+", default=list(EXAMPLES), choices=list(EXAMPLES),
+                        help="examples to run through the whole pipeline")
+    parser.add_argument("--synthetic_only", action="store_true",
+                        help="only run the synthetic benchmarks")
+    parser.add_argument("--io_only", action="store_true",
+                        help="only time the SACC I/O and encryption of the synthetic inputs")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[2, 5, 10],
+                        help="numbers of source (and lens) tracers of the synthetic inputs")
+    parser.add_argument("--n_ell", type=int, default=20, help="ell bins of the synthetic inputs")
+    parser.add_argument("--covariance", default="block", choices=["dense", "block", "diagonal"],
+                        help="covariance structure of the synthetic inputs")
+    parser.add_argument("--formats", nargs="+", default=["fits", "hdf5"],
+                        choices=["fits", "hdf5"], help="formats of the synthetic inputs")
+    parser.add_argument("--repeats", type=int, default=3, help="runs per benchmark")
+    parser.add_argument("--output", default=None,
+                        help="results file, by default benchmarks/results/<version>.json")
+    parser.add_argument("--compare", default=None, help="earlier results file to compare with")
+    parser.add_argument("--threshold", type=float, default=1.2,
+                        help="slow-down ratio reported as a regression")
+    args = parser.parse_args()
+
+    examples = [] if args.synthetic_only else args.examples
+    results = run(examples, args.sizes, args.formats, args.repeats, n_ell=args.n_ell,
+                  covariance=args.covariance, io_only=args.io_only)
+
+    print(f"Smokescreen {results['smokescreen_version']}, {results['cpu_count']} CPUs, "
+          f"best of {args.repeats} runs")
+    print(f"{'benchmark':<24} {'data points':>11} {'stage':<28} {'best [s]':>9} {'mean [s]':>9}")
+    for name, benchmark in results["benchmarks"].items():
+        for stage, timing in benchmark["stages"].items():
+            print(f"{name:<24} {benchmark['n_data']:>11} {stage:<28} "
+                  f"{timing['best']:>9.4f} {timing['mean']:>9.4f}")
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{__version__}.json")
+    with open(output, "w") as file:
+        json.dump(results, file, indent=2)
+    print(f"\nResults saved as {output}")
+
+    if args.compare is not None:
+        with open(args.compare) as file:
+            reference = json.load(file)
+        regressions = compare(results, reference, args.threshold)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
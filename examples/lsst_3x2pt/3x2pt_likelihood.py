@@ -19,6 +19,7 @@ from firecrown.likelihood import (
     Likelihood,
     NamedParameters,
 )
+from smokescreen.utils import covariance_to_dense
 
 
 def build_likelihood(
@@ -76,8 +77,10 @@ def build_likelihood(
         ),
     )
 
+    # covariance_to_dense does not cache the dense matrix on the sacc object,
+    # so only the likelihood holds it
     likelihood_ready = ConstGaussian.create_ready(all_two_point_functions,
-                                                  sacc_data.covariance.dense)
+                                                  covariance_to_dense(sacc_data.covariance))
 
     tools = ModelingTools(ccl_factory=CCLFactory(
         require_nonlinear_pk=True,
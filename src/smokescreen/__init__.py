@@ -1,3 +1,18 @@
 from ._version import __version__  # noqa: F401
 
-from .datavector import ConcealDataVector  # noqa: F401
+# ConcealDataVector pulls in pyccl, sacc and firecrown, which take seconds
+# to import, so it is only imported when first used (PEP 562). This keeps
+# the encrypt/decrypt subcommands, which only need cryptography, fast.
+__all__ = ["ConcealDataVector", "__version__"]
+
+
+def __getattr__(name):
+    if name == "ConcealDataVector":
+        from .datavector import ConcealDataVector
+        globals()[name] = ConcealDataVector
+        return ConcealDataVector
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -1,18 +1,63 @@
 import os
+import sys
 import getpass
-from typing import Union, Dict, Tuple
+import importlib
+from typing import TYPE_CHECKING, Union, Dict, Tuple, List
 from jsonargparse import CLI
 from jsonargparse.typing import Path_drw, Path_fr
-from pyccl import Cosmology as CosmologyType
-import pyccl as ccl
 # warnings related to sacc files
 import warnings
-from smokescreen import ConcealDataVector
 from smokescreen.encryption import encrypt_file, decrypt_file
-from smokescreen.utils import load_cosmology_from_partial_dict, load_sacc_file
+from smokescreen.instrumentation import StageRecorder
+from smokescreen.profiling import run_profiled, summarize_profile, format_profile_summary
 from . import __version__
+# names imported lazily, see _LAZY_IMPORTS. jsonargparse resolves the
+# cosmology type of the datavector subcommands from this block
+if TYPE_CHECKING:
+    import pyccl as ccl
+    from pyccl import Cosmology as CosmologyType
+    from smokescreen.datavector import ConcealDataVector
+    from smokescreen.cache import FiducialCache
+    from smokescreen.utils import (load_cosmology_from_partial_dict, load_sacc_file,
+                                   load_sacc_file_and_content)
 warnings.filterwarnings("ignore")
 
+# pyccl, sacc and firecrown take seconds to import, so they are only imported
+# by the subcommands that need them, keeping encrypt and decrypt fast (PEP 562)
+_LAZY_IMPORTS = {
+    'ccl': ('pyccl', None),
+    'ConcealDataVector': ('smokescreen.datavector', 'ConcealDataVector'),
+    'FiducialCache': ('smokescreen.cache', 'FiducialCache'),
+    'load_cosmology_from_partial_dict': ('smokescreen.utils', 'load_cosmology_from_partial_dict'),
+    'load_sacc_file': ('smokescreen.utils', 'load_sacc_file'),
+    'load_sacc_file_and_content': ('smokescreen.utils', 'load_sacc_file_and_content'),
+}
+
+
+def _lazy_import(name):
+    module_name, attribute = _LAZY_IMPORTS[name]
+    module = importlib.import_module(module_name)
+    value = module if attribute is None else getattr(module, attribute)
+    globals()[name] = value
+    return value
+
+
+def __getattr__(name):
+    if name in _LAZY_IMPORTS:
+        return _lazy_import(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _import_datavector_dependencies():
+    """
+    Imports the dependencies of the datavector subcommands into the module
+    namespace, keeping any that were already set (e.g. patched in tests).
+    """
+    for name in _LAZY_IMPORTS:
+        if name not in globals():
+            _lazy_import(name)
+
+
 # banner to be printed in the terminal
 banner = rf"""
 
@@ -39,10 +84,18 @@ def datavector_main(path_to_sacc: Path_fr,
                     seed: Union[int, str] = 2112,
                     # Note: dict must come first in Union for jsonargparse to correctly
                     # parse partial cosmology dictionaries without trying to instantiate Cosmology
-                    reference_cosmology: Union[dict, CosmologyType] = ccl.CosmologyVanillaLCDM(),
+                    reference_cosmology: Union[dict, "CosmologyType", None] = None,
                     path_to_output: Path_drw = None,
                     keep_original_sacc: bool = False,
                     output_suffix: str = None,
+                    fiducial_cache_dir: str = None,
+                    parallel_theory: bool = False,
+                    verify_sacc: str = 'full',
+                    compress_covariance: bool = False,
+                    fast_output: bool = False,
+                    report_json: str = None,
+                    amplitude_fast_path: bool = False,
+                    share_background: bool = False,
                     ) -> None:
     r"""Main function to conceal a SACC file using a firecrown likelihood.
 
@@ -60,45 +113,89 @@ def datavector_main(path_to_sacc: Path_fr,
         reference_cosmology (Union[CosmologyType, dict]):
             Cosmology object or dictionary with cosmological
             parameters you want different than the VanillaLCDM as reference cosmology.
-            Defaults to ccl.CosmologyVanillaLCDM().
+            Defaults to None [ccl.CosmologyVanillaLCDM()].
         path_to_output (str): Path to save the blinded sacc file. Defaults to None.
         keep_original_sacc (bool): If True, keeps the original sacc file.
             Defaults to False [keeps only the encrypted file].
         output_suffix (str): Custom suffix for the output file name.
             Defaults to None (uses 'concealed_data_vector').
+        fiducial_cache_dir (str): Directory of the on-disk cache of fiducial theory vectors.
+            Re-concealing the same data with the same likelihood, reference cosmology and
+            systematics loads the fiducial theory vector from it. Defaults to None (no cache).
+        parallel_theory (bool): If True, computes the fiducial and concealed theory vectors
+            concurrently in two worker processes. Defaults to False.
+        verify_sacc (str): How thoroughly the SACC file is checked against the likelihood.
+            Options are 'none', 'hash', 'blockwise' and 'full'. Defaults to 'full'.
+        compress_covariance (bool): If True, a full covariance with block-diagonal
+            structure is stored as blocks, reducing the memory footprint. Defaults to False.
+        fast_output (bool): If True, the concealed file is written by copying the input
+            file and rewriting only the data-point values and metadata. Defaults to False.
+        report_json (str): Path of a JSON report with the wall time, CPU time and peak
+            memory of each stage of the run. Defaults to None (no report).
+        amplitude_fast_path (bool): If True and only sigma8 or A_s is shifted, the concealed
+            cosmology is built by rescaling the fiducial linear power spectrum instead of
+            being computed in full. Other shifts are computed in full. Defaults to False.
+        share_background (bool): If True, the growth of the reference cosmology is reused
+            for the concealed cosmology when the shifts leave it unchanged. Defaults to False.
     """
     print(banner)
-    if isinstance(reference_cosmology, dict):
+    # records the stages only if a report is requested
+    stages = StageRecorder(enabled=report_json is not None)
+    with stages.stage("imports"):
+        _import_datavector_dependencies()
+    if reference_cosmology is None:
+        cosmo = ccl.CosmologyVanillaLCDM()
+    elif isinstance(reference_cosmology, dict):
         cosmo = load_cosmology_from_partial_dict(reference_cosmology)
     else:
         cosmo = reference_cosmology
     # tests if the sacc file exists
     assert os.path.exists(path_to_sacc), f"File {path_to_sacc} does not exist."
     assert os.path.exists(likelihood_path), f"File {likelihood_path} does not exist."
-    # reads the sacc file (returns sacc object and detected format)
-    sacc_data, input_format = load_sacc_file(path_to_sacc)
+    # reads the sacc file once: it is parsed from its content, which is
+    # encrypted at the end; the covariance is parsed when needed
+    with stages.stage("load_sacc"):
+        sacc_data, input_format, sacc_content, sacc_digest = load_sacc_file_and_content(
+            path_to_sacc, lazy_covariance=True)
+    # optional keyword arguments for the smokescreen object
+    conceal_kwargs = {}
+    if fiducial_cache_dir is not None:
+        conceal_kwargs['fiducial_cache'] = FiducialCache(fiducial_cache_dir)
+    if verify_sacc != 'full':
+        conceal_kwargs['verify_level'] = verify_sacc
+    if compress_covariance:
+        conceal_kwargs['compress_covariance'] = True
+    if share_background:
+        conceal_kwargs['share_background'] = True
+    if report_json is not None:
+        conceal_kwargs['stage_recorder'] = stages
     # creates the smokescreen object
     smoke = ConcealDataVector(cosmo,  likelihood_path, shifts_dict, sacc_data, systematics, seed,
-                              shift_distr=shift_distribution, input_format=input_format)
+                              shift_distr=shift_distribution, input_format=input_format,
+                              **conceal_kwargs)
     # blinds the sacc file
-    smoke.calculate_concealing_factor(factor_type=shift_type)
+    factor_kwargs = {'amplitude_fast_path': True} if amplitude_fast_path else {}
+    smoke.calculate_concealing_factor(factor_type=shift_type, parallel=parallel_theory,
+                                      **factor_kwargs)
     # applies the blinding factor to the sacc file
     smoke.apply_concealing_to_likelihood_datavec()
     print(f">> User {getpass.getuser()}",
           f"used Smokescreen on {path_to_sacc} ... it is super effective!")
     # get root name of the input file
     root_name = os.path.splitext(os.path.basename(path_to_sacc))[0]
+    # patches a copy of the input file instead of rewriting the whole sacc
+    save_kwargs = {'input_path': path_to_sacc} if fast_output else {}
     # saves the blinded sacc file
     if path_to_output is not None:
         smoke.save_concealed_datavector(path_to_output, root_name,
                                         output_format=input_format,
-                                        suffix=output_suffix)
+                                        suffix=output_suffix, **save_kwargs)
     else:
         # get the input file directory
         path_to_output = os.path.dirname(path_to_sacc)
         smoke.save_concealed_datavector(path_to_output, root_name,
                                         output_format=input_format,
-                                        suffix=output_suffix)
+                                        suffix=output_suffix, **save_kwargs)
     # Determine extension based on format
     ext = '.hdf5' if input_format == 'hdf5' else '.fits'
     _suffix = output_suffix if output_suffix is not None else "concealed_data_vector"
@@ -106,18 +203,353 @@ def datavector_main(path_to_sacc: Path_fr,
     print(f"\nConcealed sacc file saved as:\n\t{outprintfile}")
 
     print(f"\nEncrypting the original sacc file {path_to_sacc} ...", end="")
-    # encrypt the file
-    encrypted_sacc, key = encrypt_file(path_to_sacc, path_to_output, save_file=True,
-                                       keep_original=keep_original_sacc)
+    # encrypts the content that was concealed, checking it against its digest
+    with stages.stage("encrypt"):
+        encrypted_sacc, key = encrypt_file(path_to_sacc, path_to_output, save_file=True,
+                                           keep_original=keep_original_sacc, return_data=False,
+                                           expected_digest=sacc_digest, data=sacc_content)
+    print("Done!")
+    print(f"Key saved as {path_to_output}/{root_name}.key")
+    if keep_original_sacc is False:
+        print(f"\nOriginal file {path_to_sacc} removed.")
+    if report_json is not None:
+        stages.write_json(report_json, command="datavector", path_to_sacc=str(path_to_sacc))
+        print(f"\nStage report saved as {report_json}")
+
+
+def datavector_batch_main(path_to_sacc: Path_fr,
+                          likelihood_path: str,
+                          blinds: List[dict],
+                          systematics: dict = None,
+                          shift_type: str = 'add',
+                          shift_distribution: str = 'flat',
+                          reference_cosmology: Union[dict, "CosmologyType", None] = None,
+                          path_to_output: Path_drw = None,
+                          keep_original_sacc: bool = False,
+                          fiducial_cache_dir: str = None,
+                          verify_sacc: str = 'full',
+                          compress_covariance: bool = False,
+                          fast_output: bool = False,
+                          report_json: str = None,
+                          threads: int = 1,
+                          share_background: bool = False,
+                          ) -> None:
+    r"""Conceals a SACC file several times with a single likelihood build and fiducial theory vector.
+
+    Args:
+        path_to_sacc (str): Path to the sacc file to blind.
+        likelihood_path (str): Path to the firecrown likelihood module file.
+        blinds (list): List of blinds, each a dictionary with the keys ``shifts_dict``,
+            ``seed`` (defaults to 2112) and ``suffix`` (defaults to 'concealed_data_vector').
+            Example: [{"shifts_dict": {"A_s": 2.0e-09}, "seed": 2112, "suffix": "blind_A"},
+                      {"shifts_dict": {"A_s": 1.8e-09}, "seed": 4224, "suffix": "blind_B"}]
+        systematics (dict): Dictionary with fixed values for the firecrown systematics parameters.
+        shift_type (str): Type of shift to apply to the data vector.
+            Options are 'add' and 'mult'. Defaults to 'add'.
+        shift_distribution (str): Distribution type for the parameter shifts.
+            Options are 'flat' and 'gaussian'. Defaults to 'flat'.
+        reference_cosmology (Union[CosmologyType, dict]):
+            Cosmology object or dictionary with cosmological
+            parameters you want different than the VanillaLCDM as reference cosmology.
+            Defaults to None [ccl.CosmologyVanillaLCDM()].
+        path_to_output (str): Path to save the blinded sacc files. Defaults to None.
+        keep_original_sacc (bool): If True, keeps the original sacc file.
+            Defaults to False [keeps only the encrypted file].
+        fiducial_cache_dir (str): Directory of the on-disk cache of fiducial theory vectors.
+            Defaults to None (no cache).
+        verify_sacc (str): How thoroughly the SACC file is checked against the likelihood.
+            Options are 'none', 'hash', 'blockwise' and 'full'. Defaults to 'full'.
+        compress_covariance (bool): If True, a full covariance with block-diagonal
+            structure is stored as blocks, reducing the memory footprint. Defaults to False.
+        fast_output (bool): If True, the concealed file is written by copying the input
+            file and rewriting only the data-point values and metadata. Defaults to False.
+        report_json (str): Path of a JSON report with the wall time, CPU time and peak
+            memory of each stage of the run. Defaults to None (no report).
+        threads (int): Number of threads concealing the blinds, each with its own
+            likelihood. Defaults to 1 (serial).
+        share_background (bool): If True, the growth of the reference cosmology is reused
+            for the concealed cosmologies when the shifts leave it unchanged. Defaults to False.
+    """
+    print(banner)
+    # records the stages only if a report is requested
+    stages = StageRecorder(enabled=report_json is not None)
+    with stages.stage("imports"):
+        _import_datavector_dependencies()
+    if reference_cosmology is None:
+        cosmo = ccl.CosmologyVanillaLCDM()
+    elif isinstance(reference_cosmology, dict):
+        cosmo = load_cosmology_from_partial_dict(reference_cosmology)
+    else:
+        cosmo = reference_cosmology
+    # tests if the sacc file exists
+    assert os.path.exists(path_to_sacc), f"File {path_to_sacc} does not exist."
+    assert os.path.exists(likelihood_path), f"File {likelihood_path} does not exist."
+    assert len(blinds) > 0, "At least one blind must be given."
+    # yaml gives the (lower, upper) bounds as lists, the shift functions expect tuples
+    blind_specs = []
+    for blind in blinds:
+        shifts = {k: tuple(v) if isinstance(v, list) else v
+                  for k, v in blind['shifts_dict'].items()}
+        blind_specs.append((shifts, blind.get('seed', 2112), blind.get('suffix', None)))
+    # reads the sacc file once: it is parsed from its content, which is
+    # encrypted at the end; the covariance is parsed when needed
+    with stages.stage("load_sacc"):
+        sacc_data, input_format, sacc_content, sacc_digest = load_sacc_file_and_content(
+            path_to_sacc, lazy_covariance=True)
+    # optional keyword arguments for the smokescreen object
+    conceal_kwargs = {}
+    if fiducial_cache_dir is not None:
+        conceal_kwargs['fiducial_cache'] = FiducialCache(fiducial_cache_dir)
+    if verify_sacc != 'full':
+        conceal_kwargs['verify_level'] = verify_sacc
+    if compress_covariance:
+        conceal_kwargs['compress_covariance'] = True
+    if share_background:
+        conceal_kwargs['share_background'] = True
+    if report_json is not None:
+        conceal_kwargs['stage_recorder'] = stages
+    # creates the smokescreen object with the first blind
+    first_shifts, first_seed, _ = blind_specs[0]
+    smoke = ConcealDataVector(cosmo, likelihood_path, first_shifts, sacc_data, systematics,
+                              first_seed, shift_distr=shift_distribution,
+                              input_format=input_format, **conceal_kwargs)
+    # get root name of the input file
+    root_name = os.path.splitext(os.path.basename(path_to_sacc))[0]
+    if path_to_output is None:
+        # get the input file directory
+        path_to_output = os.path.dirname(path_to_sacc)
+    # conceals and saves all the blinds
+    # patches copies of the input file instead of rewriting the whole sacc
+    batch_kwargs = {'input_path': path_to_sacc} if fast_output else {}
+    # conceals the blinds in threads, each with its own likelihood
+    if threads != 1:
+        batch_kwargs['threads'] = threads
+    output_files = smoke.conceal_batch(blind_specs, path_to_output, root_name,
+                                       factor_type=shift_type, output_format=input_format,
+                                       **batch_kwargs)
+    print(f">> User {getpass.getuser()}",
+          f"used Smokescreen {len(blind_specs)} times on {path_to_sacc} ... it is super effective!")
+    print("\nConcealed sacc files saved as:")
+    for outprintfile in output_files:
+        print(f"\t{outprintfile}")
+
+    print(f"\nEncrypting the original sacc file {path_to_sacc} ...", end="")
+    # encrypts the content that was concealed, checking it against its digest
+    with stages.stage("encrypt"):
+        encrypted_sacc, key = encrypt_file(path_to_sacc, path_to_output, save_file=True,
+                                           keep_original=keep_original_sacc, return_data=False,
+                                           expected_digest=sacc_digest, data=sacc_content)
     print("Done!")
     print(f"Key saved as {path_to_output}/{root_name}.key")
     if keep_original_sacc is False:
         print(f"\nOriginal file {path_to_sacc} removed.")
+    if report_json is not None:
+        stages.write_json(report_json, command="datavector-batch", path_to_sacc=str(path_to_sacc))
+        print(f"\nStage report saved as {report_json}")
+
+
+def _conceal_in_memory(path_to_sacc, likelihood_path, shifts_dict, systematics, shift_type,
+                       shift_distribution, seed, reference_cosmology, fiducial_cache_dir,
+                       parallel_theory, verify_sacc, compress_covariance, amplitude_fast_path=False,
+                       share_background=False):
+    """
+    Runs the concealment of ``datavector_main`` without saving or encrypting anything.
+    """
+    _import_datavector_dependencies()
+    if reference_cosmology is None:
+        cosmo = ccl.CosmologyVanillaLCDM()
+    elif isinstance(reference_cosmology, dict):
+        cosmo = load_cosmology_from_partial_dict(reference_cosmology)
+    else:
+        cosmo = reference_cosmology
+    # reads the sacc file as datavector_main does, the file is not encrypted
+    sacc_data, input_format = load_sacc_file(path_to_sacc, lazy_covariance=True)
+    conceal_kwargs = {}
+    if fiducial_cache_dir is not None:
+        conceal_kwargs['fiducial_cache'] = FiducialCache(fiducial_cache_dir)
+    if verify_sacc != 'full':
+        conceal_kwargs['verify_level'] = verify_sacc
+    if compress_covariance:
+        conceal_kwargs['compress_covariance'] = True
+    if share_background:
+        conceal_kwargs['share_background'] = True
+    smoke = ConcealDataVector(cosmo, likelihood_path, shifts_dict, sacc_data, systematics, seed,
+                              shift_distr=shift_distribution, input_format=input_format,
+                              **conceal_kwargs)
+    factor_kwargs = {'amplitude_fast_path': True} if amplitude_fast_path else {}
+    smoke.calculate_concealing_factor(factor_type=shift_type, parallel=parallel_theory,
+                                      **factor_kwargs)
+    smoke.apply_concealing_to_likelihood_datavec()
+
+
+def profile_main(path_to_sacc: Path_fr,
+                 likelihood_path: str,
+                 shifts_dict: Dict[str, Union[float, Tuple[float, float]]],
+                 systematics: dict = None,
+                 shift_type: str = 'add',
+                 shift_distribution: str = 'flat',
+                 seed: Union[int, str] = 2112,
+                 reference_cosmology: Union[dict, "CosmologyType", None] = None,
+                 path_to_output: Path_drw = None,
+                 keep_original_sacc: bool = False,
+                 output_suffix: str = None,
+                 fiducial_cache_dir: str = None,
+                 parallel_theory: bool = False,
+                 verify_sacc: str = 'full',
+                 compress_covariance: bool = False,
+                 fast_output: bool = False,
+                 report_json: str = None,
+                 amplitude_fast_path: bool = False,
+                 share_background: bool = False,
+                 profile_output: str = 'smokescreen_profile.pstats',
+                 top: int = 20,
+                 trace_memory: bool = False,
+                 write_outputs: bool = False,
+                 ) -> None:
+    r"""Profiles the concealment of a SACC file, taking the same options as ``datavector``.
+
+    The run is profiled with cProfile and the statistics are saved as a pstats file
+    (readable with ``python -m pstats`` or snakeviz). A summary of the time spent in
+    pyccl, firecrown, sacc and smokescreen, and of the top functions, is printed and
+    saved next to it. By default nothing else is written: the concealed data vector
+    is computed but neither saved nor encrypted.
+
+    Args:
+        path_to_sacc (str): Path to the sacc file to blind.
+        likelihood_path (str): Path to the firecrown likelihood module file.
+        shifts_dict (dict): Dictionary with fixed values for the firecrown shifts parameters.
+        systematics (dict): Dictionary with fixed values for the firecrown systematics parameters.
+        shift_type (str): Type of shift to apply to the data vector. Defaults to 'add'.
+        shift_distribution (str): Distribution type for the parameter shifts. Defaults to 'flat'.
+        seed (int, str): Seed for the blinding process. Defaults to 2112.
+        reference_cosmology (Union[CosmologyType, dict]): Reference cosmology.
+            Defaults to None [ccl.CosmologyVanillaLCDM()].
+        path_to_output (str): Path to save the blinded sacc file, only used with
+            ``write_outputs``. Defaults to None.
+        keep_original_sacc (bool): Only used with ``write_outputs``. Defaults to False.
+        output_suffix (str): Only used with ``write_outputs``. Defaults to None.
+        fiducial_cache_dir (str): Directory of the on-disk cache of fiducial theory vectors.
+            Defaults to None (no cache).
+        parallel_theory (bool): If True, computes the theory vectors in two worker
+            processes, which are not profiled. Defaults to False.
+        verify_sacc (str): How thoroughly the SACC file is checked against the likelihood.
+            Defaults to 'full'.
+        compress_covariance (bool): If True, stores a block-diagonal covariance as blocks.
+            Defaults to False.
+        fast_output (bool): Only used with ``write_outputs``. Defaults to False.
+        report_json (str): Only used with ``write_outputs``. Defaults to None.
+        amplitude_fast_path (bool): If True and only sigma8 or A_s is shifted, the concealed
+            cosmology is built by rescaling the fiducial linear power spectrum. Defaults to False.
+        share_background (bool): If True, the growth of the reference cosmology is reused
+            for the concealed cosmology when the shifts leave it unchanged. Defaults to False.
+        profile_output (str): Path of the pstats file. The summary is saved with the
+            ``.txt`` extension. Defaults to 'smokescreen_profile.pstats'.
+        top (int): Number of functions listed in the summary. Defaults to 20.
+        trace_memory (bool): If True, also traces the memory allocations with
+            tracemalloc, which slows the run down. Defaults to False.
+        write_outputs (bool): If True, runs the full ``datavector`` command, saving the
+            concealed file and encrypting (and, unless ``keep_original_sacc``,
+            removing) the original one. Defaults to False.
+    """
+    print(banner)
+    assert os.path.exists(path_to_sacc), f"File {path_to_sacc} does not exist."
+    assert os.path.exists(likelihood_path), f"File {likelihood_path} does not exist."
+    if write_outputs:
+        _, stats, memory = run_profiled(
+            datavector_main, path_to_sacc, likelihood_path, shifts_dict,
+            systematics=systematics, shift_type=shift_type,
+            shift_distribution=shift_distribution, seed=seed,
+            reference_cosmology=reference_cosmology, path_to_output=path_to_output,
+            keep_original_sacc=keep_original_sacc, output_suffix=output_suffix,
+            fiducial_cache_dir=fiducial_cache_dir, parallel_theory=parallel_theory,
+            verify_sacc=verify_sacc, compress_covariance=compress_covariance,
+            fast_output=fast_output, report_json=report_json,
+            amplitude_fast_path=amplitude_fast_path, share_background=share_background,
+            trace_memory=trace_memory)
+    else:
+        print(">> Profiling without writing or encrypting any file.")
+        _, stats, memory = run_profiled(
+            _conceal_in_memory, path_to_sacc, likelihood_path, shifts_dict,
+            systematics=systematics, shift_type=shift_type,
+            shift_distribution=shift_distribution, seed=seed,
+            reference_cosmology=reference_cosmology, fiducial_cache_dir=fiducial_cache_dir,
+            parallel_theory=parallel_theory, verify_sacc=verify_sacc,
+            compress_covariance=compress_covariance, amplitude_fast_path=amplitude_fast_path,
+            share_background=share_background, trace_memory=trace_memory)
+    stats.dump_stats(profile_output)
+    summary = format_profile_summary(summarize_profile(stats, top=top, memory=memory))
+    summary_path = os.path.splitext(profile_output)[0] + ".txt"
+    with open(summary_path, "w") as file:
+        file.write(summary + "\n")
+    print(f"\n{summary}")
+    print(f"\nProfile saved as {profile_output}, summary saved as {summary_path}")
+
+
+def sample_theory_main(path_to_sacc: Path_fr,
+                       likelihood_path: str,
+                       shifts_dict: Dict[str, Union[float, Tuple[float, float]]],
+                       output: str,
+                       n_samples: int = 100,
+                       systematics: dict = None,
+                       shift_distribution: str = 'flat',
+                       seed: Union[int, str] = 2112,
+                       reference_cosmology: Union[dict, "CosmologyType", None] = None,
+                       processes: int = None,
+                       chunk_size: int = 1,
+                       verify_sacc: str = 'full',
+                       ) -> None:
+    r"""Computes the theory vectors over a Latin hypercube of the shifts and saves them to disk.
+
+    The samples are computed by a pool of worker processes, each building the likelihood
+    once, and written to the ``output`` directory as they complete. Running the command
+    again with the same arguments resumes an interrupted run. The SACC file is neither
+    concealed nor encrypted.
+
+    Args:
+        path_to_sacc (str): Path to the sacc file.
+        likelihood_path (str): Path to the firecrown likelihood module file.
+        shifts_dict (dict): Dictionary with the shifts of the parameters. The design spans
+            the (lower, upper) bounds of the flat shifts, or the mean plus or minus four
+            standard deviations of the gaussian ones; fixed shifts are kept fixed.
+        output (str): Directory of the samples (see ``smokescreen.sampling``).
+        n_samples (int): Number of samples. Defaults to 100.
+        systematics (dict): Dictionary with fixed values for the firecrown systematics parameters.
+        shift_distribution (str): Distribution type for the parameter shifts.
+            Options are 'flat' and 'gaussian'. Defaults to 'flat'.
+        seed (int, str): Seed of the design. Defaults to 2112.
+        reference_cosmology (Union[CosmologyType, dict]): Reference cosmology.
+            Defaults to None [ccl.CosmologyVanillaLCDM()].
+        processes (int): Number of worker processes. Defaults to None (all available cores).
+        chunk_size (int): Number of samples computed by a worker at once. Defaults to 1.
+        verify_sacc (str): How thoroughly the SACC file is checked against the likelihood.
+            Defaults to 'full'.
+    """
+    print(banner)
+    _import_datavector_dependencies()
+    if reference_cosmology is None:
+        cosmo = ccl.CosmologyVanillaLCDM()
+    elif isinstance(reference_cosmology, dict):
+        cosmo = load_cosmology_from_partial_dict(reference_cosmology)
+    else:
+        cosmo = reference_cosmology
+    assert os.path.exists(path_to_sacc), f"File {path_to_sacc} does not exist."
+    assert os.path.exists(likelihood_path), f"File {likelihood_path} does not exist."
+    shifts_dict = {k: tuple(v) if isinstance(v, list) else v for k, v in shifts_dict.items()}
+    sacc_data, input_format = load_sacc_file(path_to_sacc, lazy_covariance=True)
+    conceal_kwargs = {}
+    if verify_sacc != 'full':
+        conceal_kwargs['verify_level'] = verify_sacc
+    smoke = ConcealDataVector(cosmo, likelihood_path, shifts_dict, sacc_data, systematics, seed,
+                              shift_distr=shift_distribution, input_format=input_format,
+                              **conceal_kwargs)
+    store = smoke.sample_theory(output, n_samples, processes=processes, chunk_size=chunk_size)
+    print(f">> {int(store.done.sum())} of {n_samples} theory samples saved in {output}")
 
 
 def encrypt_main(path_to_sacc: Path_fr,
                  path_to_save: Path_fr = None,
-                 keep_original: bool = False) -> None:
+                 keep_original: bool = False,
+                 workers: int = 1) -> None:
     """
     [!] WARNING: BY DEFAULT, IT DELETES THE ORIGINAL SACC FILE. [!]
     use the flag --keep_original true to keep the original file.
@@ -133,14 +565,19 @@ def encrypt_main(path_to_sacc: Path_fr,
         by default None [saves in the same directory as the encrypted file].
     keep_original : bool, optional
         If True, keeps the original file, by default False.
+    workers : int, optional
+        Number of threads encrypting the file, by default 1.
     """
     print(banner)
     # check if the file exists
     assert os.path.exists(path_to_sacc), f"File {path_to_sacc} does not exist."
 
     # encrypt the file
+    # only passes the number of workers when it is not the default
+    workers_kwargs = {'workers': workers} if workers != 1 else {}
     encrypted_sacc, key = encrypt_file(path_to_sacc, path_to_save, save_file=True,
-                                       keep_original=keep_original)
+                                       keep_original=keep_original, return_data=False,
+                                       **workers_kwargs)
     print(f"\nSACC file {path_to_sacc} encrypted successfully.")
     if path_to_save is None:
         path_to_save = os.path.dirname(path_to_sacc)
@@ -152,9 +589,18 @@ def encrypt_main(path_to_sacc: Path_fr,
         print(f"\nOriginal file {path_to_sacc} removed.")
 
 
-def decrypt_main(path_to_sacc: Path_fr, path_to_key: Path_fr) -> None:
+def decrypt_main(path_to_sacc: Path_fr, path_to_key: Path_fr, workers: int = 1) -> None:
     """
     This function decrypts a SACC file using a key previously generated by Smokescreen.
+
+    Parameters
+    ----------
+    path_to_sacc : str
+        Path to the encrypted SACC file.
+    path_to_key : str
+        Path to the key used to encrypt the SACC file.
+    workers : int, optional
+        Number of threads decrypting the file, by default 1.
     """
     print(banner)
     # check if the file exists
@@ -166,7 +612,9 @@ def decrypt_main(path_to_sacc: Path_fr, path_to_key: Path_fr) -> None:
     path = os.path.dirname(path_to_sacc)
 
     # decrypt the file
-    _ = decrypt_file(path_to_sacc, path_to_key, save_file=True)
+    workers_kwargs = {'workers': workers} if workers != 1 else {}
+    _ = decrypt_file(path_to_sacc, path_to_key, save_file=True, return_data=False,
+                     **workers_kwargs)
     print(f"\nSACC file {path_to_sacc} decrypted successfully.")
     # Extract original filename from .encrpt pattern
     basename = os.path.basename(path_to_sacc)
@@ -177,19 +625,33 @@ def decrypt_main(path_to_sacc: Path_fr, path_to_key: Path_fr) -> None:
     print(f"\nDecrypted file saved as {path}/{original_name}")
 
 
-def main():  # pragma: no cover
-    CLI({"datavector": datavector_main,
-         "encrypt": encrypt_main,
-         "decrypt": decrypt_main,
-         },
-        as_positional=False,
-        description="Smokescreen CLI Tool")
+# subcommands whose parsers do not need the datavector dependencies
+_LIGHT_COMMANDS = ("encrypt", "decrypt")
+
+
+def main(args=None):
+    """
+    Runs the Smokescreen CLI.
+
+    Parameters
+    ----------
+    args : list, optional
+        Command line arguments, by default None [uses ``sys.argv``].
+    """
+    commands = {"datavector": datavector_main,
+                "datavector-batch": datavector_batch_main,
+                "profile": profile_main,
+                "sample-theory": sample_theory_main,
+                "encrypt": encrypt_main,
+                "decrypt": decrypt_main,
+                }
+    args = sys.argv[1:] if args is None else args
+    # building the datavector parsers imports pyccl to resolve the cosmology
+    # type, so only the requested subcommand is built for encrypt and decrypt
+    if args and args[0] in _LIGHT_COMMANDS:
+        commands = {args[0]: commands[args[0]]}
+    CLI(commands, args=args, as_positional=False, description="Smokescreen CLI Tool")
 
 
 if __name__ == "__main__":  # pragma: no cover
-    CLI({"datavector": datavector_main,
-         "encrypt": encrypt_main,
-         "decrypt": decrypt_main,
-         },
-        as_positional=False,
-        description="Smokescreen CLI Tool")
+    main()
@@ -0,0 +1,174 @@
+# author: Arthur Loureiro <arthur.loureiro@fysik.su.se>
+# license: BSD 3-Clause
+'''
+Amplitude Shifts (:mod:`smokescreen.amplitude`)
+================================================
+
+.. currentmodule:: smokescreen.amplitude
+
+The :mod:`smokescreen.amplitude` module provides the fast path for
+concealments that only shift the amplitude of the power spectrum
+(``sigma8`` or ``A_s``).
+
+The linear matter power spectrum is proportional to ``A_s`` (and to
+``sigma8**2``), while the background and the transfer function do not
+depend on them. The concealed linear power spectrum is therefore the
+fiducial one rescaled, and the Boltzmann computation of the concealed
+cosmology can be skipped: CCL builds the concealed cosmology from the
+tabulated fiducial background and rescaled linear power spectrum
+(:class:`pyccl.CosmologyCalculator`), and computes the non-linear power
+spectrum from it with halofit.
+
+:func:`rescaling_error` checks this reconstruction on the fiducial
+cosmology, where the full computation is available: non-linear models
+other than halofit (e.g. baryonic effects or emulators) are not
+reproduced, and the fast path is refused.
+
+Smokescreen Amplitude Shifts
+----------------------------
+
+.. autofunction:: amplitude_ratio
+.. autofunction:: calculator_args
+.. autofunction:: calculator_cosmology
+.. autofunction:: rescaling_error
+.. autodata:: AMPLITUDE_PARAMETERS
+'''
+import numpy as np
+import pyccl as ccl
+
+# parameters that only set the amplitude of the linear power spectrum
+AMPLITUDE_PARAMETERS = ("sigma8", "A_s")
+# scale factors of the tabulated background (the growth is computed from it)
+_A_BACKGROUND = np.concatenate([np.geomspace(0.01, 0.1, 50, endpoint=False),
+                                np.linspace(0.1, 1.0, 200)])
+# scale factors and wavenumbers [1/Mpc] of the tabulated power spectra,
+# following the CCL power spectrum splines
+_A_PK = np.concatenate([np.geomspace(0.01, 0.1, 11, endpoint=False),
+                        np.linspace(0.1, 1.0, 40)])
+_K_PK = np.geomspace(5e-5, 50.0, 1000)
+# parameters of a pyccl.Cosmology that pyccl.CosmologyCalculator accepts
+_CALCULATOR_PARAMETERS = ("Omega_c", "Omega_b", "h", "n_s", "sigma8", "A_s", "Omega_k",
+                          "Omega_g", "Neff", "m_nu", "mass_split", "w0", "wa", "T_CMB",
+                          "T_ncdm", "mg_parametrization")
+
+
+def amplitude_ratio(fiducial, concealed):
+    """
+    Ratio of the concealed to the fiducial linear power spectrum for an
+    amplitude-only shift.
+
+    Parameters
+    ----------
+    fiducial : dict
+        Fiducial cosmological parameters (``pyccl.Cosmology.to_dict()``).
+    concealed : dict
+        Concealed cosmological parameters.
+
+    Returns
+    -------
+    float
+        ``A_s'/A_s`` or ``(sigma8'/sigma8)**2``.
+
+    Raises
+    ------
+    ValueError
+        If other parameters than ``sigma8`` or ``A_s`` are shifted.
+    """
+    shifted = [key for key in fiducial if concealed.get(key) != fiducial[key]]
+    if len(shifted) != 1 or shifted[0] not in AMPLITUDE_PARAMETERS:
+        raise ValueError("The amplitude fast path needs a shift of only one of "
+                         f"{AMPLITUDE_PARAMETERS}, but {shifted} are shifted.")
+    param = shifted[0]
+    if fiducial[param] is None or concealed[param] is None:
+        raise ValueError(f"{param} must be set in the fiducial and concealed cosmologies")
+    ratio = concealed[param] / fiducial[param]
+    return ratio**2 if param == "sigma8" else ratio
+
+
+def calculator_args(cosmo, amplitude_ratio=1.0):
+    """
+    Tabulated background and linear power spectrum of a cosmology, with
+    the power spectrum rescaled by ``amplitude_ratio``.
+
+    Parameters
+    ----------
+    cosmo : pyccl.Cosmology
+        Cosmology, typically the fiducial one.
+    amplitude_ratio : float, optional
+        Factor multiplying the linear power spectrum, see
+        :func:`amplitude_ratio`. By default 1.
+
+    Returns
+    -------
+    dict
+        ``background`` and ``pk_linear`` in the format of
+        :class:`pyccl.CosmologyCalculator` (and of the ``calculator_args``
+        of firecrown).
+    """
+    pk_linear = np.array([ccl.linear_matter_power(cosmo, _K_PK, a) for a in _A_PK])
+    return {
+        "background": {"a": _A_BACKGROUND,
+                       "chi": ccl.comoving_radial_distance(cosmo, _A_BACKGROUND),
+                       "h_over_h0": ccl.h_over_h0(cosmo, _A_BACKGROUND)},
+        "pk_linear": {"a": _A_PK, "k": _K_PK,
+                      "delta_matter:delta_matter": amplitude_ratio * pk_linear},
+    }
+
+
+def calculator_cosmology(cosmo, args, nonlinear=True):
+    """
+    Builds a :class:`pyccl.CosmologyCalculator` with the parameters of
+    ``cosmo`` and the tabulated ``args``.
+
+    Parameters
+    ----------
+    cosmo : pyccl.Cosmology
+        Cosmology whose parameters are used.
+    args : dict
+        Tabulated background and power spectrum, see :func:`calculator_args`.
+    nonlinear : bool, optional
+        If True, the non-linear power spectrum is computed with halofit.
+        By default True.
+
+    Returns
+    -------
+    pyccl.CosmologyCalculator
+        Cosmology computed from the tables.
+    """
+    params = cosmo.to_dict()
+    params = {key: params[key] for key in _CALCULATOR_PARAMETERS if key in params}
+    return ccl.CosmologyCalculator(**params, **args,
+                                   nonlinear_model="halofit" if nonlinear else None)
+
+
+def rescaling_error(cosmo, args=None, nonlinear=True):
+    """
+    Largest relative difference between the power spectrum of ``cosmo``
+    and the one reconstructed from its tables.
+
+    Parameters
+    ----------
+    cosmo : pyccl.Cosmology
+        Cosmology computed in full.
+    args : dict, optional
+        Tables of ``cosmo``, see :func:`calculator_args`. By default None
+        (computed).
+    nonlinear : bool, optional
+        If True, compares the non-linear power spectra, otherwise the
+        linear ones. By default True.
+
+    Returns
+    -------
+    float
+        Largest relative difference, for scale factors from 0.2 to 1 and
+        wavenumbers from 1e-3 to 10 Mpc^-1.
+    """
+    if args is None:
+        args = calculator_args(cosmo)
+    calculator = calculator_cosmology(cosmo, args, nonlinear=nonlinear)
+    power = ccl.nonlin_matter_power if nonlinear else ccl.linear_matter_power
+    k = np.geomspace(1e-3, 10.0, 60)
+    error = 0.0
+    for a in np.linspace(0.2, 1.0, 9):
+        error = max(error, np.max(np.abs(power(calculator, k, a) / power(cosmo, k, a) - 1)))
+    return float(error)
@@ -0,0 +1,159 @@
+# author: Arthur Loureiro <arthur.loureiro@fysik.su.se>
+# license: BSD 3-Clause
+'''
+Shared Background (:mod:`smokescreen.background`)
+==================================================
+
+.. currentmodule:: smokescreen.background
+
+The :mod:`smokescreen.background` module shares the background (distances
+and expansion rate) and the growth of the fiducial cosmology with a
+concealed cosmology whose shifts leave them unchanged, e.g. shifts of
+``sigma8``, ``A_s`` or ``n_s``. The splines computed by CCL for the
+fiducial cosmology are copied, node by node, into the concealed cosmology
+before CCL computes them, so only the power spectrum is recomputed.
+
+Which products are shared is decided from the parameters of the two
+cosmologies, not from the requested shifts: a product is shared only if
+all the parameters it depends on (:data:`BACKGROUND_PARAMETERS`, plus the
+modified-gravity parametrisation for the growth) are equal.
+
+By default only the growth is shared (:data:`EXACT_PRODUCTS`): everything
+computed by the concealed cosmology is then identical to what CCL computes
+without sharing. The distances and expansion rate can be shared too, but
+CCL rebuilds the inverse ``a(chi)`` spline from shared distances on
+different nodes, so quantities that use it (e.g. the radial kernels of the
+tracers) then agree to about 1e-8 instead of exactly.
+
+Smokescreen Shared Background
+-----------------------------
+
+.. autofunction:: background_tables
+.. autofunction:: invariant_products
+.. autofunction:: share_background
+.. autodata:: BACKGROUND_PARAMETERS
+.. autodata:: EXACT_PRODUCTS
+'''
+import numpy as np
+import pyccl as ccl
+from pyccl.pyutils import _get_spline1d_arrays
+
+# parameters the background and growth depend on (sigma8, A_s and n_s only
+# change the power spectrum)
+BACKGROUND_PARAMETERS = ("Omega_c", "Omega_b", "h", "Omega_k", "Omega_g", "Neff", "m_nu",
+                         "mass_split", "w0", "wa", "T_CMB", "T_ncdm")
+# additional parameters the growth depends on
+_GROWTH_PARAMETERS = ("mg_parametrization",)
+# products CCL rebuilds exactly from their tables
+EXACT_PRODUCTS = ("growth",)
+
+
+def _parameters(cosmo, keys):
+    params = cosmo.to_dict()
+    return {key: params.get(key) for key in keys}
+
+
+def _equal(value, other):
+    if isinstance(value, (float, int, list, tuple, np.ndarray)):
+        return np.array_equal(np.asarray(value), np.asarray(other))
+    return value == other
+
+
+def invariant_products(fiducial, cosmo):
+    """
+    Products of ``fiducial`` that are unchanged in ``cosmo``.
+
+    Parameters
+    ----------
+    fiducial : dict
+        Parameters of the fiducial cosmology, see :func:`background_tables`.
+    cosmo : pyccl.Cosmology
+        Cosmology the products would be shared with.
+
+    Returns
+    -------
+    tuple
+        ``background`` and/or ``growth``.
+    """
+    params = _parameters(cosmo, BACKGROUND_PARAMETERS + _GROWTH_PARAMETERS)
+    if not all(_equal(fiducial[key], params[key]) for key in BACKGROUND_PARAMETERS):
+        return ()
+    if not all(_equal(fiducial[key], params[key]) for key in _GROWTH_PARAMETERS):
+        return ("background",)
+    return ("background", "growth")
+
+
+def background_tables(cosmo):
+    """
+    Splines of the background and growth already computed for ``cosmo``.
+
+    Nothing is computed: the products ``cosmo`` did not need are left out.
+
+    Parameters
+    ----------
+    cosmo : pyccl.Cosmology
+        Fiducial cosmology.
+
+    Returns
+    -------
+    dict
+        The ``parameters`` of ``cosmo`` the products depend on and, if
+        computed, the ``background`` (``a``, ``chi`` and ``h_over_h0``)
+        and the ``growth`` (``a``, unnormalised ``growth_factor`` and
+        ``growth_rate``) at the nodes of the splines.
+    """
+    tables = {"parameters": _parameters(cosmo, BACKGROUND_PARAMETERS + _GROWTH_PARAMETERS)}
+    data = cosmo.cosmo.data
+    if cosmo.has_distances:
+        a, chi = _get_spline1d_arrays(data.chi)
+        _, h_over_h0 = _get_spline1d_arrays(data.E)
+        tables["background"] = {"a": a, "chi": chi, "h_over_h0": h_over_h0}
+    if cosmo.has_growth:
+        a, growth = _get_spline1d_arrays(data.growth)
+        _, growth_rate = _get_spline1d_arrays(data.fgrowth)
+        # the splines hold the growth normalised to 1 today
+        tables["growth"] = {"a": a, "growth_factor": growth * data.growth0,
+                            "growth_rate": growth_rate}
+    return tables
+
+
+def share_background(cosmo, tables, products=EXACT_PRODUCTS):
+    """
+    Copies the background and growth in ``tables`` into ``cosmo`` if they
+    are unchanged in it and it has not computed them yet.
+
+    Parameters
+    ----------
+    cosmo : pyccl.Cosmology
+        Cosmology the products are shared with, before it is used.
+    tables : dict
+        Products of the fiducial cosmology, see :func:`background_tables`.
+    products : tuple, optional
+        Products that may be shared, among ``background`` and ``growth``.
+        Default is :data:`EXACT_PRODUCTS`.
+
+    Returns
+    -------
+    tuple
+        Names of the shared products.
+    """
+    if not isinstance(cosmo, ccl.Cosmology):
+        return ()
+    shared = []
+    for product in invariant_products(tables["parameters"], cosmo):
+        if product not in products or product not in tables:
+            continue
+        table = tables[product]
+        status = 0
+        if product == "background" and not cosmo.has_distances:
+            status = ccl.lib.cosmology_distances_from_input(cosmo.cosmo, table["a"], table["chi"],
+                                                            table["h_over_h0"], status)
+        elif product == "growth" and not cosmo.has_growth:
+            status = ccl.lib.cosmology_growth_from_input(cosmo.cosmo, table["a"],
+                                                         table["growth_factor"],
+                                                         table["growth_rate"], status)
+        else:
+            continue
+        ccl.pyutils.check(status, cosmo)
+        shared.append(product)
+    return tuple(shared)
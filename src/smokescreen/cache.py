@@ -0,0 +1,286 @@
+# author: Arthur Loureiro <arthur.loureiro@fysik.su.se>
+# license: BSD 3-Clause
+'''
+Fiducial Cache (:mod:`smokescreen.cache`)
+===================================================
+
+.. currentmodule:: smokescreen.cache
+
+The :mod:`smokescreen.cache` module provides a two-tier cache
+(in-process LRU plus an on-disk store) for the fiducial theory
+vectors computed by :class:`smokescreen.datavector.ConcealDataVector`.
+
+For a fixed likelihood module, SACC file, reference cosmology and set of
+systematics the fiducial theory vector never changes, so re-concealing the
+same data (e.g. different blinds or seeds) can load it instead of
+recomputing it.
+
+Smokescreen Cache
+-----------------
+
+.. autoclass:: FiducialCache
+   :members:
+
+.. autofunction:: fiducial_cache_key
+'''
+import os
+import json
+import hashlib
+import inspect
+import tempfile
+import functools
+from importlib import metadata
+from collections import OrderedDict
+import numpy as np
+
+from ._version import __version__
+
+
+def _hash_likelihood_source(hasher, likelihood):
+    """
+    Feeds the source code of the likelihood module to the hasher.
+
+    Parameters
+    ----------
+    hasher : hashlib object
+        Hash object to be updated.
+    likelihood : str or module
+        path to the likelihood or a module containing the likelihood
+    """
+    if isinstance(likelihood, str):
+        with open(likelihood, "rb") as file:
+            hasher.update(file.read())
+        return
+    try:
+        source = inspect.getsource(likelihood)
+    except (OSError, TypeError):
+        # modules built on the fly have no source file, so we fall back
+        # to their name and type
+        source = f"{type(likelihood).__module__}.{type(likelihood).__qualname__}:"
+        source += getattr(likelihood, '__name__', '')
+    hasher.update(source.encode('utf-8'))
+
+
+@functools.lru_cache(maxsize=None)
+def _library_versions():
+    """
+    Versions of the libraries computing the theory vector, read from the
+    installed package metadata (without importing them).
+    """
+    versions = {}
+    for package in ("pyccl", "firecrown"):
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+    return versions
+
+
+def _umask_file_mode():
+    """
+    Mode of a new file (0o666) under the umask of the process.
+
+    Reading the umask means setting it, which affects every thread, so it is
+    only done once, at import (see ``_FILE_MODE``).
+    """
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+# mode given to the files written through a temporary file
+_FILE_MODE = _umask_file_mode()
+
+
+def _hash_sacc_content(hasher, sacc_data):
+    """
+    Feeds the content of a SACC object relevant to the theory vector to the hasher.
+
+    The tracers, data points (types, tracer combinations and tags) and mean are
+    hashed. The covariance does not enter the theory vector, so it is skipped
+    to avoid touching a potentially very large matrix.
+
+    Parameters
+    ----------
+    hasher : hashlib object
+        Hash object to be updated.
+    sacc_data : sacc.sacc.Sacc
+        SACC object to be hashed.
+    """
+    for table in sacc_data.to_tables():
+        if table.meta.get('SACCTYPE') in ('covariance', 'metadata'):
+            continue
+        meta = {k: str(v) for k, v in table.meta.items()}
+        hasher.update(json.dumps(meta, sort_keys=True).encode('utf-8'))
+        for column in table.colnames:
+            hasher.update(column.encode('utf-8'))
+            hasher.update(np.ascontiguousarray(table[column]).tobytes())
+    hasher.update(np.ascontiguousarray(sacc_data.mean, dtype=np.float64).tobytes())
+
+
+def fiducial_cache_key(likelihood, sacc_data, cosmo_dict, systematics_dict=None):
+    """
+    Computes the cache key of a fiducial theory vector.
+
+    The key is a hash of the likelihood source, the SACC content, the
+    reference cosmology and the systematics, together with the versions of
+    Smokescreen, pyccl and firecrown, so upgrading any of them invalidates
+    the cached theory vectors.
+
+    Parameters
+    ----------
+    likelihood : str or module
+        path to the likelihood or a module containing the likelihood
+    sacc_data : sacc.sacc.Sacc
+        Data-vector to be concealed.
+    cosmo_dict : dict
+        Dictionary with the reference cosmology parameters.
+    systematics_dict : dict, optional
+        Dictionary with the systematics parameters.
+
+    Returns
+    -------
+    str
+        Hexadecimal digest identifying the fiducial theory vector.
+    """
+    hasher = hashlib.sha256()
+    hasher.update(__version__.encode('utf-8'))
+    hasher.update(json.dumps(_library_versions(), sort_keys=True).encode('utf-8'))
+    _hash_likelihood_source(hasher, likelihood)
+    _hash_sacc_content(hasher, sacc_data)
+    hasher.update(json.dumps(cosmo_dict, sort_keys=True, default=str).encode('utf-8'))
+    hasher.update(json.dumps(systematics_dict, sort_keys=True, default=str).encode('utf-8'))
+    return hasher.hexdigest()
+
+
+class FiducialCache():
+    """
+    Two-tier cache for fiducial theory vectors.
+
+    Entries are kept in an in-process LRU and, if ``cache_dir`` is given,
+    in an on-disk store of ``.npy`` files shared between runs. Both tiers
+    have explicit size limits and evict the least recently used entries.
+
+    Parameters
+    ----------
+    cache_dir : str, optional
+        Directory of the on-disk store. If None, only the in-process
+        tier is used.
+    max_memory_entries : int
+        Maximum number of theory vectors kept in memory. Default is 16.
+    max_disk_bytes : int
+        Maximum total size in bytes of the on-disk store. Default is 1 GB.
+    """
+    def __init__(self, cache_dir=None, max_memory_entries=16, max_disk_bytes=2**30):
+        if max_memory_entries < 0:
+            raise ValueError("max_memory_entries must be non-negative")
+        if max_disk_bytes < 0:
+            raise ValueError("max_disk_bytes must be non-negative")
+        self.cache_dir = cache_dir
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        if self.cache_dir is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npy")
+
+    def get(self, key):
+        """
+        Returns the cached theory vector for ``key``, or None if absent.
+
+        Parameters
+        ----------
+        key : str
+            Cache key, see :func:`fiducial_cache_key`.
+
+        Returns
+        -------
+        np.ndarray or None
+            Copy of the cached theory vector.
+        """
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return self._memory[key].copy()
+        if self.cache_dir is None:
+            return None
+        path = self._disk_path(key)
+        try:
+            value = np.load(path, allow_pickle=False)
+        except (OSError, ValueError):
+            # missing or truncated entry, treat it as a miss
+            return None
+        # refresh the modification time so the disk tier is LRU as well
+        os.utime(path)
+        self._store_in_memory(key, value)
+        return value.copy()
+
+    def put(self, key, value):
+        """
+        Stores a theory vector in both cache tiers.
+
+        Parameters
+        ----------
+        key : str
+            Cache key, see :func:`fiducial_cache_key`.
+        value : np.ndarray
+            Theory vector to be cached.
+        """
+        value = np.array(value, copy=True)
+        self._store_in_memory(key, value)
+        if self.cache_dir is None:
+            return
+        if value.nbytes > self.max_disk_bytes:
+            return
+        # writes to a temporary file first so concurrent runs never see
+        # a partially written entry
+        file_descriptor, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(file_descriptor, "wb") as file:
+            np.save(file, value, allow_pickle=False)
+        # mkstemp creates the file readable by its owner only: the entry
+        # gets the usual mode instead, so other users can share the store
+        os.chmod(tmp_path, _FILE_MODE)
+        os.replace(tmp_path, self._disk_path(key))
+        self._evict_disk()
+
+    def clear(self):
+        """
+        Removes every entry from both cache tiers.
+        """
+        self._memory.clear()
+        if self.cache_dir is None:
+            return
+        for filename in os.listdir(self.cache_dir):
+            if filename.endswith(".npy"):
+                os.remove(os.path.join(self.cache_dir, filename))
+
+    def _store_in_memory(self, key, value):
+        if self.max_memory_entries == 0:
+            return
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self):
+        entries = []
+        for filename in os.listdir(self.cache_dir):
+            if not filename.endswith(".npy"):
+                continue
+            path = os.path.join(self.cache_dir, filename)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:  # pragma: no cover
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        # oldest entries are evicted first
+        for _, size, path in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:  # pragma: no cover
+                pass
+            total -= size
@@ -21,9 +21,14 @@ Conceal Data Vector Class
 import os
 import types
 import inspect
+import queue
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import time
 import datetime
 import getpass
-from copy import deepcopy
+from copy import copy, deepcopy
+from contextlib import contextmanager
 from packaging.version import Version
 import numpy as np
 import pyccl as ccl
@@ -34,14 +39,12 @@ import firecrown
 if Version(firecrown.__version__) >= Version("1.15.0a0"):
     # New structure (1.15.0a0+)
     from firecrown.likelihood import (
-        load_likelihood,
         load_likelihood_from_module_type,
         NamedParameters
     )
 else:
     # Old structure (< 1.15.0a0)
     from firecrown.likelihood.likelihood import (
-        load_likelihood,
         load_likelihood_from_module_type,
         NamedParameters
     )
@@ -52,9 +55,165 @@ from firecrown.utils import save_to_sacc
 from firecrown.ccl_factory import PoweSpecAmplitudeParameter
 
 
+from smokescreen.amplitude import amplitude_ratio, calculator_args, rescaling_error
+from smokescreen.background import background_tables, share_background
+from smokescreen.cache import fiducial_cache_key
+from smokescreen.emulator import TheoryEmulator, latin_hypercube, shift_bounds
+from smokescreen.instrumentation import DISABLED
+from smokescreen.linear_response import LinearResponse, finite_difference_steps
 from smokescreen.param_shifts import draw_flat_or_deterministic_param_shifts
 from smokescreen.param_shifts import draw_gaussian_param_shifts
+from smokescreen.param_shifts import draw_flat_or_deterministic_param_shifts_batch
+from smokescreen.param_shifts import draw_gaussian_param_shifts_batch
+from smokescreen.sampling import TheorySampleStore
 from smokescreen.utils import load_module_from_path, modify_default_params
+from smokescreen.utils import covariance_row_blocks, array_digest, covariance_digest
+from smokescreen.utils import covariance_memory, compress_covariance, patch_sacc_file
+from smokescreen.utils import string_to_seed
+
+# verification levels of the SACC/likelihood consistency check
+VERIFY_LEVELS = ('none', 'hash', 'blockwise', 'full')
+
+
+def _theory_vector_worker(likelihood_path, sacc_data, cosmo_dict, systematics_dict):
+    """
+    Builds the likelihood from ``likelihood_path`` and computes the theory
+    vector for one cosmology. Used to evaluate the fiducial and concealed
+    theory vectors in separate processes, each with its own likelihood.
+    """
+    return _theory_vectors_worker(likelihood_path, sacc_data, [cosmo_dict], systematics_dict)[0]
+
+
+def _theory_vectors_worker(likelihood_path, sacc_data, cosmo_dicts, systematics_dict):
+    """
+    Builds the likelihood from ``likelihood_path`` once and computes the
+    theory vectors for a list of cosmologies.
+    """
+    likelihood, tools = _build_worker_likelihood(likelihood_path, sacc_data)
+    return _evaluate_theory_vectors(likelihood, tools, cosmo_dicts, systematics_dict)[0]
+
+
+def _build_worker_likelihood(likelihood_path, sacc_data):
+    """
+    Builds the likelihood and tools of a worker process from ``likelihood_path``.
+    """
+    build_parameters = NamedParameters({'sacc_data': sacc_data})
+    likelihood_module = load_module_from_path(likelihood_path, use_cache=True)
+    return load_likelihood_from_module_type(likelihood_module, build_parameters)
+
+
+def _evaluate_theory_vectors(likelihood, tools, cosmo_dicts, systematics_dict):
+    """
+    Computes the theory vectors (and their evaluation times) for a list of
+    cosmologies, resetting the likelihood and tools after each of them.
+    """
+    _firecrown_defaults = get_default_params_map(tools, likelihood)
+    theory_vecs, seconds = [], []
+    for cosmo_dict in cosmo_dicts:
+        start = time.perf_counter()
+        params = modify_default_params(_firecrown_defaults, cosmo_dict, systematics_dict)
+        try:
+            tools.update(params)
+            tools.prepare()
+            likelihood.update(params)
+            theory_vecs.append(likelihood.compute_theory_vector(tools))
+        finally:
+            likelihood.reset()
+            tools.reset()
+        seconds.append(time.perf_counter() - start)
+    return theory_vecs, seconds
+
+
+# likelihood and tools of a theory sampling worker process, built once by
+# _init_sample_worker and reused for all its chunks
+_SAMPLE_WORKER = {}
+
+
+def _init_sample_worker(ccl_configuration, likelihood_path, sacc_data, systematics_dict):
+    """
+    Initialises a theory sampling worker process.
+    """
+    _init_worker(ccl_configuration)
+    likelihood, tools = _build_worker_likelihood(likelihood_path, sacc_data)
+    _SAMPLE_WORKER.update(likelihood=likelihood, tools=tools, systematics_dict=systematics_dict)
+
+
+def _sample_worker(indices, cosmo_dicts):
+    """
+    Computes the theory vectors of a chunk of samples in a worker process
+    initialised by :func:`_init_sample_worker`.
+    """
+    theory_vecs, seconds = _evaluate_theory_vectors(_SAMPLE_WORKER['likelihood'],
+                                                    _SAMPLE_WORKER['tools'], cosmo_dicts,
+                                                    _SAMPLE_WORKER['systematics_dict'])
+    return indices, theory_vecs, seconds
+
+
+_CCL_PARAMETERS = ("gsl_params", "spline_params")
+
+
+def _ccl_configuration():
+    """
+    Global CCL accuracy parameters of the current process, to be applied to
+    the theory vector workers by :func:`_init_worker`.
+    """
+    from pyccl._core.parameters.parameters_base import CCLParameters
+    return {name: CCLParameters.get_params_dict(getattr(ccl, name))
+            for name in _CCL_PARAMETERS}
+
+
+def _init_worker(ccl_configuration):
+    """
+    Initialises a theory vector worker process with the global CCL
+    configuration of the parent, so the workers reproduce the serial
+    computation exactly.
+    """
+    for name, values in ccl_configuration.items():
+        params = getattr(ccl, name)
+        for key, value in values.items():
+            if value is not None:
+                params[key] = value
+
+
+def _worker_context():
+    """
+    Multiprocessing context for the theory vector workers. The parent process
+    runs thread pools (CCL, firecrown and the concealing stages), so it is
+    never forked: the workers are started with ``forkserver`` where available
+    and ``spawn`` otherwise, and receive their state through the pool
+    initializer.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")  # pragma: no cover
+
+
+@contextmanager
+def _sharing_background(tools, fiducial_tables, shared):
+    """
+    Shares the background and growth in ``fiducial_tables`` (see
+    :func:`smokescreen.background.share_background`) with the CCL cosmology
+    of ``tools`` as soon as its factory creates it, before
+    ``tools.prepare`` computes anything with it. The names of the shared
+    products are appended to ``shared``.
+    """
+    if fiducial_tables is None:
+        yield
+        return
+    factory = tools.ccl_factory
+    create = factory.create
+
+    def create_and_share(*args, **kwargs):
+        cosmo = create(*args, **kwargs)
+        shared.extend(share_background(cosmo, fiducial_tables))
+        return cosmo
+
+    # set on the instance, bypassing the validation of the factory model
+    object.__setattr__(factory, "create", create_and_share)
+    try:
+        yield
+    finally:
+        object.__delattr__(factory, "create")
 
 
 class ConcealDataVector():
@@ -91,6 +250,26 @@ class ConcealDataVector():
         Type of shift to be applied. Default is "flat".
     debug : bool
         If True, prints debug information. Default is False.
+    fiducial_cache : smokescreen.cache.FiducialCache
+        Cache used to load the fiducial theory vector instead of
+        recomputing it. Default is None (no caching).
+    verify_level : str
+        How thoroughly the SACC data is checked against the likelihood:
+        ``none``, ``hash``, ``blockwise`` or ``full``. Default is ``full``.
+    compress_covariance : bool
+        If True, a full SACC covariance with block-diagonal structure is
+        converted to a block-diagonal (or diagonal) covariance before
+        the likelihood is built. Default is False.
+    stage_recorder : smokescreen.instrumentation.StageRecorder
+        Recorder of the time and memory of the concealment stages (module
+        load, likelihood build, SACC verification, theory vectors and
+        save). Default is None (nothing recorded).
+    share_background : bool
+        If True, the growth computed for the fiducial cosmology is shared
+        with the concealed cosmology when the shifts leave it unchanged
+        (e.g. shifts of ``sigma8`` or ``n_s``), before the concealed
+        cosmology computes anything, see :mod:`smokescreen.background`.
+        The theory vectors are identical. Default is False.
 
 
     """
@@ -99,6 +278,8 @@ class ConcealDataVector():
         """
         unit
         """
+        # records the time and memory of the concealment stages
+        self._stages = kwargs.get('stage_recorder', None) or DISABLED
         # save the cosmology
         self.cosmo = cosmo
         # save the systematics dictionary
@@ -122,10 +303,8 @@ class ConcealDataVector():
 
         # load the shifts
         # Check for 'shift_type' keyword argument
-        if 'shift_distr' in kwargs:
-            self.__shifts = self._load_shifts(seed, shift_distr=kwargs['shift_distr'])
-        else:
-            self.__shifts = self._load_shifts(seed)
+        self._shift_distr = kwargs.get('shift_distr', 'flat')
+        self.__shifts = self._load_shifts(seed, shift_distr=self._shift_distr)
 
         # create concealed cosmology object:
         self.__concealed_cosmo = self._create_concealed_cosmo(self.__shifts)
@@ -137,6 +316,23 @@ class ConcealDataVector():
         else:
             self._debug = False
 
+        # how thoroughly the SACC is checked against the likelihood
+        self._verify_level = kwargs.get('verify_level', 'full')
+        if self._verify_level not in VERIFY_LEVELS:
+            raise ValueError(f"verify_level must be one of {VERIFY_LEVELS}")
+
+        # stores block-diagonal covariances as blocks instead of a dense matrix
+        if kwargs.get('compress_covariance', False) and self.sacc_data.covariance is not None:
+            self.sacc_data.covariance = compress_covariance(self.sacc_data.covariance)
+
+        # cache for the fiducial theory vector
+        self.fiducial_cache = kwargs.get('fiducial_cache', None)
+        # shares the fiducial background and growth with the concealed cosmology
+        self._share_background = kwargs.get('share_background', False)
+        self._background_tables = None
+        # keep the likelihood source to identify the fiducial theory vector
+        self._likelihood_source = likelihood
+
         # load the likelihood
         self.likelihood, self.tools = self._load_likelihood(likelihood,
                                                             self.sacc_data)
@@ -166,45 +362,38 @@ class ConcealDataVector():
             # check if the file can be found
             if not os.path.isfile(likelihood):
                 raise FileNotFoundError(f'Could not find file {likelihood}')
+            # load the module only once: the same module object is tested
+            # and then used to build the likelihood
+            with self._stages.stage("module_load"):
+                likelihood = load_module_from_path(likelihood, use_cache=True)
+        elif not isinstance(likelihood, types.ModuleType):
+            raise TypeError('Likelihood must be a string path to a likelihood module or a module')
 
+        with self._stages.stage("likelihood_build"):
             # test the likelihood
-            self._test_likelihood(likelihood, 'str')
-            # load the likelihood from the file
-            likelihood, tools = load_likelihood(likelihood, build_parameters)
-            # because now firecrown needs to know the amplitude parameter
-            # before we build the likelihood, need to check if we are
-            # concealing the correct parameter
-            self._check_amplitude_parameter(tools)
-
-            # check if the likelihood has a compute_vector method
-            if not hasattr(likelihood, 'compute_theory_vector'):  # pragma: no cover
-                raise AttributeError('Likelihood does not have a compute_vector method')
-
-            # Verify SACC consistency after loading likelihood
-            self._verify_sacc_consistency(likelihood)
-
-            return likelihood, tools
-
-        elif isinstance(likelihood, types.ModuleType):
-            # test the likelihood
-            self._test_likelihood(likelihood, 'module')
+            self._test_likelihood(likelihood)
+            # kept to build more likelihoods for the threaded batch
+            self._likelihood_module = likelihood
 
             # tries to load the likelihood from the module
             likelihood, tools = load_likelihood_from_module_type(likelihood,
                                                                  build_parameters)
-            # because now firecrown needs to know the amplitude parameter
-            # before we build the likelihood, need to check if we are
-            # concealing the correct parameter
-            self._check_amplitude_parameter(tools)
-            # check if the likelihood has a compute_vector method
-            if not hasattr(likelihood, 'compute_theory_vector'):  # pragma: no cover
-                raise AttributeError('Likelihood does not have a compute_vector method')
-
-            # Verify SACC consistency after loading likelihood
+        # because now firecrown needs to know the amplitude parameter
+        # before we build the likelihood, need to check if we are
+        # concealing the correct parameter
+        self._check_amplitude_parameter(tools)
+        # check if the likelihood has a compute_vector method
+        if not hasattr(likelihood, 'compute_theory_vector'):  # pragma: no cover
+            raise AttributeError('Likelihood does not have a compute_vector method')
+
+        # Verify SACC consistency after loading likelihood
+        with self._stages.stage("sacc_verification"):
             self._verify_sacc_consistency(likelihood)
-            return likelihood, tools
-        else:
-            raise TypeError('Likelihood must be a string path to a likelihood module or a module')
+        if self._debug and self.sacc_data.covariance is not None:
+            native_bytes, dense_bytes = covariance_memory(self.sacc_data.covariance)
+            print(f"[DEBUG] SACC covariance ({type(self.sacc_data.covariance).__name__}): "
+                  f"{native_bytes / 2**20:.2f} MB held, {dense_bytes / 2**20:.2f} MB if dense")
+        return likelihood, tools
 
     def _verify_sacc_consistency(self, likelihood):
         """
@@ -215,12 +404,29 @@ class ConcealDataVector():
         - self.sacc_data.mean (user's data vector) vs self.likelihood.get_data_vector()
         - self.sacc_data.covariance (user's covariance) vs self.likelihood.get_cov()
 
+        How thoroughly the covariance is compared depends on the verification
+        level given at construction (``verify_level``):
+
+        - ``none``: no verification.
+        - ``hash``: compares fast digests of the raw arrays. If the digests
+          differ, falls back to ``blockwise`` so tiny floating point
+          differences are still tolerated.
+        - ``blockwise``: walks the SACC covariance blocks and compares them
+          to the likelihood covariance, without building the dense SACC matrix.
+        - ``full``: compares the dense SACC covariance with ``np.allclose``
+          (default). Block-diagonal and diagonal SACC covariances are
+          compared blockwise, which is exact for them.
+
         Raises
         ------
         ValueError
             If the data vector or covariance matrix don't match between
             the user-provided SACC file and the likelihood's internal values.
         """
+        verify_level = getattr(self, '_verify_level', 'full')
+        if verify_level == 'none':
+            return
+
         # Get the internal data vector and covariance from the likelihood
         internal_data_vector = likelihood.get_data_vector()
         internal_covariance = likelihood.get_cov()
@@ -228,12 +434,6 @@ class ConcealDataVector():
         # Get the user-provided SACC data
         user_data_vector = self.sacc_data.mean
 
-        # Handle covariance - it could be None or a dense matrix
-        if self.sacc_data.covariance is not None:
-            user_covariance = self.sacc_data.covariance.dense
-        else:
-            user_covariance = None
-
         # Check data vector consistency
         if not np.allclose(user_data_vector, internal_data_vector, rtol=1e-10, atol=1e-10):
             # Calculate sum of absolute differences for reporting
@@ -246,16 +446,20 @@ class ConcealDataVector():
             )
 
         # Check covariance consistency
+        user_covariance = self.sacc_data.covariance
         if user_covariance is not None and internal_covariance is not None:
-            if not np.allclose(user_covariance, internal_covariance, rtol=1e-10, atol=1e-10):
-                # Calculate norm of difference for reporting
-                cov_diff_norm = np.linalg.norm(user_covariance - internal_covariance)
-
-                raise ValueError(
-                    f"Covariance matrix mismatch between user-provided SACC and likelihood. "
-                    f"Expected shape {internal_covariance.shape}, got {user_covariance.shape}. "
-                    f"Norm of difference: {cov_diff_norm:.6e}"
-                )
+            if verify_level == 'hash':
+                if covariance_digest(user_covariance) == array_digest(internal_covariance):
+                    return
+                verify_level = 'blockwise'
+            if not isinstance(user_covariance, sacc.covariance.FullCovariance):
+                # the blockwise comparison is exact for block-diagonal and
+                # diagonal covariances, so the dense matrix is never needed
+                verify_level = 'blockwise'
+            if verify_level == 'blockwise':
+                self._verify_covariance_blockwise(user_covariance, internal_covariance)
+            else:
+                self._verify_covariance_full(user_covariance.covmat, internal_covariance)
         elif user_covariance is not None and internal_covariance is None:
             raise ValueError(
                 "User-provided SACC has covariance but likelihood returns None for covariance."
@@ -265,23 +469,53 @@ class ConcealDataVector():
                 "Likelihood has covariance but user-provided SACC has None for covariance."
             )
 
-    def _test_likelihood(self, likelihood, like_type):
+    def _verify_covariance_full(self, user_covariance, internal_covariance):
+        """
+        Compares the dense SACC covariance with the likelihood covariance.
+        """
+        if not np.allclose(user_covariance, internal_covariance, rtol=1e-10, atol=1e-10):
+            # Calculate norm of difference for reporting
+            cov_diff_norm = np.linalg.norm(user_covariance - internal_covariance)
+
+            raise ValueError(
+                f"Covariance matrix mismatch between user-provided SACC and likelihood. "
+                f"Expected shape {internal_covariance.shape}, got {user_covariance.shape}. "
+                f"Norm of difference: {cov_diff_norm:.6e}"
+            )
+
+    def _verify_covariance_blockwise(self, user_covariance, internal_covariance):
+        """
+        Compares the SACC covariance with the likelihood covariance block by
+        block, checking that the likelihood covariance is zero outside the
+        SACC blocks. The dense SACC covariance is never built.
+        """
+        size = user_covariance.size
+        if internal_covariance.shape != (size, size):
+            raise ValueError(
+                f"Covariance matrix mismatch between user-provided SACC and likelihood. "
+                f"Expected shape {internal_covariance.shape}, got {(size, size)}."
+            )
+        for row_start, row_stop, col_start, col_stop, block in covariance_row_blocks(user_covariance):
+            internal_rows = internal_covariance[row_start:row_stop]
+            if not (np.allclose(block, internal_rows[:, col_start:col_stop],
+                                rtol=1e-10, atol=1e-10)
+                    and np.allclose(internal_rows[:, :col_start], 0.0, rtol=0.0, atol=1e-10)
+                    and np.allclose(internal_rows[:, col_stop:], 0.0, rtol=0.0, atol=1e-10)):
+                raise ValueError(
+                    f"Covariance matrix mismatch between user-provided SACC and likelihood. "
+                    f"First mismatch in rows {row_start}:{row_stop}."
+                )
+
+    def _test_likelihood(self, likelihood):
         """
         Tests if the likelihood has the required methods.
 
         Parameters
         ----------
-        likelihood : str or module
-            path to the likelihood or a module containing the likelihood
-            must contain both `build_likelihood` and `compute_theory_vector` methods
-        like_type : str
-            Type of likelihood. Can be either 'str' or 'module'.
+        likelihood : module
+            module containing the likelihood, must contain both
+            `build_likelihood` and `compute_theory_vector` methods
         """
-        if like_type == "str":
-            likelihood = load_module_from_path(likelihood)
-        else:
-            likelihood = likelihood
-
         # check if the module has a build_likelihood method
         if not hasattr(likelihood, 'build_likelihood'):
             raise AttributeError('Likelihood does not have a build_likelihood method')
@@ -293,7 +527,7 @@ class ConcealDataVector():
                                                "the likelihood must require a",
                                                "build_parameters NamedParameters object!")
 
-    def _check_amplitude_parameter(self, tools):
+    def _check_amplitude_parameter(self, tools, shifts_dict=None):
         """
         Checks if the amplitude parameter is set in the tools is the same
         as the one in the cosmology and in the concealing dictionary.
@@ -303,6 +537,8 @@ class ConcealDataVector():
         ----------
         tools : firecrown.ccl_factory.CCLFactory
             CCLFactory object with the cosmology and the amplitude parameter.
+        shifts_dict : dict, optional
+            Shifts to check. Default is None (``self.shifts_dict``).
 
         Raises
         ------
@@ -310,6 +546,8 @@ class ConcealDataVector():
         If the amplitude parameter is not supported or if the required parameter
         is not in the cosmology or in the shifts dictionary.
         """
+        if shifts_dict is None:
+            shifts_dict = self.shifts_dict
         _amplitude_param = tools.ccl_factory.amplitude_parameter
 
         if _amplitude_param is PoweSpecAmplitudeParameter.SIGMA8:
@@ -331,8 +569,8 @@ class ConcealDataVector():
             raise ValueError(error_msg)
 
         # check if the required parameter is in the shifts dictionary
-        if any(param in self.shifts_dict for param in ['A_s', 'sigma8']):
-            if _required_param not in self.shifts_dict.keys():
+        if any(param in shifts_dict for param in ['A_s', 'sigma8']):
+            if _required_param not in shifts_dict.keys():
                 error_msg = "Shifts dictionary does not have the required parameter "
                 error_msg += f"{_required_param}"
                 error_msg += _error_msg
@@ -383,7 +621,7 @@ class ConcealDataVector():
                 raise ValueError(f"Systematic {key} not in likelihood systematics")
         return ParamsMap(systematics_dict)
 
-    def _load_shifts(self, seed, shift_distr="flat"):
+    def _load_shifts(self, seed, shift_distr="flat", shifts_dict=None):
         """
         Loads the shifts from the shifts dictionary.
 
@@ -400,17 +638,20 @@ class ConcealDataVector():
             should be the (lower, upper) bounds of the shift widths: PARAM = U(a, b)
             If the first valuee is negative, it is assumed that the parameter
             is to be shifted from the fiducial value: PARAM = FIDUCIAL + U(-a, b)
+            Default is None (``self.shifts_dict``).
 
         Returns
         -------
         dict
             Dictionary of parameter names and corresponding shifts.
         """
+        if shifts_dict is None:
+            shifts_dict = self.shifts_dict
         if shift_distr == "flat":
-            shifts_internal = draw_flat_or_deterministic_param_shifts(self.cosmo, self.shifts_dict, seed)
+            shifts_internal = draw_flat_or_deterministic_param_shifts(self.cosmo, shifts_dict, seed)
             return shifts_internal
         elif shift_distr == "gaussian":
-            return draw_gaussian_param_shifts(self.cosmo, self.shifts_dict, seed)
+            return draw_gaussian_param_shifts(self.cosmo, shifts_dict, seed)
         else:
             raise NotImplementedError('Only flat and gaussian shifts are implemented')
 
@@ -439,7 +680,8 @@ class ConcealDataVector():
         concealed_cosmo = ccl.Cosmology(**concealed_cosmo_dict)
         return concealed_cosmo
 
-    def calculate_concealing_factor(self, factor_type="add"):
+    def calculate_concealing_factor(self, factor_type="add", parallel=False,
+                                    amplitude_fast_path=False, fast_path_rtol=1e-3):
         r"""
         Calculates the concealing (blinding) factor for the data-vector,
             according to Muir et al. 2019:
@@ -448,6 +690,21 @@ class ConcealDataVector():
         ----------
         factor_type : str
             Type of concealing (blinding) factor to be calculated. Default is ``add``.
+        parallel : bool
+            If True, the fiducial and concealed theory vectors are computed
+            concurrently in two worker processes, each building its own
+            likelihood. Requires the likelihood to be given as a file path
+            (or a module loaded from a file). Default is False.
+        amplitude_fast_path : bool
+            If True and only the amplitude (``sigma8`` or ``A_s``) is shifted,
+            the concealed cosmology is built from the fiducial background
+            and rescaled linear power spectrum, skipping its Boltzmann
+            computation (see :mod:`smokescreen.amplitude`). Shifts of other
+            parameters are computed in full. Default is False.
+        fast_path_rtol : float
+            Largest relative error of the power spectrum reconstructed for
+            the fiducial cosmology accepted by the amplitude fast path.
+            Default is 1e-3.
 
         Returns
         -------
@@ -466,46 +723,778 @@ class ConcealDataVector():
         """
         self.factor_type = factor_type
 
+        if amplitude_fast_path and parallel:
+            raise ValueError("The amplitude fast path cannot be combined with parallel=True")
+        if amplitude_fast_path and not self._is_amplitude_shift():
+            # the shift changes more than the amplitude: no shortcut
+            if self._debug:
+                print("[DEBUG] Amplitude fast path: the shift is not amplitude-only, "
+                      "computing the concealed theory vector in full")
+            amplitude_fast_path = False
+
+        if amplitude_fast_path:
+            self._calculate_theory_vectors_rescaled(fast_path_rtol)
+            self.__concealing_factor = self._concealing_factor(self.theory_vec_conceal,
+                                                               self.theory_vec_fid)
+            if self._debug:
+                return self.__concealing_factor
+            return None
+
+        if parallel:
+            with self._stages.stage("parallel_theory"):
+                self._calculate_theory_vectors_parallel()
+            self.__concealing_factor = self._concealing_factor(self.theory_vec_conceal,
+                                                               self.theory_vec_fid)
+            if self._debug:
+                return self.__concealing_factor
+            return None
+
         # need to get the defaults from firecrown:
         _firecrown_defaults = get_default_params_map(self.tools, self.likelihood)
 
-        _params_reference = modify_default_params(_firecrown_defaults,
-                                                  self.cosmo.to_dict(),
-                                                  self.systematics_dict)
-        # update the tools:
-        self.tools.update(_params_reference)
-        # prepare the original cosmology tools:
-        self.tools.prepare()
-        # update the likelihood with the systematics parameters:
-        self.likelihood.update(_params_reference)
         # fiducial theory vector:
-        self.theory_vec_fid = self.likelihood.compute_theory_vector(self.tools)
-        # resets the likelihood and tools
-        self.likelihood.reset()
-        self.tools.reset()
+        self.theory_vec_fid = self._compute_fiducial_theory_vector(_firecrown_defaults)
 
         # now calculates the shifted theory vector:
         # updating the default params with the concealed cosmology:
         __params_concealed = modify_default_params(_firecrown_defaults,
                                                    self.__concealed_cosmo.to_dict(),
                                                    self.systematics_dict)
-        # update the tools:
-        self.tools.update(__params_concealed)
-        # prepare the original cosmology tools:
-        self.tools.prepare()
-        # update the likelihood with the systematics parameters:
-        self.likelihood.update(__params_concealed)
         # concealed theory vector:
-        self.theory_vec_conceal = self.likelihood.compute_theory_vector(self.tools)
+        self.theory_vec_conceal = self._compute_theory_vector(
+            __params_concealed, fiducial_tables=self._background_tables)
+
+        self.__concealing_factor = self._concealing_factor(self.theory_vec_conceal,
+                                                           self.theory_vec_fid)
+        if self._debug:
+            return self.__concealing_factor
+
+    def _likelihood_path(self):
+        """
+        Returns the path of the likelihood module, needed to rebuild the
+        likelihood in worker processes.
 
+        Raises
+        ------
+        ValueError
+            If the likelihood was given as a module without a source file.
+        """
+        if isinstance(self._likelihood_source, str):
+            return self._likelihood_source
+        path = getattr(self._likelihood_source, '__file__', None)
+        if path is None or not os.path.isfile(path):
+            raise ValueError("Parallel theory evaluation needs the likelihood "
+                             "as a file path or a module loaded from a file.")
+        return path
+
+    def _calculate_theory_vectors_parallel(self):
+        """
+        Computes the fiducial and concealed theory vectors concurrently in
+        two worker processes. The fiducial cache is used as in the serial case.
+        """
+        likelihood_path = self._likelihood_path()
+        theory_vec_fid = None
+        if self.fiducial_cache is not None:
+            _cache_key = fiducial_cache_key(self._likelihood_source, self.sacc_data,
+                                            self.cosmo.to_dict(), self.systematics_dict)
+            theory_vec_fid = self.fiducial_cache.get(_cache_key)
+
+        with ProcessPoolExecutor(max_workers=2, mp_context=_worker_context(),
+                                 initializer=_init_worker,
+                                 initargs=(_ccl_configuration(),)) as executor:
+            future_conceal = executor.submit(_theory_vector_worker, likelihood_path,
+                                             self.sacc_data, self.__concealed_cosmo.to_dict(),
+                                             self.systematics_dict)
+            if theory_vec_fid is None:
+                future_fid = executor.submit(_theory_vector_worker, likelihood_path,
+                                             self.sacc_data, self.cosmo.to_dict(),
+                                             self.systematics_dict)
+                theory_vec_fid = future_fid.result()
+                if self.fiducial_cache is not None:
+                    self.fiducial_cache.put(_cache_key, theory_vec_fid)
+            elif self._debug:
+                print("[DEBUG] Fiducial theory vector loaded from cache")
+            self.theory_vec_conceal = future_conceal.result()
+        self.theory_vec_fid = theory_vec_fid
+
+    def _is_amplitude_shift(self):
+        """
+        Whether the concealed cosmology only shifts the amplitude of the
+        fiducial one, see :func:`smokescreen.amplitude.amplitude_ratio`.
+        """
+        try:
+            amplitude_ratio(self.cosmo.to_dict(), self.__concealed_cosmo.to_dict())
+        except ValueError:
+            return False
+        return True
+
+    def _calculate_theory_vectors_rescaled(self, rtol):
+        """
+        Computes the fiducial theory vector in full and the concealed one
+        from the fiducial background and rescaled linear power spectrum.
+
+        Raises
+        ------
+        ValueError
+            If the shift is not amplitude-only, if firecrown cannot build
+            the cosmology from tables, or if the reconstruction of the
+            fiducial power spectrum is off by more than ``rtol`` (e.g. for
+            non-linear models other than halofit).
+        """
+        ratio = amplitude_ratio(self.cosmo.to_dict(), self.__concealed_cosmo.to_dict())
+        if 'calculator_args' not in inspect.signature(self.tools.prepare).parameters:
+            raise ValueError("The amplitude fast path needs a firecrown version whose "
+                             "ModelingTools.prepare accepts calculator_args.")
+        _firecrown_defaults = get_default_params_map(self.tools, self.likelihood)
+        # the fiducial cosmology is needed for the rescaling, so the
+        # fiducial theory vector is always computed in full
+        _params_reference = modify_default_params(_firecrown_defaults, self.cosmo.to_dict(),
+                                                  self.systematics_dict)
+        self.theory_vec_fid = self._compute_theory_vector(_params_reference, stage="fiducial")
+        cosmo_fid = self.tools.get_ccl_cosmology()
+        nonlinear = cosmo_fid.has_nonlin_power
+        if nonlinear and not getattr(self.tools.ccl_factory, 'require_nonlinear_pk', False):
+            raise ValueError("The likelihood uses the non-linear power spectrum, but its CCL "
+                             "factory does not compute it from tables (require_nonlinear_pk).")
+        with self._stages.stage("rescaling_check"):
+            fiducial_args = calculator_args(cosmo_fid)
+            error = rescaling_error(cosmo_fid, fiducial_args, nonlinear=nonlinear)
+        if self._debug:
+            print(f"[DEBUG] Amplitude fast path: ratio {ratio}, fiducial error {error:.2e}")
+        if error > rtol:
+            raise ValueError(f"The rescaled power spectrum is off by {error:.2e} > {rtol} for "
+                             "the fiducial cosmology (e.g. its non-linear model is not "
+                             "halofit), so the amplitude fast path cannot be used.")
+        rescaled_args = dict(fiducial_args)
+        rescaled_args['pk_linear'] = dict(fiducial_args['pk_linear'])
+        rescaled_args['pk_linear']['delta_matter:delta_matter'] = (
+            ratio * fiducial_args['pk_linear']['delta_matter:delta_matter'])
+        self.likelihood.reset()
+        self.tools.reset()
+        if self.fiducial_cache is not None:
+            _cache_key = fiducial_cache_key(self._likelihood_source, self.sacc_data,
+                                            self.cosmo.to_dict(), self.systematics_dict)
+            self.fiducial_cache.put(_cache_key, self.theory_vec_fid)
+
+        __params_concealed = modify_default_params(_firecrown_defaults,
+                                                   self.__concealed_cosmo.to_dict(),
+                                                   self.systematics_dict)
+        self.theory_vec_conceal = self._compute_theory_vector(__params_concealed,
+                                                              calculator_args=rescaled_args)
+
+    def _compute_theory_vector(self, params, stage="concealed", likelihood=None, tools=None,
+                               calculator_args=None, fiducial_tables=None):
+        """
+        Computes the theory vector for a set of parameters.
+
+        Parameters
+        ----------
+        params : firecrown.parameters.ParamsMap
+            Cosmological and systematics parameters.
+        stage : str
+            Prefix of the recorded ``{stage}_prepare`` and ``{stage}_theory``
+            stages. Default is ``concealed``.
+        likelihood, tools : optional
+            Likelihood and modeling tools to use. Default is None
+            (``self.likelihood`` and ``self.tools``).
+        calculator_args : dict, optional
+            Tabulated background and power spectrum the CCL cosmology is
+            built from, instead of computing them. Default is None.
+        fiducial_tables : dict, optional
+            Background and growth of the fiducial cosmology, shared with the
+            cosmology if they are unchanged in it (see
+            :func:`smokescreen.background.share_background`). Default is None.
+
+        Returns
+        -------
+        np.ndarray
+            Theory vector computed by the likelihood.
+        """
+        likelihood = self.likelihood if likelihood is None else likelihood
+        tools = self.tools if tools is None else tools
+        with self._stages.stage(f"{stage}_prepare"):
+            # update the tools:
+            tools.update(params)
+            # prepare the cosmology tools, sharing the fiducial products
+            # before they are computed:
+            shared = []
+            with _sharing_background(tools, fiducial_tables, shared):
+                if calculator_args is None:
+                    tools.prepare()
+                else:
+                    tools.prepare(calculator_args=calculator_args)
+            if fiducial_tables is not None and self._debug:
+                print(f"[DEBUG] Shared with the fiducial cosmology: {tuple(shared)}")
+            # update the likelihood with the systematics parameters:
+            likelihood.update(params)
+        with self._stages.stage(f"{stage}_theory"):
+            return likelihood.compute_theory_vector(tools)
+
+    def _compute_fiducial_theory_vector(self, firecrown_defaults):
+        """
+        Computes the fiducial theory vector, or loads it from the fiducial cache.
+
+        The likelihood and tools are reset after the computation, so they
+        are ready to compute the concealed theory vector.
+
+        Parameters
+        ----------
+        firecrown_defaults : firecrown.parameters.ParamsMap
+            Default parameters of the likelihood and tools.
+
+        Returns
+        -------
+        np.ndarray
+            Fiducial theory vector.
+        """
+        theory_vec_fid = None
+        if self.fiducial_cache is not None:
+            _cache_key = fiducial_cache_key(self._likelihood_source, self.sacc_data,
+                                            self.cosmo.to_dict(), self.systematics_dict)
+            theory_vec_fid = self.fiducial_cache.get(_cache_key)
+
+        if theory_vec_fid is not None:
+            if self._debug:
+                print("[DEBUG] Fiducial theory vector loaded from cache")
+            if self._share_background:
+                # the growth only depends on the parameters compared by
+                # share_background, so the reference cosmology computes it
+                self.cosmo.compute_growth()
+                self._background_tables = background_tables(self.cosmo)
+            return theory_vec_fid
+
+        _params_reference = modify_default_params(firecrown_defaults,
+                                                  self.cosmo.to_dict(),
+                                                  self.systematics_dict)
+        theory_vec_fid = self._compute_theory_vector(_params_reference, stage="fiducial")
+        if self._share_background:
+            # keeps the splines the fiducial cosmology computed before it is reset
+            self._background_tables = background_tables(self.tools.get_ccl_cosmology())
+        # resets the likelihood and tools
+        self.likelihood.reset()
+        self.tools.reset()
+        if self.fiducial_cache is not None:
+            self.fiducial_cache.put(_cache_key, theory_vec_fid)
+        return theory_vec_fid
+
+    def _concealing_factor(self, theory_vec_conceal, theory_vec_fid):
+        """
+        Combines the concealed and fiducial theory vectors into the
+        concealing factor of type ``self.factor_type``.
+        """
         if self.factor_type == "add":
-            self.__concealing_factor = self.theory_vec_conceal - self.theory_vec_fid
+            return theory_vec_conceal - theory_vec_fid
         elif self.factor_type == "mult":
-            self.__concealing_factor = self.theory_vec_conceal / self.theory_vec_fid
+            return theory_vec_conceal / theory_vec_fid
         else:
             raise NotImplementedError('Only "add" and "mult" concealing factor is implemented')
+
+    def conceal_batch(self, blind_specs, path_to_save, file_root,
+                      factor_type="add", output_format=None, input_path=None, threads=1):
+        """
+        Produces several concealed data-vectors from a single likelihood
+        build and a single fiducial theory vector.
+
+        For N blinds this costs N+1 theory evaluations, instead of 2N
+        evaluations and N likelihood builds for N separate runs. After the
+        call, the object holds the state (shifts, seed, concealed data-vector)
+        of the last blind.
+
+        With ``threads > 1`` the blinds are concealed and saved concurrently
+        in threads of this process, each thread with its own likelihood
+        (built from the same module). This needs no process spawn nor
+        pickling, and the results are the same as in the serial case. It
+        speeds the batch up when the theory evaluation releases the GIL
+        (e.g. in CCL) or on free-threaded Python.
+
+        Parameters
+        ----------
+        blind_specs : list
+            List of blinds, each given as a ``(shifts_dict, seed, suffix)``
+            tuple or as a dictionary with keys ``shifts_dict``, ``seed`` and
+            ``suffix``. ``seed`` defaults to the seed of this object and
+            ``suffix`` to ``concealed_data_vector``.
+        path_to_save : str
+            Path to save the concealed data-vectors.
+        file_root : str
+            Root of the file names.
+        factor_type : str
+            Type of concealing (blinding) factor. Default is ``add``.
+        output_format : str, optional
+            Output format to use. If None, uses the detected input format.
+        input_path : str, optional
+            Path of the SACC file ``self.sacc_data`` was loaded from. If given,
+            the outputs are written by patching copies of it, see
+            :meth:`save_concealed_datavector`.
+        threads : int
+            Number of threads concealing the blinds. Default is 1 (serial).
+
+        Returns
+        -------
+        list
+            Paths of the saved concealed data-vectors, in the order of ``blind_specs``.
+        """
+        self.factor_type = factor_type
+        _firecrown_defaults = get_default_params_map(self.tools, self.likelihood)
+        self.theory_vec_fid = self._compute_fiducial_theory_vector(_firecrown_defaults)
+
+        specs = []
+        for spec in blind_specs:
+            if isinstance(spec, dict):
+                specs.append((spec['shifts_dict'], spec.get('seed', self.seed),
+                              spec.get('suffix', None)))
+            else:
+                specs.append(tuple(spec))
+
+        if threads > 1 and len(specs) > 1:
+            blinds = self._conceal_blinds_threaded(specs, threads, _firecrown_defaults,
+                                                   path_to_save, file_root, output_format,
+                                                   input_path)
+            self._set_blind_state(blinds[-1])
+        else:
+            for shifts_dict, seed, suffix in specs:
+                blind = self._conceal_blind(shifts_dict, seed, suffix, self.likelihood,
+                                            self.tools, _firecrown_defaults)
+                self._set_blind_state(blind)
+                self.save_concealed_datavector(path_to_save, file_root,
+                                               output_format=output_format,
+                                               suffix=suffix, input_path=input_path)
+                # resets the likelihood and tools for the next blind
+                self.likelihood.reset()
+                self.tools.reset()
+        return [self._concealed_output_path(path_to_save, file_root, output_format, suffix)
+                for _, _, suffix in specs]
+
+    def _conceal_blind(self, shifts_dict, seed, suffix, likelihood, tools, firecrown_defaults):
+        """
+        Conceals the data-vector for one blind of :meth:`conceal_batch` with
+        the given likelihood and tools, without changing the state of this
+        object, so blinds can be concealed concurrently.
+
+        Returns
+        -------
+        dict
+            The blind: its ``shifts_dict``, ``seed``, ``shifts``,
+            ``concealed_cosmo``, ``theory_vec_conceal``,
+            ``concealing_factor``, ``data_vector`` and
+            ``concealed_data_vector``.
+        """
+        self._check_amplitude_parameter(tools, shifts_dict)
+        shifts = self._load_shifts(seed, shift_distr=self._shift_distr, shifts_dict=shifts_dict)
+        concealed_cosmo = self._create_concealed_cosmo(shifts)
         if self._debug:
-            return self.__concealing_factor
+            print(f"[DEBUG] Blind {suffix} shifts: {shifts}")
+
+        params_concealed = modify_default_params(firecrown_defaults, concealed_cosmo.to_dict(),
+                                                 self.systematics_dict)
+        theory_vec_conceal = self._compute_theory_vector(params_concealed, likelihood=likelihood,
+                                                         tools=tools,
+                                                         fiducial_tables=self._background_tables)
+        concealing_factor = self._concealing_factor(theory_vec_conceal, self.theory_vec_fid)
+        data_vector = likelihood.get_data_vector()
+        return {'shifts_dict': shifts_dict, 'seed': seed, 'shifts': shifts,
+                'concealed_cosmo': concealed_cosmo, 'theory_vec_conceal': theory_vec_conceal,
+                'concealing_factor': concealing_factor, 'data_vector': data_vector,
+                'concealed_data_vector': self._apply_concealing(data_vector, concealing_factor)}
+
+    def _set_blind_state(self, blind):
+        """
+        Sets the state of this object to the blind from :meth:`_conceal_blind`.
+        """
+        self.shifts_dict = blind['shifts_dict']
+        self.seed = blind['seed']
+        self.__shifts = blind['shifts']
+        self.__concealed_cosmo = blind['concealed_cosmo']
+        self.theory_vec_conceal = blind['theory_vec_conceal']
+        self.__concealing_factor = blind['concealing_factor']
+        self.data_vector = blind['data_vector']
+        self.concealed_data_vector = blind['concealed_data_vector']
+
+    def _likelihood_pool(self, n_threads):
+        """
+        Queue of ``n_threads`` likelihoods (and their tools): this object's
+        and ``n_threads - 1`` built from the same module, so that concurrent
+        threads never use the same likelihood.
+        """
+        likelihoods = queue.Queue()
+        likelihoods.put((self.likelihood, self.tools))
+        build_parameters = NamedParameters({'sacc_data': self.sacc_data})
+        for _ in range(n_threads - 1):
+            with self._stages.stage("likelihood_build"):
+                likelihoods.put(load_likelihood_from_module_type(self._likelihood_module,
+                                                                 build_parameters))
+        # a lazily loaded covariance is loaded before the threads share the sacc data
+        _ = self.sacc_data.covariance
+        return likelihoods
+
+    def _conceal_blinds_threaded(self, specs, threads, firecrown_defaults, path_to_save,
+                                 file_root, output_format, input_path):
+        """
+        Conceals and saves the blinds of :meth:`conceal_batch` in ``threads``
+        threads. Every thread takes a likelihood (and its tools) from a pool
+        for each blind, so no likelihood is used by two threads at once.
+
+        Returns
+        -------
+        list
+            The blinds (see :meth:`_conceal_blind`), in the order of ``specs``.
+        """
+        n_threads = min(threads, len(specs))
+        likelihoods = self._likelihood_pool(n_threads)
+
+        def conceal(spec):
+            shifts_dict, seed, suffix = spec
+            likelihood, tools = likelihoods.get()
+            try:
+                blind = self._conceal_blind(shifts_dict, seed, suffix, likelihood, tools,
+                                            firecrown_defaults)
+                with self._stages.stage("save"):
+                    self._save_concealed_datavector(path_to_save, file_root, False,
+                                                    output_format, suffix, input_path,
+                                                    blind['concealed_data_vector'], seed,
+                                                    likelihood.get_sacc_indices())
+                return blind
+            finally:
+                likelihood.reset()
+                tools.reset()
+                likelihoods.put((likelihood, tools))
+
+        with ThreadPoolExecutor(max_workers=n_threads) as executor:
+            return list(executor.map(conceal, specs))
+
+    def linear_response(self, parameters=None, step=1e-3, threads=1, validation_shifts=3):
+        """
+        Computes the linear response of the theory vector to the shifted
+        parameters, to approximate the concealing factor of many shifts
+        without evaluating the likelihood for each of them.
+
+        The Jacobian of the theory vector at the reference cosmology is
+        computed with central finite differences: 2 evaluations per
+        parameter, plus the fiducial theory vector (loaded from the
+        fiducial cache if there is one). With ``threads > 1`` the
+        evaluations run in threads of this process, each with its own
+        likelihood, as in :meth:`conceal_batch`. The approximation is then
+        checked against exact evaluations at the validation points.
+
+        Parameters
+        ----------
+        parameters : list, optional
+            Cosmological parameters of the response. Default is None (the
+            parameters of ``self.shifts_dict``).
+        step : float
+            Finite-difference step relative to the reference values, see
+            :func:`smokescreen.linear_response.finite_difference_steps`.
+            Default is 1e-3.
+        threads : int
+            Number of threads evaluating the theory vectors. Default is 1.
+        validation_shifts : int or list
+            Number of validation points drawn from ``self.shifts_dict`` (for
+            ``parameters``) with the seed and shift distribution of this
+            object, or a list of dictionaries of shifted parameter values.
+            Default is 3.
+
+        Returns
+        -------
+        smokescreen.linear_response.LinearResponse
+            The linear response, with its accuracy at the validation points
+            in ``validation``.
+        """
+        fiducial = self.cosmo.to_dict()
+        if parameters is None:
+            parameters = [key for key in fiducial if key in self.shifts_dict]
+        for name in parameters:
+            if not isinstance(fiducial.get(name), (int, float)):
+                raise ValueError(f"Parameter {name} has no numerical value in the cosmology")
+        self._check_amplitude_parameter(self.tools, dict.fromkeys(parameters))
+        reference = np.array([fiducial[name] for name in parameters], dtype=float)
+        steps = finite_difference_steps(reference, step)
+
+        if isinstance(validation_shifts, int):
+            if self._shift_distr == "flat":
+                draw_batch = draw_flat_or_deterministic_param_shifts_batch
+            else:
+                draw_batch = draw_gaussian_param_shifts_batch
+            shifts_dict = {key: value for key, value in self.shifts_dict.items()
+                           if key in parameters}
+            names, values = draw_batch(self.cosmo, shifts_dict, self.seed, validation_shifts)
+            validation_shifts = [dict(zip(names, row)) for row in values]
+
+        # the reference cosmology moved by +/- step for each parameter, then
+        # the validation points
+        cosmologies = []
+        for i, name in enumerate(parameters):
+            cosmologies.append(dict(fiducial, **{name: reference[i] + steps[i]}))
+            cosmologies.append(dict(fiducial, **{name: reference[i] - steps[i]}))
+        cosmologies += [dict(fiducial, **shifts) for shifts in validation_shifts]
+
+        _firecrown_defaults = get_default_params_map(self.tools, self.likelihood)
+        self.theory_vec_fid = self._compute_fiducial_theory_vector(_firecrown_defaults)
+        with self._stages.stage("linear_response"):
+            theory_vecs = self._theory_vectors(cosmologies, threads, _firecrown_defaults)
+
+        n_differences = 2 * len(parameters)
+        response = LinearResponse.from_finite_differences(
+            parameters, reference, steps, self.theory_vec_fid,
+            theory_vecs[0:n_differences:2], theory_vecs[1:n_differences:2])
+        if validation_shifts:
+            sigma = np.sqrt(np.diag(self.likelihood.get_cov()))
+            response.validation = response.accuracy(validation_shifts,
+                                                    theory_vecs[n_differences:], sigma=sigma)
+            if self._debug:
+                print("[DEBUG] Linear response relative error at the validation points: "
+                      f"{response.validation['add_relative_error']}")
+        return response
+
+    def train_emulator(self, n_train=100, n_validation=10, degree=2, n_components=None,
+                       processes=1, seed=None):
+        """
+        Trains an emulator of the theory vector over the region spanned by
+        the shifts, see :mod:`smokescreen.emulator`.
+
+        The training and validation cosmologies are two Latin hypercubes of
+        the parameters with (lower, upper) bounds (mean +/- 4 std for
+        Gaussian shifts). The deterministic shifts are applied to all of
+        them. With ``processes > 1`` the theory vectors are computed in a
+        process pool, each worker building the likelihood once, which
+        needs the likelihood as a file path (or a module loaded from a file).
+
+        Parameters
+        ----------
+        n_train : int
+            Number of training cosmologies. Default is 100.
+        n_validation : int
+            Number of validation cosmologies. Default is 10.
+        degree : int
+            Degree of the polynomials. Default is 2.
+        n_components : int, optional
+            Number of principal components. Default is None (chosen from
+            the explained variance).
+        processes : int
+            Number of worker processes. Default is 1 (computed in this process).
+        seed : int or str, optional
+            Seed of the Latin hypercubes. Default is None (the seed of
+            this object).
+
+        Returns
+        -------
+        smokescreen.emulator.TheoryEmulator
+            The emulator, with its validation error in ``validation``.
+        """
+        seed = self.seed if seed is None else seed
+        if type(seed) is str:
+            seed = string_to_seed(seed)
+        parameters, bounds = shift_bounds(self.cosmo, self.shifts_dict, self._shift_distr)
+        base = self._emulator_base_cosmology()
+        train_seed, validation_seed = np.random.SeedSequence(seed).generate_state(2)
+        samples = np.concatenate([latin_hypercube(bounds, n_train, int(train_seed)),
+                                  latin_hypercube(bounds, n_validation, int(validation_seed))])
+        cosmologies = [dict(base, **dict(zip(parameters, row))) for row in samples]
+
+        _firecrown_defaults = get_default_params_map(self.tools, self.likelihood)
+        self.theory_vec_fid = self._compute_fiducial_theory_vector(_firecrown_defaults)
+        with self._stages.stage("emulator_training_set"):
+            if processes > 1:
+                theory_vecs = self._theory_vectors_in_processes(cosmologies, processes)
+            else:
+                theory_vecs = self._theory_vectors(cosmologies, 1, _firecrown_defaults)
+
+        emulator = TheoryEmulator.train(parameters, bounds, samples[:n_train],
+                                        theory_vecs[:n_train], self.theory_vec_fid,
+                                        degree=degree, n_components=n_components,
+                                        key=self._emulator_key())
+        if n_validation > 0:
+            emulator.validate(samples[n_train:], theory_vecs[n_train:],
+                              sigma=np.sqrt(np.diag(self.likelihood.get_cov())))
+            if self._debug:
+                print("[DEBUG] Emulator relative error at the validation points: "
+                      f"{emulator.validation['relative_error']}")
+        return emulator
+
+    def emulate_concealing_factor(self, emulator, shifts=None, factor_type="add"):
+        """
+        Predicts the concealing factor with an emulator from
+        :meth:`train_emulator` (or :meth:`smokescreen.emulator.TheoryEmulator.load`).
+
+        The prediction does not change this object: the concealed data
+        vector that is saved is always computed with
+        :meth:`calculate_concealing_factor`.
+
+        Parameters
+        ----------
+        emulator : smokescreen.emulator.TheoryEmulator
+            Emulator trained for the likelihood, data, reference cosmology
+            and deterministic shifts of this object.
+        shifts : dict or array_like, optional
+            Parameter values, see :meth:`smokescreen.emulator.TheoryEmulator.predict`.
+            Default is None (the shifts of this object).
+        factor_type : str
+            Type of concealing factor. Default is ``add``.
+
+        Returns
+        -------
+        np.ndarray
+            Concealing factor, or one concealing factor per row of ``shifts``.
+
+        Raises
+        ------
+        ValueError
+            If the emulator was trained for another likelihood, data,
+            reference cosmology or deterministic shifts.
+        """
+        if emulator.key != self._emulator_key():
+            raise ValueError("The emulator was trained for another likelihood, data, "
+                             "reference cosmology, systematics or deterministic shifts.")
+        if shifts is None:
+            shifts = {key: self.__shifts[key] for key in emulator.parameters}
+        return emulator.concealing_factor(shifts, factor_type=factor_type)
+
+    def sample_theory(self, path, n_samples=100, processes=None, chunk_size=1, seed=None):
+        """
+        Computes the theory vectors of a Latin hypercube over the region
+        spanned by the shifts (see :func:`smokescreen.emulator.shift_bounds`)
+        and streams them to an on-disk store (see :mod:`smokescreen.sampling`).
+
+        The samples are computed in chunks of ``chunk_size`` by a pool of
+        ``processes`` worker processes, each building the likelihood once,
+        and every chunk is written as soon as it is done. Running again with
+        the same store, design and seed only computes the samples that are
+        missing, so an interrupted run can be resumed.
+
+        Parameters
+        ----------
+        path : str
+            Directory of the store.
+        n_samples : int
+            Number of samples of the design. Default is 100.
+        processes : int, optional
+            Number of worker processes. Default is None (all the cores
+            available to this process). With 1, the samples are computed in
+            this process with its likelihood.
+        chunk_size : int
+            Number of samples computed by a worker at once. Default is 1.
+        seed : int or str, optional
+            Seed of the design. Default is None (the seed of this object).
+
+        Returns
+        -------
+        smokescreen.sampling.TheorySampleStore
+            The store.
+        """
+        seed = self.seed if seed is None else seed
+        parameters, bounds = shift_bounds(self.cosmo, self.shifts_dict, self._shift_distr)
+        samples = latin_hypercube(bounds, n_samples, seed)
+        store = TheorySampleStore.open(path, parameters, bounds, samples, seed=seed,
+                                       key=self._emulator_key())
+        base = self._emulator_base_cosmology()
+        pending = store.pending()
+        chunks = [pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+        if self._debug:
+            print(f"[DEBUG] {len(pending)} of {n_samples} theory samples to compute")
+
+        def cosmologies(chunk):
+            return [dict(base, **dict(zip(parameters, samples[i]))) for i in chunk]
+
+        if processes is None:
+            processes = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') \
+                else os.cpu_count()
+        with self._stages.stage("sample_theory"):
+            if processes <= 1:
+                for chunk in chunks:
+                    cosmo_dicts = cosmologies(chunk)
+                    theory_vecs, seconds = _evaluate_theory_vectors(
+                        self.likelihood, self.tools, cosmo_dicts, self.systematics_dict)
+                    store.write(chunk, theory_vecs, cosmo_dicts, seconds)
+            elif chunks:
+                self._sample_theory_in_processes(store, chunks, cosmologies, processes)
+        return store
+
+    def _sample_theory_in_processes(self, store, chunks, cosmologies, processes):
+        """
+        Computes the chunks of samples of :meth:`sample_theory` in a process
+        pool, writing each chunk to the store as it completes.
+        """
+        executor = ProcessPoolExecutor(max_workers=min(processes, len(chunks)),
+                                       mp_context=_worker_context(),
+                                       initializer=_init_sample_worker,
+                                       initargs=(_ccl_configuration(), self._likelihood_path(),
+                                                 self.sacc_data, self.systematics_dict))
+        try:
+            futures = {executor.submit(_sample_worker, chunk, cosmologies(chunk)): chunk
+                       for chunk in chunks}
+            for future in as_completed(futures):
+                indices, theory_vecs, seconds = future.result()
+                store.write(indices, theory_vecs, cosmologies(indices), seconds)
+        finally:
+            # on an interruption, the chunks not started are dropped and the
+            # ones already written are kept for the next run
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _emulator_base_cosmology(self):
+        """
+        Reference cosmology with the deterministic shifts applied.
+        """
+        base = dict(self.cosmo.to_dict())
+        for key, value in self.shifts_dict.items():
+            if not isinstance(value, tuple):
+                base[key] = value
+        return base
+
+    def _emulator_key(self):
+        """
+        Identifier of the likelihood, data, systematics, reference cosmology
+        and deterministic shifts an emulator is trained for.
+        """
+        return fiducial_cache_key(self._likelihood_source, self.sacc_data,
+                                  {'reference': self.cosmo.to_dict(),
+                                   'base': self._emulator_base_cosmology()},
+                                  self.systematics_dict)
+
+    def _theory_vectors_in_processes(self, cosmologies, processes):
+        """
+        Theory vectors for a list of cosmological parameter dictionaries,
+        computed in ``processes`` worker processes, each building the
+        likelihood once.
+        """
+        likelihood_path = self._likelihood_path()
+        chunks = [chunk for chunk in np.array_split(np.arange(len(cosmologies)), processes)
+                  if len(chunk)]
+        with ProcessPoolExecutor(max_workers=len(chunks), mp_context=_worker_context(),
+                                 initializer=_init_worker,
+                                 initargs=(_ccl_configuration(),)) as executor:
+            futures = [executor.submit(_theory_vectors_worker, likelihood_path, self.sacc_data,
+                                       [cosmologies[i] for i in chunk], self.systematics_dict)
+                       for chunk in chunks]
+            return np.array([theory_vec for future in futures for theory_vec in future.result()])
+
+    def _theory_vectors(self, cosmologies, threads, firecrown_defaults):
+        """
+        Theory vectors for a list of cosmological parameter dictionaries,
+        computed in ``threads`` threads.
+        """
+        def compute(cosmo_dict, likelihood, tools):
+            params = modify_default_params(firecrown_defaults, cosmo_dict, self.systematics_dict)
+            try:
+                return np.array(self._compute_theory_vector(params, stage="linear_response",
+                                                            likelihood=likelihood, tools=tools))
+            finally:
+                likelihood.reset()
+                tools.reset()
+
+        n_threads = min(threads, len(cosmologies))
+        if n_threads <= 1:
+            return np.array([compute(cosmo_dict, self.likelihood, self.tools)
+                             for cosmo_dict in cosmologies])
+        likelihoods = self._likelihood_pool(n_threads)
+
+        def compute_pooled(cosmo_dict):
+            likelihood, tools = likelihoods.get()
+            try:
+                return compute(cosmo_dict, likelihood, tools)
+            finally:
+                likelihoods.put((likelihood, tools))
+
+        with ThreadPoolExecutor(max_workers=n_threads) as executor:
+            return np.array(list(executor.map(compute_pooled, cosmologies)))
 
     def apply_concealing_to_likelihood_datavec(self):
         r"""
@@ -524,23 +1513,36 @@ class ConcealDataVector():
         concealing factor.
         """
         self.data_vector = self.likelihood.get_data_vector()
+        self.concealed_data_vector = self._apply_concealing(self.data_vector,
+                                                            self.__concealing_factor)
+        return self.concealed_data_vector
+
+    def _apply_concealing(self, data_vector, concealing_factor):
+        """
+        Applies a concealing factor of type ``self.factor_type`` to a data-vector.
+        """
         if self.factor_type == "add":
-            self.concealed_data_vector = self.data_vector + self.__concealing_factor
+            return data_vector + concealing_factor
         elif self.factor_type == "mult":
-            self.concealed_data_vector = self.data_vector * self.__concealing_factor
+            return data_vector * concealing_factor
         else:
             raise NotImplementedError('Only "add" and "mult" blinding factor is implemented')
-        return self.concealed_data_vector
 
     def save_concealed_datavector(self, path_to_save, file_root,
                                   return_sacc=False, output_format=None,
-                                  suffix=None):
+                                  suffix=None, input_path=None):
         """
         Saves the concealed (blinded) data-vector to a file.
 
         Saves the blinded data-vector to a file with the appropriate extension
         based on the input format: ``.fits`` for FITS files or ``.hdf5`` for HDF5 files.
 
+        If ``input_path`` is given, the output is written by copying that file
+        and rewriting only the data-point values and the metadata, instead of
+        copying and re-serialising the whole SACC. This falls back to the
+        regular output if the file cannot be patched (e.g. it is compressed,
+        has another format or does not hold ``self.sacc_data``).
+
         Parameters
         ----------
         path_to_save : str
@@ -553,43 +1555,106 @@ class ConcealDataVector():
             Output format to use. If None, uses the detected input format.
         suffix : str, optional
             Suffix for the output file name. Defaults to 'concealed_data_vector'.
+        input_path : str, optional
+            Path of the SACC file ``self.sacc_data`` was loaded from, used
+            for the fast output. Default is None.
 
         Returns
         -------
         sacc.sacc.Sacc or None
             If `return_sacc` is True, returns the sacc object with
-            the blinded data-vector. Otherwise, returns None.
+            the blinded data-vector (sharing the covariance object
+            with the original sacc). Otherwise, returns None.
+        """
+        with self._stages.stage("save"):
+            return self._save_concealed_datavector(path_to_save, file_root, return_sacc,
+                                                   output_format, suffix, input_path,
+                                                   self.concealed_data_vector, self.seed,
+                                                   self.likelihood.get_sacc_indices())
+
+    def _save_concealed_datavector(self, path_to_save, file_root, return_sacc,
+                                   output_format, suffix, input_path,
+                                   concealed_data_vector, seed, idx):
+        """
+        Saves ``concealed_data_vector``, see :meth:`save_concealed_datavector`.
+        ``self.sacc_data`` is only read, so blinds can be saved concurrently.
         """
-        if suffix is None:
-            suffix = "concealed_data_vector"
         # Determine output format: use specified format or fall back to input format
         if output_format is None:
             output_format = getattr(self, '_input_format', 'fits')
 
-        idx = self.likelihood.get_sacc_indices()
-        concealed_sacc = save_to_sacc(self.sacc_data,
-                                      self.concealed_data_vector,
-                                      idx)
         # copies the metadata from the original sacc file:
-        concealed_sacc.metadata = self.sacc_data.metadata
+        metadata = dict(self.sacc_data.metadata)
         # adds metadata to the sacc file:
-        concealed_sacc.metadata['concealed'] = True
-        concealed_sacc.metadata['creator'] = getpass.getuser()
-        concealed_sacc.metadata['creation'] = datetime.datetime.now().isoformat()
-        concealed_sacc.metadata['info'] = 'Concealed (blinded) data-vector, created by Smokescreen.'
-        concealed_sacc.metadata['seed_smokescreen'] = self.seed
+        metadata['concealed'] = True
+        metadata['creator'] = getpass.getuser()
+        metadata['creation'] = datetime.datetime.now().isoformat()
+        metadata['info'] = 'Concealed (blinded) data-vector, created by Smokescreen.'
+        metadata['seed_smokescreen'] = seed
+
+        output_path = self._concealed_output_path(path_to_save, file_root,
+                                                  output_format, suffix)
+        patched = False
+        if input_path is not None:
+            patched = self._patch_concealed_file(input_path, output_path, output_format,
+                                                 idx, metadata, concealed_data_vector)
+            if self._debug:
+                print(f"[DEBUG] Concealed data-vector written by patching {input_path}: {patched}")
+        if patched and not return_sacc:
+            return None
 
-        # Determine file extension based on format
-        if output_format == 'hdf5':
-            ext = '.hdf5'
-            save_method = concealed_sacc.save_hdf5
-        else:  # default to FITS
-            ext = '.fits'
-            save_method = concealed_sacc.save_fits
-
-        output_path = f"{path_to_save}/{file_root}_{suffix}{ext}"
-        save_method(output_path, overwrite=True)
+        # the covariance is not changed by the concealing, so it is shared
+        # with the concealed sacc while it is written instead of being
+        # deep-copied with it: the sacc is copied from a shallow copy
+        # without covariance
+        covariance = self.sacc_data.covariance
+        template = copy(self.sacc_data)
+        template.covariance = None
+        concealed_sacc = save_to_sacc(template, concealed_data_vector, idx)
+        concealed_sacc.covariance = covariance
+        concealed_sacc.metadata = metadata
+
+        if not patched:
+            # Determine save method based on format
+            if output_format == 'hdf5':
+                save_method = concealed_sacc.save_hdf5
+            else:  # default to FITS
+                save_method = concealed_sacc.save_fits
+            save_method(output_path, overwrite=True)
         if return_sacc:
+            # the returned sacc owns its covariance, as with save_to_sacc
+            concealed_sacc.covariance = deepcopy(covariance)
             return concealed_sacc
         else:
             return None
+
+    def _patch_concealed_file(self, input_path, output_path, output_format, idx, metadata,
+                              concealed_data_vector):
+        """
+        Writes the concealed data-vector by patching a copy of ``input_path``.
+        Returns False (writing nothing) if the fast output cannot be used.
+        """
+        original_mean = self.sacc_data.mean
+        if idx is None:
+            idx = np.arange(len(original_mean))
+        idx = np.asarray(idx)
+        # the concealed data-vector must cover every data point, as in save_to_sacc
+        if not np.array_equal(np.sort(idx), np.arange(len(original_mean))):
+            return False
+        concealed_mean = original_mean.copy()
+        concealed_mean[idx] = concealed_data_vector
+        return patch_sacc_file(input_path, output_path, original_mean, concealed_mean,
+                               metadata, output_format=output_format)
+
+    def _concealed_output_path(self, path_to_save, file_root, output_format=None, suffix=None):
+        """
+        Returns the path of the concealed data-vector file:
+        ``{path_to_save}/{file_root}_{suffix}.{fits|hdf5}``.
+        """
+        if suffix is None:
+            suffix = "concealed_data_vector"
+        if output_format is None:
+            output_format = getattr(self, '_input_format', 'fits')
+        # Determine file extension based on format
+        ext = '.hdf5' if output_format == 'hdf5' else '.fits'
+        return f"{path_to_save}/{file_root}_{suffix}{ext}"
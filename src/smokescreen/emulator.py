@@ -0,0 +1,384 @@
+# author: Arthur Loureiro <arthur.loureiro@fysik.su.se>
+# license: BSD 3-Clause
+'''
+Theory Emulator (:mod:`smokescreen.emulator`)
+=============================================
+
+.. currentmodule:: smokescreen.emulator
+
+The :mod:`smokescreen.emulator` module provides a lightweight emulator of
+the theory vector of a likelihood over the region spanned by the shifts,
+used to predict concealed theory vectors and blinding-strength diagnostics
+(:func:`delta_chi2`) in milliseconds.
+
+The theory vectors of a Latin hypercube of cosmologies (see
+:func:`latin_hypercube` and
+:meth:`smokescreen.datavector.ConcealDataVector.train_emulator`) are
+standardised and compressed with a principal component analysis (PCA), and
+the principal components are fitted with polynomials of the parameters.
+The emulator, its training set and its validation error are saved to a
+single ``.npz`` file (:meth:`TheoryEmulator.save`) and can be loaded in
+later sessions (:meth:`TheoryEmulator.load`).
+
+The emulator is only meant for exploration: the concealed data vector
+that is saved is always computed with the likelihood.
+
+Smokescreen Theory Emulator
+---------------------------
+
+.. autoclass:: TheoryEmulator
+    :members:
+.. autofunction:: latin_hypercube
+.. autofunction:: shift_bounds
+.. autofunction:: delta_chi2
+'''
+import itertools
+import numpy as np
+from scipy.stats import qmc
+
+from ._version import __version__
+from .utils import string_to_seed
+
+
+def shift_bounds(cosmo, shifts_dict, shift_distr="flat", n_sigma=4.0):
+    """
+    Parameters and bounds of the region spanned by the shifts.
+
+    Parameters
+    ----------
+    cosmo : pyccl.Cosmology
+        Reference cosmology.
+    shifts_dict : dict
+        Shifts, see :class:`smokescreen.datavector.ConcealDataVector`.
+        Deterministic (single value) shifts do not span a region and are
+        left out.
+    shift_distr : str
+        ``flat`` for (lower, upper) bounds or ``gaussian`` for (mean, std).
+        Default is ``flat``.
+    n_sigma : float
+        Half width of the region of a Gaussian shift, in standard
+        deviations. Default is 4.
+
+    Returns
+    -------
+    parameters : list
+        Names of the parameters, in the order of ``cosmo.to_dict()``.
+    bounds : np.ndarray
+        Array of shape ``(len(parameters), 2)`` with the lower and upper bounds.
+    """
+    parameters = [key for key in cosmo.to_dict() if isinstance(shifts_dict.get(key), tuple)]
+    if not parameters:
+        raise ValueError("The shifts do not span any region: all of them are deterministic")
+    bounds = np.array([shifts_dict[key] for key in parameters], dtype=float)
+    if shift_distr == "gaussian":
+        mean, std = bounds[:, 0], bounds[:, 1]
+        bounds = np.stack([mean - n_sigma * std, mean + n_sigma * std], axis=1)
+    if np.any(bounds[:, 1] <= bounds[:, 0]):
+        raise ValueError(f"Empty region of the shifts: {dict(zip(parameters, bounds.tolist()))}")
+    return parameters, bounds
+
+
+def latin_hypercube(bounds, n_samples, seed):
+    """
+    Latin hypercube sample of a box.
+
+    Parameters
+    ----------
+    bounds : array_like
+        Array of shape ``(n_params, 2)`` with the lower and upper bounds.
+    n_samples : int
+        Number of samples.
+    seed : int or str
+        Random seed.
+
+    Returns
+    -------
+    np.ndarray
+        Array of shape ``(n_samples, n_params)``.
+    """
+    if type(seed) is str:
+        seed = string_to_seed(seed)
+    bounds = np.asarray(bounds, dtype=float)
+    sampler = qmc.LatinHypercube(d=len(bounds), seed=np.random.default_rng(seed))
+    return qmc.scale(sampler.random(n_samples), bounds[:, 0], bounds[:, 1])
+
+
+def delta_chi2(data_shift, covariance):
+    """
+    Blinding strength of a shift of the data vector, as the chi-squared
+    of the shift with the data covariance.
+
+    Parameters
+    ----------
+    data_shift : array_like
+        Shift of the data vector (e.g. an additive concealing factor), or
+        one shift per row.
+    covariance : array_like
+        Covariance of the data vector.
+
+    Returns
+    -------
+    float or np.ndarray
+        :math:`\\Delta\\chi^2 = f^T C^{-1} f` of each shift.
+    """
+    data_shift = np.asarray(data_shift, dtype=float)
+    solved = np.linalg.solve(np.asarray(covariance, dtype=float), np.atleast_2d(data_shift).T).T
+    chi2 = np.sum(np.atleast_2d(data_shift) * solved, axis=1)
+    return chi2 if data_shift.ndim > 1 else float(chi2[0])
+
+
+def _monomial_exponents(n_params, degree):
+    """
+    Exponents of the monomials of ``n_params`` variables of total degree
+    up to ``degree``.
+    """
+    exponents = []
+    for total in range(degree + 1):
+        for combination in itertools.combinations_with_replacement(range(n_params), total):
+            exponents.append(np.bincount(combination, minlength=n_params))
+    return np.array(exponents, dtype=int).reshape(-1, n_params)
+
+
+class TheoryEmulator():
+    """
+    PCA and polynomial emulator of the theory vector.
+
+    Built with :meth:`train` (or :meth:`load`), not directly.
+
+    Attributes
+    ----------
+    parameters : list
+        Names of the emulated parameters.
+    bounds : np.ndarray
+        Bounds of the emulated region, one row per parameter.
+    theory_vec_fid : np.ndarray
+        Theory vector of the reference cosmology, used for the concealing
+        factors.
+    training_samples, training_theory_vecs : np.ndarray
+        Training set.
+    validation : dict or None
+        Validation error, see :meth:`validate`.
+    key : str or None
+        Identifier of the likelihood, data and reference cosmology the
+        emulator was trained for.
+    """
+    _ARRAYS = ("bounds", "theory_vec_fid", "training_samples", "training_theory_vecs",
+               "mean", "scale", "components", "coefficients")
+
+    def __init__(self, parameters, bounds, theory_vec_fid, training_samples,
+                 training_theory_vecs, degree, mean, scale, components, coefficients,
+                 key=None, validation=None):
+        self.parameters = list(parameters)
+        self.bounds = np.asarray(bounds, dtype=float)
+        self.theory_vec_fid = np.asarray(theory_vec_fid, dtype=float)
+        self.training_samples = np.asarray(training_samples, dtype=float)
+        self.training_theory_vecs = np.asarray(training_theory_vecs, dtype=float)
+        self.degree = int(degree)
+        self.mean = np.asarray(mean, dtype=float)
+        self.scale = np.asarray(scale, dtype=float)
+        self.components = np.asarray(components, dtype=float)
+        self.coefficients = np.asarray(coefficients, dtype=float)
+        self.key = key
+        self.validation = validation
+        self._exponents = _monomial_exponents(len(self.parameters), self.degree)
+
+    @classmethod
+    def train(cls, parameters, bounds, samples, theory_vecs, theory_vec_fid, degree=2,
+              n_components=None, variance_fraction=1 - 1e-8, key=None):
+        """
+        Trains an emulator.
+
+        Parameters
+        ----------
+        parameters : list
+            Names of the parameters (the columns of ``samples``).
+        bounds : array_like
+            Bounds of the emulated region, one row per parameter.
+        samples : array_like
+            Training parameter values, one row per cosmology.
+        theory_vecs : array_like
+            Theory vectors of the training cosmologies.
+        theory_vec_fid : array_like
+            Theory vector of the reference cosmology.
+        degree : int
+            Degree of the polynomials. Default is 2.
+        n_components : int, optional
+            Number of principal components. By default the smallest number
+            explaining ``variance_fraction`` of the variance.
+        variance_fraction : float
+            Fraction of the variance of the standardised theory vectors
+            kept when ``n_components`` is None. Default is ``1 - 1e-8``.
+        key : str, optional
+            Identifier of the likelihood and data, see :attr:`key`.
+
+        Returns
+        -------
+        TheoryEmulator
+            The trained emulator.
+
+        Raises
+        ------
+        ValueError
+            If there are fewer training samples than polynomial coefficients.
+        """
+        samples = np.asarray(samples, dtype=float)
+        theory_vecs = np.asarray(theory_vecs, dtype=float)
+        bounds = np.asarray(bounds, dtype=float)
+        n_terms = len(_monomial_exponents(len(parameters), degree))
+        if len(samples) < n_terms:
+            raise ValueError(f"A polynomial of degree {degree} in {len(parameters)} parameters "
+                             f"needs at least {n_terms} training samples, got {len(samples)}")
+        mean = theory_vecs.mean(axis=0)
+        scale = theory_vecs.std(axis=0)
+        scale[scale == 0] = 1.0
+        _, singular_values, vt = np.linalg.svd((theory_vecs - mean) / scale, full_matrices=False)
+        if n_components is None:
+            explained = np.cumsum(singular_values**2) / max(np.sum(singular_values**2), 1e-300)
+            n_components = int(np.searchsorted(explained, variance_fraction) + 1)
+        components = vt[:min(n_components, len(vt))]
+        scores = ((theory_vecs - mean) / scale) @ components.T
+        emulator = cls(parameters, bounds, theory_vec_fid, samples, theory_vecs, degree, mean,
+                       scale, components, np.zeros((n_terms, len(components))), key=key)
+        emulator.coefficients = np.linalg.lstsq(emulator._features(samples), scores,
+                                                rcond=None)[0]
+        return emulator
+
+    def _features(self, samples):
+        # parameters mapped to [-1, 1] over the emulated region
+        unit = 2 * (samples - self.bounds[:, 0]) / (self.bounds[:, 1] - self.bounds[:, 0]) - 1
+        return np.prod(unit[..., None, :] ** self._exponents, axis=-1)
+
+    def _samples(self, shifts, parameters=None):
+        if isinstance(shifts, dict):
+            parameters, shifts = list(shifts), np.array(list(shifts.values()), dtype=float)
+        elif parameters is None:
+            parameters = self.parameters
+        shifts = np.asarray(shifts, dtype=float)
+        if sorted(parameters) != sorted(self.parameters):
+            raise ValueError(f"The emulator needs the parameters {self.parameters}, "
+                             f"got {list(parameters)}")
+        order = [list(parameters).index(name) for name in self.parameters]
+        return shifts[..., order]
+
+    def predict(self, shifts, parameters=None):
+        """
+        Emulated theory vector.
+
+        Parameters
+        ----------
+        shifts : dict or array_like
+            Parameter values, as a dictionary or as an array whose last axis
+            follows ``parameters``.
+        parameters : list, optional
+            Names of the columns of an array. Default is ``self.parameters``.
+
+        Returns
+        -------
+        np.ndarray
+            Theory vector, or one theory vector per row of ``shifts``.
+        """
+        scores = self._features(self._samples(shifts, parameters)) @ self.coefficients
+        return self.mean + self.scale * (scores @ self.components)
+
+    def concealing_factor(self, shifts, factor_type="add", parameters=None):
+        """
+        Emulated concealing factor, with respect to :attr:`theory_vec_fid`.
+
+        Parameters
+        ----------
+        shifts : dict or array_like
+            Parameter values, see :meth:`predict`.
+        factor_type : str
+            Type of concealing factor, ``add`` or ``mult``. Default is ``add``.
+        parameters : list, optional
+            Names of the columns of an array.
+
+        Returns
+        -------
+        np.ndarray
+            Concealing factor, or one concealing factor per row of ``shifts``.
+        """
+        theory_vec = self.predict(shifts, parameters)
+        if factor_type == "add":
+            return theory_vec - self.theory_vec_fid
+        elif factor_type == "mult":
+            return theory_vec / self.theory_vec_fid
+        else:
+            raise NotImplementedError('Only "add" and "mult" concealing factor is implemented')
+
+    def validate(self, samples, theory_vecs, sigma=None):
+        """
+        Measures the error of the emulator on a validation set and stores
+        it in :attr:`validation`.
+
+        Parameters
+        ----------
+        samples : array_like
+            Validation parameter values, one row per cosmology.
+        theory_vecs : array_like
+            Exact theory vectors of the validation cosmologies.
+        sigma : array_like, optional
+            Standard deviation of the data points. By default None.
+
+        Returns
+        -------
+        dict
+            The ``samples``, the largest relative error of the non-zero
+            entries of each theory vector (``relative_error``), the largest error of its concealing
+            factor relative to the largest ``|f^add|`` (``add_relative_error``)
+            and, with ``sigma``, the largest error in units of ``sigma``
+            (``error_over_sigma``).
+        """
+        samples = np.atleast_2d(np.asarray(samples, dtype=float))
+        exact = np.atleast_2d(np.asarray(theory_vecs, dtype=float))
+        error = np.abs(self.predict(samples) - exact)
+        add_exact = np.abs(exact - self.theory_vec_fid).max(axis=1)
+        relative = np.divide(error, np.abs(exact), out=np.zeros_like(error), where=exact != 0)
+        self.validation = {"samples": samples,
+                           "relative_error": relative.max(axis=1),
+                           "add_relative_error": error.max(axis=1) / add_exact}
+        if sigma is not None:
+            self.validation["error_over_sigma"] = (error / np.asarray(sigma, dtype=float)).max(axis=1)
+        return self.validation
+
+    def save(self, path):
+        """
+        Saves the emulator, its training set and its validation error.
+
+        Parameters
+        ----------
+        path : str
+            Path of the ``.npz`` file.
+        """
+        arrays = {name: getattr(self, name) for name in self._ARRAYS}
+        arrays["parameters"] = np.array(self.parameters, dtype=str)
+        arrays["degree"] = np.array(self.degree)
+        arrays["key"] = np.array("" if self.key is None else self.key)
+        arrays["smokescreen_version"] = np.array(__version__)
+        for name, value in (self.validation or {}).items():
+            arrays[f"validation_{name}"] = value
+        with open(path, "wb") as file:
+            np.savez(file, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads an emulator saved with :meth:`save`.
+
+        Parameters
+        ----------
+        path : str
+            Path of the ``.npz`` file.
+
+        Returns
+        -------
+        TheoryEmulator
+            The emulator.
+        """
+        with np.load(path, allow_pickle=False) as data:
+            validation = {name[len("validation_"):]: data[name] for name in data.files
+                          if name.startswith("validation_")}
+            key = str(data["key"])
+            return cls(data["parameters"].tolist(), degree=int(data["degree"]),
+                       key=key if key else None, validation=validation if validation else None,
+                       **{name: data[name] for name in cls._ARRAYS})
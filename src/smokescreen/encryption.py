@@ -8,20 +8,238 @@ Encryption (:mod:`smokescreen.encryption`)
 
 The :mod:`smokescreen.encryption` module provides functions to encrypt and decrypt files.
 
+Files are encrypted in the ``.encrpt`` v2 container: the file is split
+in chunks, each encrypted with AES-GCM, so encryption and decryption use
+constant memory and every chunk is authenticated. The container starts
+with a header (magic bytes, version, chunk size and nonce prefix),
+followed by the encrypted chunks. The index of each chunk and whether it
+is the last one are authenticated together with the header, so chunks
+cannot be reordered, dropped or truncated without detection.
+
+Files encrypted with Fernet by older versions of Smokescreen (v1) are
+still decrypted.
+
 Smokescreen Encryption
 ----------------------
 .. autofunction:: encrypt_file
+.. autofunction:: file_digest
 .. autofunction:: decrypt_file
+.. autofunction:: decrypt_to_sacc
+.. autofunction:: open_encrypted_file
+.. autoclass:: DecryptedFile
+   :members:
 '''
 
+import io
 import os
+import base64
+import hashlib
+import struct
+import tempfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from cryptography.fernet import Fernet
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from smokescreen.cache import _FILE_MODE
+
+# magic bytes of the v2 container, followed by the version byte
+ENCRYPTION_MAGIC = b"SMKSCRN"
+ENCRYPTION_VERSION = 2
+# default size of the plaintext chunks
+DEFAULT_CHUNK_SIZE = 2**20
+# largest chunk size accepted, so a corrupted header cannot make the
+# readers buffer huge chunks
+MAX_CHUNK_SIZE = 2**26
+# header: magic, version, chunk size, nonce prefix
+_HEADER = struct.Struct(f">{len(ENCRYPTION_MAGIC)}sBI4s")
+_TAG_SIZE = 16
+
+
+def _chunk_nonce(nonce_prefix, index):
+    return nonce_prefix + struct.pack(">Q", index)
+
+
+def _chunk_aad(header, index, final):
+    return header + struct.pack(">Q?", index, final)
+
+
+def _read_chunks(file, chunk_size):
+    """
+    Yields ``(index, chunk, final)`` for the chunks of ``file``, with one
+    chunk of look-ahead to flag the last one.
+    """
+    index = 0
+    chunk = file.read(chunk_size)
+    while True:
+        next_chunk = file.read(chunk_size)
+        final = len(next_chunk) == 0
+        yield index, chunk, final
+        if final:
+            return
+        chunk = next_chunk
+        index += 1
+
+
+def _ordered_map(function, items, workers):
+    """
+    Maps ``function`` over ``items`` in a thread pool, yielding the results
+    in order. At most ``2 * workers`` items are in flight, so memory stays
+    bounded. AES-GCM releases the GIL, so the chunks are processed in parallel.
+    """
+    if workers <= 1:
+        yield from map(function, items)
+        return
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for item in items:
+            pending.append(executor.submit(function, item))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _encrypted_chunks(file, key, chunk_size, workers=1):
+    """
+    Yields the v2 header followed by the encrypted chunks of ``file``.
+    """
+    cipher = AESGCM(key)
+    header = _HEADER.pack(ENCRYPTION_MAGIC, ENCRYPTION_VERSION, chunk_size, os.urandom(4))
+    nonce_prefix = header[-4:]
+    yield header
+
+    def encrypt_chunk(item):
+        index, chunk, final = item
+        return cipher.encrypt(_chunk_nonce(nonce_prefix, index), chunk,
+                              _chunk_aad(header, index, final))
+
+    yield from _ordered_map(encrypt_chunk, _read_chunks(file, chunk_size), workers)
+
+
+class _DigestReader():
+    """
+    Wraps a binary file, hashing and counting the bytes read from it.
+    """
+    def __init__(self, file):
+        self.file = file
+        self.hasher = hashlib.sha256()
+        self.size = 0
+
+    def read(self, size=-1):
+        data = self.file.read(size)
+        self.hasher.update(data)
+        self.size += len(data)
+        return data
+
+
+def _checked_chunks(chunks, reader, expected_digest):
+    """
+    Yields the chunks, then checks that the bytes read to produce them have
+    the expected SHA-256 digest. Raising at the end of the iteration aborts
+    :func:`_write_atomically`, so a mismatch never leaves a file behind.
+    """
+    yield from chunks
+    if reader.hasher.hexdigest() != expected_digest:
+        raise ValueError(f"The encrypted content ({reader.size} bytes) does not match "
+                         "the expected digest")
+
+
+def _read_header(file):
+    """
+    Reads and checks the header of a v2 container.
+
+    Returns
+    -------
+    tuple
+        ``(header, chunk_size, nonce_prefix)``
+    """
+    header = file.read(_HEADER.size)
+    if len(header) != _HEADER.size:
+        raise ValueError("Encrypted file is truncated: incomplete header")
+    magic, version, chunk_size, nonce_prefix = _HEADER.unpack(header)
+    if magic != ENCRYPTION_MAGIC or version != ENCRYPTION_VERSION:
+        raise ValueError(f"Unsupported encrypted file version {version}")
+    if not 1 <= chunk_size <= MAX_CHUNK_SIZE:
+        raise ValueError(f"Corrupted encrypted file header: invalid chunk size {chunk_size}")
+    return header, chunk_size, nonce_prefix
+
+
+def _decrypt_chunk(cipher, header, nonce_prefix, index, chunk, final):
+    try:
+        return cipher.decrypt(_chunk_nonce(nonce_prefix, index), chunk,
+                              _chunk_aad(header, index, final))
+    except InvalidTag:
+        raise ValueError(f"Integrity check failed for chunk {index}: the file is "
+                         "corrupted or truncated, or the key is wrong") from None
+
+
+def _decrypted_chunks(file, key, workers=1):
+    """
+    Yields the decrypted chunks of a v2 container, checking each of them.
+    """
+    header, chunk_size, nonce_prefix = _read_header(file)
+    cipher = AESGCM(key)
+
+    def decrypt_chunk(item):
+        return _decrypt_chunk(cipher, header, nonce_prefix, *item)
+
+    yield from _ordered_map(decrypt_chunk, _read_chunks(file, chunk_size + _TAG_SIZE), workers)
+
+
+def _read_key(path_to_key):
+    # check if the key exists:
+    if not os.path.exists(path_to_key):
+        raise FileNotFoundError(f"Key {path_to_key} not found")
+    with open(path_to_key, "rb") as file:
+        return file.read()
+
+
+def _is_v2_container(path_to_file):
+    with open(path_to_file, "rb") as file:
+        return file.read(len(ENCRYPTION_MAGIC)) == ENCRYPTION_MAGIC
+
+
+def _write_atomically(path, chunks, keep=True):
+    """
+    Writes the chunks to ``path`` through a temporary file, so a failure
+    never leaves a partially written file behind. The file gets the mode of
+    a file created with ``open``, under the umask of the process.
+
+    Returns
+    -------
+    list
+        The chunks written, or an empty list if ``keep`` is False.
+    """
+    directory = os.path.dirname(path) or "."
+    file_descriptor, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    written = []
+    try:
+        with os.fdopen(file_descriptor, "wb") as file:
+            for chunk in chunks:
+                file.write(chunk)
+                if keep:
+                    written.append(chunk)
+        # mkstemp creates the file readable by its owner only
+        os.chmod(tmp_path, _FILE_MODE)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return written
 
 
 def encrypt_file(path_to_file: str, path_to_save: str = None,
-                 save_file: bool = False, keep_original: bool = False) -> bytes:
+                 save_file: bool = False, keep_original: bool = False,
+                 return_data: bool = True, version: int = ENCRYPTION_VERSION,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE, workers: int = 1,
+                 expected_digest: str = None, data: bytes = None) -> bytes:
     """
-    Encrypts a SACC file using Fernet encryption.
+    Encrypts a SACC file.
+
+    By default the file is encrypted in the chunked AES-GCM v2 container,
+    reading and writing one chunk at a time.
 
     Parameters
     ----------
@@ -33,33 +251,53 @@ def encrypt_file(path_to_file: str, path_to_save: str = None,
     save_file : bool, optional
         If True, saves the encrypted file in the same directory
         as the original file, by default False.
+    keep_original : bool, optional
+        If False, removes the original file, by default False.
+    return_data : bool, optional
+        If True, returns the encrypted file content, by default True. Set it
+        to False together with ``save_file`` to encrypt with constant memory.
+    version : int, optional
+        Container version: 2 (chunked AES-GCM, default) or 1 (Fernet, for
+        readers using older versions of Smokescreen).
+    chunk_size : int, optional
+        Size in bytes of the plaintext chunks of the v2 container,
+        by default 1 MiB, at most 64 MiB.
+    workers : int, optional
+        Number of threads encrypting chunks of the v2 container
+        concurrently, by default 1. Chunks are written in order.
+    expected_digest : str, optional
+        SHA-256 hexadecimal digest (see :func:`file_digest`) the content
+        must have. It is checked, with the number of bytes, on the bytes
+        encrypted; if it does not match (e.g. the file changed since it was
+        hashed), nothing is saved or removed and a ValueError is raised.
+        By default None [no check].
+    data : bytes, optional
+        Content of ``path_to_file`` already read (e.g. by
+        :func:`smokescreen.utils.load_sacc_file_and_content`), encrypted
+        instead of reading the file again. ``path_to_file`` then only names
+        the outputs and the original file to remove, which is kept if its
+        size no longer matches ``data``. By default None.
 
     Returns
     -------
-    encrypted_sacc : bytes
-        Encrypted SACC file.
+    encrypted_sacc : bytes or None
+        Encrypted SACC file, or None if ``return_data`` is False and the
+        file was saved.
     key : bytes
         Key used to encrypt the file.
     """
     # check if the file exists:
     if not os.path.exists(path_to_file):
         raise FileNotFoundError(f"File {path_to_file} not found")
+    if version not in (1, ENCRYPTION_VERSION):
+        raise ValueError(f"Unknown encryption version {version}")
+    if not 1 <= chunk_size <= MAX_CHUNK_SIZE:
+        raise ValueError(f"chunk_size must be between 1 and {MAX_CHUNK_SIZE} bytes")
+    if workers < 1:
+        raise ValueError("workers must be positive")
     # gets the path from the file
     path = os.path.dirname(path_to_file)
 
-    # generate a key
-    key = Fernet.generate_key()
-    # create a cipher
-    cipher = Fernet(key)
-
-    # read the file
-    with open(path_to_file, "rb") as file:
-        sacc = file.read()
-
-    # encrypt the file
-    encrypted_sacc = cipher.encrypt(sacc)
-
-    # save the file
     if save_file:
         if path_to_save is not None:
             # check if the path exists and create it if it does not
@@ -70,10 +308,33 @@ def encrypt_file(path_to_file: str, path_to_save: str = None,
         # changes the extension of the file to .encrpt
         filename = os.path.basename(path_to_file)
         filename = filename.split(".")[0] + ".encrpt"
+
+    if data is not None and keep_original is False and os.path.getsize(path_to_file) != len(data):
+        raise ValueError(f"File {path_to_file} changed since it was read: "
+                         "it is neither encrypted nor removed")
+
+    with (open(path_to_file, "rb") if data is None else io.BytesIO(data)) as source:
+        file = source if expected_digest is None else _DigestReader(source)
+        if version == 1:
+            # generate a key and encrypt the whole file with Fernet
+            key = Fernet.generate_key()
+            chunks = [Fernet(key).encrypt(file.read())]
+        else:
+            # generate a 256-bit key, stored as urlsafe base64 like Fernet keys
+            raw_key = AESGCM.generate_key(bit_length=256)
+            key = base64.urlsafe_b64encode(raw_key)
+            chunks = _encrypted_chunks(file, raw_key, chunk_size, workers=workers)
+        if expected_digest is not None:
+            chunks = _checked_chunks(chunks, file, expected_digest)
+
         # save the file
-        with open(os.path.join(path_to_save, filename), "wb") as file:
-            file.write(encrypted_sacc)
+        if save_file:
+            written = _write_atomically(os.path.join(path_to_save, filename), chunks,
+                                        keep=return_data)
+        else:
+            written = list(chunks)
 
+    if save_file:
         # saves the key in a txt file with the same name and extension .key
         with open(os.path.join(path_to_save, filename.split(".")[0] + ".key"), "wb") as file:
             file.write(key)
@@ -81,12 +342,42 @@ def encrypt_file(path_to_file: str, path_to_save: str = None,
     if keep_original is False:
         os.remove(path_to_file)
 
-    return encrypted_sacc, key
+    if save_file and not return_data:
+        return None, key
+    return b"".join(written), key
+
+
+def file_digest(path_to_file: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> str:
+    """
+    SHA-256 digest of a file, read one chunk at a time.
+
+    Parameters
+    ----------
+    path_to_file : str
+        Path to the file.
+    chunk_size : int, optional
+        Size in bytes of the chunks read, by default 1 MiB.
+
+    Returns
+    -------
+    str
+        Hexadecimal digest, as expected by :func:`encrypt_file`.
+    """
+    hasher = hashlib.sha256()
+    with open(path_to_file, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
 
 
-def decrypt_file(path_to_file: str, key: str, save_file: bool = False) -> bytes:
+def decrypt_file(path_to_file: str, key: str, save_file: bool = False,
+                 return_data: bool = True, workers: int = 1) -> bytes:
     """
-    Decrypts a SACC file using Fernet encryption.
+    Decrypts a SACC file encrypted by Smokescreen.
+
+    Both the chunked AES-GCM v2 container and the Fernet files written by
+    older versions of Smokescreen are supported; the format is detected
+    from the first bytes of the file.
 
     Parameters
     ----------
@@ -97,6 +388,25 @@ def decrypt_file(path_to_file: str, key: str, save_file: bool = False) -> bytes:
     save_file : bool, optional
         If True, saves the decrypted file in the same directory as the original file,
         by default False.
+    return_data : bool, optional
+        If True, returns the decrypted file content, by default True. Set it
+        to False together with ``save_file`` to decrypt a v2 container with
+        constant memory.
+    workers : int, optional
+        Number of threads decrypting chunks of a v2 container concurrently,
+        by default 1.
+
+    Returns
+    -------
+    bytes or None
+        Decrypted SACC file, or None if ``return_data`` is False and the
+        file was saved.
+
+    Raises
+    ------
+    ValueError
+        If the integrity check of a v2 container fails. No decrypted
+        file is saved in that case.
     """
     # check if the file exists:
     if not os.path.exists(path_to_file):
@@ -104,24 +414,11 @@ def decrypt_file(path_to_file: str, key: str, save_file: bool = False) -> bytes:
     # gets the path from the file
     path = os.path.dirname(path_to_file)
 
-    # check if the key exists:
-    if not os.path.exists(key):
-        raise FileNotFoundError(f"Key {key} not found")
+    if workers < 1:
+        raise ValueError("workers must be positive")
     # read the key
-    with open(key, "rb") as file:
-        key = file.read()
-
-    # create a cipher
-    cipher = Fernet(key)
-
-    # read the file
-    with open(path_to_file, "rb") as file:
-        sacc = file.read()
-
-    # decrypt the file
-    decrypted_sacc = cipher.decrypt(sacc)
+    key = _read_key(key)
 
-    # save the file
     if save_file:
         # Extract original filename from encrypted filename pattern: basename.encrpt -> basename
         filename = os.path.basename(path_to_file)
@@ -135,8 +432,169 @@ def decrypt_file(path_to_file: str, key: str, save_file: bool = False) -> bytes:
             base_name = filename.replace(".encrpt", "")
             decrypted_path = os.path.join(path, base_name)
 
+    with open(path_to_file, "rb") as file:
+        if _is_v2_container(path_to_file):
+            chunks = _decrypted_chunks(file, base64.urlsafe_b64decode(key.strip()),
+                                       workers=workers)
+        else:
+            # legacy (v1) Fernet file
+            chunks = [Fernet(key).decrypt(file.read())]
+
         # save the file
-        with open(decrypted_path, "wb") as file:
-            file.write(decrypted_sacc)
+        if save_file:
+            written = _write_atomically(decrypted_path, chunks, keep=return_data)
+        else:
+            written = list(chunks)
+
+    if save_file and not return_data:
+        return None
+    return b"".join(written)
+
+
+class DecryptedFile(io.RawIOBase):
+    """
+    Read-only, seekable file object over a v2 ``.encrpt`` container.
+
+    Chunks are decrypted (and their integrity checked) when they are read,
+    so only one decrypted chunk is held in memory and the plaintext is
+    never written to disk. Use :func:`open_encrypted_file` to open files
+    that may also be in the legacy Fernet format.
+
+    Parameters
+    ----------
+    path_to_file : str
+        Path to the encrypted file.
+    key : bytes
+        Key used to encrypt the file (content of the ``.key`` file).
+    """
+    def __init__(self, path_to_file, key):
+        super().__init__()
+        self._file = open(path_to_file, "rb")
+        try:
+            self._header, self._chunk_size, self._nonce_prefix = _read_header(self._file)
+            self._cipher = AESGCM(base64.urlsafe_b64decode(key.strip()))
+            body_size = os.fstat(self._file.fileno()).st_size - _HEADER.size
+            stored_chunk_size = self._chunk_size + _TAG_SIZE
+            self._n_chunks = -(-body_size // stored_chunk_size)
+            last_chunk_size = body_size - (self._n_chunks - 1) * stored_chunk_size
+            if self._n_chunks == 0 or last_chunk_size < _TAG_SIZE:
+                raise ValueError("Encrypted file is truncated: incomplete chunk")
+        except BaseException:
+            self._file.close()
+            raise
+        self._size = body_size - self._n_chunks * _TAG_SIZE
+        self._position = 0
+        self._chunk_index = None
+        self._chunk = b""
+
+    def readable(self):
+        return True
 
-    return decrypted_sacc
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self._size + offset
+        else:
+            raise ValueError(f"Invalid whence {whence}")
+        if position < 0:
+            raise ValueError("Negative seek position")
+        self._position = position
+        return position
+
+    def _load_chunk(self, index):
+        if index != self._chunk_index:
+            stored_chunk_size = self._chunk_size + _TAG_SIZE
+            self._file.seek(_HEADER.size + index * stored_chunk_size)
+            self._chunk = _decrypt_chunk(self._cipher, self._header, self._nonce_prefix,
+                                         index, self._file.read(stored_chunk_size),
+                                         index == self._n_chunks - 1)
+            self._chunk_index = index
+        return self._chunk
+
+    def readinto(self, buffer):
+        view = memoryview(buffer).cast("B")
+        n_read = 0
+        while n_read < len(view) and self._position < self._size:
+            index, offset = divmod(self._position, self._chunk_size)
+            chunk = self._load_chunk(index)
+            n_bytes = min(len(view) - n_read, len(chunk) - offset)
+            view[n_read:n_read + n_bytes] = chunk[offset:offset + n_bytes]
+            n_read += n_bytes
+            self._position += n_bytes
+        return n_read
+
+    def close(self):
+        if not self.closed:
+            self._file.close()
+            self._chunk = b""
+        super().close()
+
+
+def open_encrypted_file(path_to_file: str, key: str):
+    """
+    Opens a file encrypted by Smokescreen for reading, without writing
+    the plaintext to disk.
+
+    Parameters
+    ----------
+    path_to_file : str
+        Path to the encrypted file.
+    key : str
+        path to the file with the key used to encrypt the file.
+
+    Returns
+    -------
+    file object
+        Binary, read-only and seekable file object: a :class:`DecryptedFile`
+        for v2 containers, or an in-memory buffer for legacy Fernet files.
+    """
+    if not os.path.exists(path_to_file):
+        raise FileNotFoundError(f"File {path_to_file} not found")
+    key = _read_key(key)
+    if _is_v2_container(path_to_file):
+        return DecryptedFile(path_to_file, key)
+    # legacy (v1) Fernet file
+    with open(path_to_file, "rb") as file:
+        return io.BytesIO(Fernet(key).decrypt(file.read()))
+
+
+def decrypt_to_sacc(path_to_file: str, key: str):
+    """
+    Decrypts an encrypted SACC file straight into a SACC object.
+
+    The decrypted FITS or HDF5 content is parsed from memory and is never
+    written to disk.
+
+    Parameters
+    ----------
+    path_to_file : str
+        Path to the encrypted SACC file.
+    key : str
+        path to the file with the key used to encrypt the SACC.
+
+    Returns
+    -------
+    sacc.Sacc
+        Decrypted SACC object.
+
+    Raises
+    ------
+    ValueError
+        If the decrypted content is not a SACC file, or was written in a
+        SACC layout newer than the supported one (as ``sacc.Sacc.load_fits``
+        and ``sacc.Sacc.load_hdf5`` would reject it).
+    """
+    # utils imports pyccl, which the encryption functions do not need
+    from smokescreen.utils import load_sacc_fileobj
+    with open_encrypted_file(path_to_file, key) as file:
+        sacc_data, _ = load_sacc_fileobj(file)
+    return sacc_data
@@ -0,0 +1,200 @@
+# author: Arthur Loureiro <arthur.loureiro@fysik.su.se>
+# license: BSD 3-Clause
+'''
+Instrumentation (:mod:`smokescreen.instrumentation`)
+=====================================================
+
+.. currentmodule:: smokescreen.instrumentation
+
+The :mod:`smokescreen.instrumentation` module records the wall time, CPU
+time and peak memory of the named stages of a concealment run (module
+load, likelihood build, SACC verification, theory vectors, save and
+encrypt), and writes them as a machine-readable JSON report.
+
+A disabled recorder (the default everywhere) only hands out a shared
+no-op context manager, so instrumented code costs nothing measurable when
+no report is requested.
+
+Smokescreen Instrumentation
+---------------------------
+
+.. autoclass:: StageRecorder
+   :members:
+
+.. autofunction:: peak_rss_bytes
+'''
+import os
+import sys
+import json
+import time
+import datetime
+from contextlib import contextmanager, nullcontext
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    # not available on Windows
+    resource = None
+
+from ._version import __version__
+
+_NULL_STAGE = nullcontext()
+
+
+def peak_rss_bytes(children=False):
+    """
+    Peak resident set size (RSS) of the process so far, in bytes.
+
+    Parameters
+    ----------
+    children : bool, optional
+        If True, returns the largest peak RSS of the terminated child
+        processes (e.g. the theory workers) instead. By default False.
+
+    Returns
+    -------
+    int or None
+        Peak RSS in bytes, or None if it cannot be measured on this platform.
+    """
+    if resource is None:  # pragma: no cover
+        return None
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    peak = resource.getrusage(who).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _children_cpu_seconds():
+    # CPU time of the terminated child processes
+    times = os.times()
+    return times.children_user + times.children_system
+
+
+class StageRecorder():
+    """
+    Records the wall time, CPU time and peak memory of named stages.
+
+    Stages are recorded in the order they finish. A stage that runs several
+    times (e.g. once per blind) is recorded each time, and the totals of
+    the report add them up.
+
+    The CPU time of a stage is that of the thread running it, so stages
+    running concurrently in a thread pool are not counted twice; threads
+    started by a stage record their own stages.
+
+    Parameters
+    ----------
+    enabled : bool
+        If False, nothing is recorded. Default is True.
+
+    Examples
+    --------
+    >>> recorder = StageRecorder()
+    >>> with recorder.stage("load"):
+    ...     pass
+    >>> [stage["name"] for stage in recorder.stages]
+    ['load']
+    """
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.stages = []
+        self._start = time.perf_counter()
+
+    def stage(self, name):
+        """
+        Context manager recording the stage ``name``.
+
+        Every record holds the wall time of the stage, the CPU time of the
+        thread running it, the CPU time of the child processes that
+        terminated during the stage (e.g. the theory workers), the peak RSS
+        of the process at its end and how much the stage increased it, and
+        the peak RSS of the child processes. The stage is recorded even if
+        it raises.
+
+        Parameters
+        ----------
+        name : str
+            Name of the stage.
+        """
+        if not self.enabled:
+            return _NULL_STAGE
+        return self._record(name)
+
+    @contextmanager
+    def _record(self, name):
+        rss_start = peak_rss_bytes()
+        cpu_start = time.thread_time()
+        children_cpu_start = _children_cpu_seconds()
+        wall_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.thread_time() - cpu_start
+            children_cpu = _children_cpu_seconds() - children_cpu_start
+            rss = peak_rss_bytes()
+            self.stages.append({
+                "name": name,
+                "wall_seconds": wall,
+                "cpu_seconds": cpu,
+                "children_cpu_seconds": children_cpu,
+                "peak_rss_bytes": rss,
+                "peak_rss_increase_bytes": None if rss is None else rss - rss_start,
+                "children_peak_rss_bytes": peak_rss_bytes(children=True),
+            })
+
+    def report(self, **info):
+        """
+        Builds the report of the recorded stages.
+
+        Parameters
+        ----------
+        **info
+            Extra entries of the report (e.g. the command and its input).
+
+        Returns
+        -------
+        dict
+            Report with the recorded ``stages``, their ``totals`` by name,
+            the total wall time since the recorder was created and the
+            peak RSS of the process.
+        """
+        totals = {}
+        for stage in self.stages:
+            total = totals.setdefault(stage["name"], {"wall_seconds": 0.0, "cpu_seconds": 0.0,
+                                                      "children_cpu_seconds": 0.0, "calls": 0})
+            total["wall_seconds"] += stage["wall_seconds"]
+            total["cpu_seconds"] += stage["cpu_seconds"]
+            total["children_cpu_seconds"] += stage["children_cpu_seconds"]
+            total["calls"] += 1
+        report = {
+            "smokescreen_version": __version__,
+            "date": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "pid": os.getpid(),
+        }
+        report.update(info)
+        report.update({
+            "total_wall_seconds": time.perf_counter() - self._start,
+            "peak_rss_bytes": peak_rss_bytes(),
+            "stages": list(self.stages),
+            "totals": totals,
+        })
+        return report
+
+    def write_json(self, path, **info):
+        """
+        Writes the report (see :meth:`report`) to a JSON file.
+
+        Parameters
+        ----------
+        path : str
+            Path of the JSON file.
+        **info
+            Extra entries of the report.
+        """
+        with open(path, "w") as file:
+            json.dump(self.report(**info), file, indent=2)
+
+
+# recorder used when no report is requested
+DISABLED = StageRecorder(enabled=False)
@@ -0,0 +1,246 @@
+# author: Arthur Loureiro <arthur.loureiro@fysik.su.se>
+# license: BSD 3-Clause
+'''
+Linear Response (:mod:`smokescreen.linear_response`)
+=====================================================
+
+.. currentmodule:: smokescreen.linear_response
+
+The :mod:`smokescreen.linear_response` module approximates the concealing
+factor to first order in the parameter shifts,
+
+.. math::
+    f^{\\rm add}(\\theta) \\simeq J\\,(\\theta - \\theta_{\\rm fid}), \\qquad
+    f^{\\rm mult}(\\theta) \\simeq 1 + \\frac{J\\,(\\theta - \\theta_{\\rm fid})}{d(\\theta_{\\rm fid})},
+
+where :math:`J = \\partial d / \\partial \\theta` is the Jacobian of the
+theory vector at the reference cosmology, computed with central finite
+differences by :meth:`smokescreen.datavector.ConcealDataVector.linear_response`.
+Once :math:`J` is known, the concealing factors of thousands of candidate
+shifts (e.g. from :func:`smokescreen.param_shifts.draw_flat_or_deterministic_param_shifts_batch`)
+cost a single matrix product.
+
+The approximation neglects the curvature of the theory vector, so it
+degrades with the size of the shifts: check :attr:`LinearResponse.validation`
+(or :meth:`LinearResponse.accuracy`) against exact evaluations before
+relying on it.
+
+Smokescreen Linear Response
+---------------------------
+
+.. autoclass:: LinearResponse
+    :members:
+.. autofunction:: finite_difference_steps
+'''
+import numpy as np
+
+
+def finite_difference_steps(reference, step=1e-3):
+    """
+    Steps of the central finite differences.
+
+    Parameters
+    ----------
+    reference : array_like
+        Reference values of the parameters.
+    step : float, optional
+        Step relative to the reference value (absolute for parameters whose
+        reference value is zero). By default 1e-3.
+
+    Returns
+    -------
+    np.ndarray
+        Step of each parameter.
+    """
+    reference = np.asarray(reference, dtype=float)
+    return np.where(reference != 0, step * np.abs(reference), step)
+
+
+class LinearResponse():
+    """
+    Linear response of the theory vector to the shifted parameters.
+
+    Parameters
+    ----------
+    parameters : list
+        Names of the parameters (the columns of ``jacobian``).
+    reference : array_like
+        Reference values of the parameters.
+    theory_vec_fid : array_like
+        Theory vector at the reference values.
+    jacobian : array_like
+        Array of shape ``(len(theory_vec_fid), len(parameters))`` with the
+        derivatives of the theory vector.
+
+    Attributes
+    ----------
+    validation : dict or None
+        Accuracy at the validation points (see :meth:`accuracy`), set by
+        :meth:`smokescreen.datavector.ConcealDataVector.linear_response`.
+    """
+    def __init__(self, parameters, reference, theory_vec_fid, jacobian):
+        self.parameters = list(parameters)
+        self.reference = np.asarray(reference, dtype=float)
+        self.theory_vec_fid = np.asarray(theory_vec_fid, dtype=float)
+        self.jacobian = np.asarray(jacobian, dtype=float)
+        if self.jacobian.shape != (self.theory_vec_fid.size, len(self.parameters)):
+            raise ValueError(f"The Jacobian has shape {self.jacobian.shape}, expected "
+                             f"{(self.theory_vec_fid.size, len(self.parameters))}")
+        self.validation = None
+
+    @classmethod
+    def from_finite_differences(cls, parameters, reference, steps, theory_vec_fid,
+                                theory_vecs_plus, theory_vecs_minus):
+        """
+        Builds the linear response from central finite differences.
+
+        Parameters
+        ----------
+        parameters : list
+            Names of the parameters.
+        reference : array_like
+            Reference values of the parameters.
+        steps : array_like
+            Step of each parameter, see :func:`finite_difference_steps`.
+        theory_vec_fid : array_like
+            Theory vector at the reference values.
+        theory_vecs_plus, theory_vecs_minus : array_like
+            Theory vectors with the i-th parameter moved by ``+steps[i]``
+            and ``-steps[i]``, one row per parameter.
+
+        Returns
+        -------
+        LinearResponse
+            The linear response.
+        """
+        steps = np.asarray(steps, dtype=float)
+        difference = (np.asarray(theory_vecs_plus, dtype=float)
+                      - np.asarray(theory_vecs_minus, dtype=float))
+        return cls(parameters, reference, theory_vec_fid, (difference / (2 * steps[:, None])).T)
+
+    def parameter_offsets(self, shifts, parameters=None):
+        """
+        Offsets of the shifted parameters from the reference values.
+
+        Parameters
+        ----------
+        shifts : dict or array_like
+            Shifted parameter values, as a dictionary (one shift) or as an
+            array whose last axis follows ``parameters``. Parameters that
+            are not given stay at their reference value.
+        parameters : list, optional
+            Names of the columns of an array of shifts. By default
+            ``self.parameters``.
+
+        Returns
+        -------
+        np.ndarray
+            Offsets, with the last axis following ``self.parameters``.
+
+        Raises
+        ------
+        ValueError
+            If a shifted parameter is not one of ``self.parameters``.
+        """
+        if isinstance(shifts, dict):
+            parameters, shifts = list(shifts), np.array(list(shifts.values()), dtype=float)
+        elif parameters is None:
+            parameters = self.parameters
+        shifts = np.asarray(shifts, dtype=float)
+        unknown = [name for name in parameters if name not in self.parameters]
+        if unknown:
+            raise ValueError(f"No linear response to the parameters {unknown}")
+        if shifts.shape[-1] != len(parameters):
+            raise ValueError(f"The shifts have {shifts.shape[-1]} columns, expected "
+                             f"{len(parameters)}")
+        offsets = np.zeros(shifts.shape[:-1] + (len(self.parameters),))
+        for column, name in enumerate(parameters):
+            index = self.parameters.index(name)
+            offsets[..., index] = shifts[..., column] - self.reference[index]
+        return offsets
+
+    def theory_vector(self, shifts, parameters=None):
+        """
+        Linear approximation of the theory vector at the shifted parameters.
+
+        Parameters
+        ----------
+        shifts : dict or array_like
+            Shifted parameter values, see :meth:`parameter_offsets`.
+        parameters : list, optional
+            Names of the columns of an array of shifts.
+
+        Returns
+        -------
+        np.ndarray
+            Theory vector, or one theory vector per row of ``shifts``.
+        """
+        return self.theory_vec_fid + self.parameter_offsets(shifts, parameters) @ self.jacobian.T
+
+    def concealing_factor(self, shifts, factor_type="add", parameters=None):
+        """
+        Linear approximation of the concealing factor.
+
+        Parameters
+        ----------
+        shifts : dict or array_like
+            Shifted parameter values, see :meth:`parameter_offsets`.
+        factor_type : str
+            Type of concealing factor, ``add`` or ``mult``. Default is ``add``.
+        parameters : list, optional
+            Names of the columns of an array of shifts.
+
+        Returns
+        -------
+        np.ndarray
+            Concealing factor, or one concealing factor per row of ``shifts``.
+        """
+        return self._concealing_factor(self.theory_vector(shifts, parameters), factor_type)
+
+    def _concealing_factor(self, theory_vec, factor_type):
+        if factor_type == "add":
+            return theory_vec - self.theory_vec_fid
+        elif factor_type == "mult":
+            return theory_vec / self.theory_vec_fid
+        else:
+            raise NotImplementedError('Only "add" and "mult" concealing factor is implemented')
+
+    def accuracy(self, shifts, exact_theory_vecs, sigma=None, parameters=None):
+        """
+        Accuracy of the linear approximation against exact theory vectors.
+
+        Parameters
+        ----------
+        shifts : array_like or list of dict
+            Shifted parameter values of the validation points, see
+            :meth:`parameter_offsets`.
+        exact_theory_vecs : array_like
+            Exact theory vectors at the validation points, one row per point.
+        sigma : array_like, optional
+            Standard deviation of the data points. By default None.
+        parameters : list, optional
+            Names of the columns of an array of shifts.
+
+        Returns
+        -------
+        dict
+            For each validation point, the largest error of ``f^add``
+            relative to the largest ``|f^add|`` (``add_relative_error``),
+            the same for ``f^mult - 1`` (``mult_relative_error``) and, with
+            ``sigma``, the largest error of ``f^add`` in units of ``sigma``
+            (``add_error_over_sigma``).
+        """
+        if isinstance(shifts, (list, tuple)) and shifts and isinstance(shifts[0], dict):
+            approx = np.array([self.theory_vector(shift) for shift in shifts])
+        else:
+            approx = np.atleast_2d(self.theory_vector(shifts, parameters))
+        exact = np.atleast_2d(np.asarray(exact_theory_vecs, dtype=float))
+        error = np.abs(approx - exact)
+        add_exact = np.abs(exact - self.theory_vec_fid).max(axis=1)
+        mult_error = (error / np.abs(self.theory_vec_fid)).max(axis=1)
+        mult_exact = np.abs(exact / self.theory_vec_fid - 1).max(axis=1)
+        result = {"add_relative_error": error.max(axis=1) / add_exact,
+                  "mult_relative_error": mult_error / mult_exact}
+        if sigma is not None:
+            result["add_error_over_sigma"] = (error / np.asarray(sigma, dtype=float)).max(axis=1)
+        return result
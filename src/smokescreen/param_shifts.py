@@ -16,6 +16,18 @@ Parameter Shifts
 .. autofunction:: draw_flat_param_shifts
 .. autofunction:: draw_flat_or_deterministic_param_shifts
 .. autofunction:: draw_gaussian_param_shifts
+
+Batches of Parameter Shifts
+---------------------------
+
+For robustness studies that need many shift vectors, the batch variants
+return an ``(n_draws, n_params)`` array. Each draw has its own random
+stream, spawned from a :class:`numpy.random.SeedSequence` of the seed, so a
+draw only depends on the seed and on its index: drawing a batch in chunks
+(see ``first_draw``) gives the same shifts as drawing it at once.
+
+.. autofunction:: draw_flat_or_deterministic_param_shifts_batch
+.. autofunction:: draw_gaussian_param_shifts_batch
 '''
 import numpy as np
 from .utils import string_to_seed
@@ -43,13 +55,13 @@ def draw_flat_param_shifts(shift_dict, seed):
     """
     if type(seed) is str:
         seed = string_to_seed(seed)
-    np.random.seed(seed)
+    rng = np.random.RandomState(seed)
     # check the if the shifts are single value or a tuple of values
     if type(list(shift_dict.values())[0]) is tuple:
-        return {par: np.random.uniform(shift_dict[par][0], shift_dict[par][1])
+        return {par: rng.uniform(shift_dict[par][0], shift_dict[par][1])
                 for par in shift_dict}
     else:
-        return {par: np.random.uniform(-shift_dict[par], shift_dict[par])
+        return {par: rng.uniform(-shift_dict[par], shift_dict[par])
                 for par in shift_dict}
 
 
@@ -78,7 +90,9 @@ def draw_flat_or_deterministic_param_shifts(cosmo, shifts_dict, seed):
     """
     if type(seed) is str:
         seed = string_to_seed(seed)
-    np.random.seed(seed)
+    # a local generator (same sequence as the legacy global seeding), so
+    # concurrent draws do not share state
+    rng = np.random.RandomState(seed)
 
     # check if the keys in the shifts_dict are in the cosmology parameters
     for key in shifts_dict.keys():
@@ -96,7 +110,7 @@ def draw_flat_or_deterministic_param_shifts(cosmo, shifts_dict, seed):
             if isinstance(shifts_dict[key], tuple):
                 # check if the tuple is of length 2
                 if len(shifts_dict[key]) == 2:
-                    shifts[key] = np.random.uniform(shifts_dict[key][0], shifts_dict[key][1])
+                    shifts[key] = rng.uniform(shifts_dict[key][0], shifts_dict[key][1])
                 else:
                     raise ValueError(f"Tuple {shifts_dict[key]} has to be of length 2")
             else:
@@ -128,7 +142,9 @@ def draw_gaussian_param_shifts(cosmo, shifts_dict, seed):
     """
     if type(seed) is str:
         seed = string_to_seed(seed)
-    np.random.seed(seed)
+    # a local generator (same sequence as the legacy global seeding), so
+    # concurrent draws do not share state
+    rng = np.random.RandomState(seed)
     for key in shifts_dict.keys():
         try:
             cosmo._params[key]
@@ -144,7 +160,7 @@ def draw_gaussian_param_shifts(cosmo, shifts_dict, seed):
             if isinstance(shifts_dict[key], tuple):
                 # check if the tuple is of length 2
                 if len(shifts_dict[key]) == 2:
-                    shifts[key] = np.random.normal(shifts_dict[key][0], shifts_dict[key][1])
+                    shifts[key] = rng.normal(shifts_dict[key][0], shifts_dict[key][1])
                 else:
                     raise ValueError(f"Tuple {shifts_dict[key]} has to be of length 2")
             else:
@@ -152,3 +168,113 @@ def draw_gaussian_param_shifts(cosmo, shifts_dict, seed):
         else:
             pass
     return shifts
+
+
+def _shifted_parameters(cosmo, shifts_dict):
+    """
+    Names of the shifted parameters, in the order of ``cosmo.to_dict()``.
+    """
+    for key in shifts_dict.keys():
+        try:
+            cosmo._params[key]
+        except (AttributeError, KeyError) as error:
+            raise ValueError(f"[{error}]Key {key} not in cosmology parameters")
+        value = shifts_dict[key]
+        if isinstance(value, tuple) and len(value) != 2:
+            raise ValueError(f"Tuple {value} has to be of length 2")
+    return [key for key in cosmo.to_dict().keys() if key in shifts_dict]
+
+
+def _draw_streams(seed, n_draws, n_params, first_draw, method):
+    """
+    Draws ``n_params`` standard variates per draw, each draw from its own
+    generator spawned from the seed sequence of ``seed``.
+    """
+    if type(seed) is str:
+        seed = string_to_seed(seed)
+    if n_draws < 0 or first_draw < 0:
+        raise ValueError("n_draws and first_draw must be non-negative")
+    draws = np.empty((n_draws, n_params))
+    for i in range(n_draws):
+        # same stream as the (first_draw + i)-th child of SeedSequence(seed).spawn
+        stream = np.random.SeedSequence(seed, spawn_key=(first_draw + i,))
+        draws[i] = getattr(np.random.default_rng(stream), method)(n_params)
+    return draws
+
+
+def draw_flat_or_deterministic_param_shifts_batch(cosmo, shifts_dict, seed, n_draws,
+                                                  first_draw=0):
+    """
+    Draw a batch of flat or deterministic parameter shifts.
+
+    Batch variant of :func:`draw_flat_or_deterministic_param_shifts`: the
+    parameters with (lower, upper) bounds are drawn uniformly, the others
+    are shifted deterministically (the same value in every draw).
+
+    Parameters
+    ----------
+    cosmo : pyccl.Cosmology
+        Cosmology object.
+    shifts_dict : dict
+        Dictionary of parameter names and corresponding shift, see
+        :func:`draw_flat_or_deterministic_param_shifts`.
+    seed : int or str
+        Random seed.
+    n_draws : int
+        Number of shift vectors.
+    first_draw : int, optional
+        Index of the first draw, to draw a batch in chunks. By default 0.
+
+    Returns
+    -------
+    params : list
+        Names of the shifted parameters (the columns of ``shifts``), in the
+        order of ``cosmo.to_dict()``.
+    shifts : np.ndarray
+        Array of shape ``(n_draws, len(params))`` with the shifts.
+    """
+    params = _shifted_parameters(cosmo, shifts_dict)
+    low = np.array([shifts_dict[key][0] if isinstance(shifts_dict[key], tuple)
+                    else shifts_dict[key] for key in params], dtype=float)
+    high = np.array([shifts_dict[key][1] if isinstance(shifts_dict[key], tuple)
+                     else shifts_dict[key] for key in params], dtype=float)
+    uniform = _draw_streams(seed, n_draws, len(params), first_draw, "random")
+    return params, low + (high - low) * uniform
+
+
+def draw_gaussian_param_shifts_batch(cosmo, shifts_dict, seed, n_draws, first_draw=0):
+    """
+    Draw a batch of Gaussian parameter shifts.
+
+    Batch variant of :func:`draw_gaussian_param_shifts`.
+
+    Parameters
+    ----------
+    cosmo : pyccl.Cosmology
+        Cosmology object.
+    shifts_dict : dict
+        Dictionary of parameter names and corresponding (mean, std) of the
+        Gaussian distribution.
+    seed : int or str
+        Random seed.
+    n_draws : int
+        Number of shift vectors.
+    first_draw : int, optional
+        Index of the first draw, to draw a batch in chunks. By default 0.
+
+    Returns
+    -------
+    params : list
+        Names of the shifted parameters (the columns of ``shifts``), in the
+        order of ``cosmo.to_dict()``.
+    shifts : np.ndarray
+        Array of shape ``(n_draws, len(params))`` with the shifts.
+    """
+    params = _shifted_parameters(cosmo, shifts_dict)
+    for key in params:
+        if not isinstance(shifts_dict[key], tuple):
+            raise ValueError(f"Value {shifts_dict[key]} has to be a tuple of length 2")
+    mean = np.array([shifts_dict[key][0] for key in params], dtype=float)
+    std = np.array([shifts_dict[key][1] for key in params], dtype=float)
+    normal = _draw_streams(seed, n_draws, len(params), first_draw, "standard_normal")
+    return params, mean + std * normal
@@ -0,0 +1,209 @@
+# author: Arthur Loureiro <arthur.loureiro@fysik.su.se>
+# license: BSD 3-Clause
+'''
+Profiling (:mod:`smokescreen.profiling`)
+=========================================
+
+.. currentmodule:: smokescreen.profiling
+
+The :mod:`smokescreen.profiling` module runs a function under
+:mod:`cProfile` (and optionally :mod:`tracemalloc`) and summarises where
+the time and memory went, grouped by package: CCL (``pyccl``),
+``firecrown``, ``sacc`` and Smokescreen itself. It is used by the
+``smokescreen profile`` subcommand.
+
+The time of a package is the self time of its functions, including the
+compiled functions it calls directly (e.g. the CCL C library), so the
+package times add up to the total profiled time.
+
+Smokescreen Profiling
+---------------------
+
+.. autofunction:: run_profiled
+.. autofunction:: summarize_profile
+.. autofunction:: format_profile_summary
+.. autofunction:: package_of
+.. autodata:: PACKAGES
+'''
+import re
+import pathlib
+import cProfile
+import pstats
+import tracemalloc
+
+# packages the profile is grouped by
+PACKAGES = ("pyccl", "firecrown", "sacc", "smokescreen")
+_PACKAGE_PATTERN = re.compile(r"\b(" + "|".join(PACKAGES) + r")\b")
+
+
+def package_of(filename, function_name=""):
+    """
+    Package of a profiled function or of an allocation.
+
+    Parameters
+    ----------
+    filename : str
+        File of the function, ``~`` for built-in and compiled functions.
+    function_name : str, optional
+        Name of the function, used for the built-in and compiled functions
+        (e.g. ``<built-in method pyccl._ccllib.xxx>``).
+
+    Returns
+    -------
+    str
+        One of :data:`PACKAGES`, ``builtins`` for other built-in functions,
+        ``imports`` for the import machinery or ``other``.
+    """
+    if filename == "~":
+        match = _PACKAGE_PATTERN.search(function_name)
+        return match.group(1) if match else "builtins"
+    if filename.startswith("<frozen importlib"):
+        return "imports"
+    parts = pathlib.PurePath(filename).parts
+    for package in PACKAGES:
+        if package in parts:
+            return package
+    return "other"
+
+
+def run_profiled(func, *args, trace_memory=False, **kwargs):
+    """
+    Runs ``func(*args, **kwargs)`` under :mod:`cProfile`.
+
+    Parameters
+    ----------
+    func : callable
+        Function to profile.
+    *args
+        Positional arguments of ``func``.
+    trace_memory : bool, optional
+        If True, also traces the memory allocations with :mod:`tracemalloc`
+        (which slows the run down). By default False.
+    **kwargs
+        Keyword arguments of ``func``.
+
+    Returns
+    -------
+    result
+        Return value of ``func``.
+    stats : pstats.Stats
+        Profiling statistics.
+    memory : tuple or None
+        ``(snapshot, peak_bytes)`` with the :class:`tracemalloc.Snapshot`
+        at the end of the run and the peak of the traced memory, or None if
+        ``trace_memory`` is False.
+    """
+    profiler = cProfile.Profile()
+    memory = None
+    if trace_memory:
+        tracemalloc.start()
+    try:
+        result = profiler.runcall(func, *args, **kwargs)
+        if trace_memory:
+            memory = (tracemalloc.take_snapshot(), tracemalloc.get_traced_memory()[1])
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+    return result, pstats.Stats(profiler), memory
+
+
+def _sorted_totals(totals):
+    return dict(sorted(totals.items(), key=lambda item: item[1], reverse=True))
+
+
+def summarize_profile(stats, top=20, memory=None):
+    """
+    Summarises a profile by package.
+
+    Parameters
+    ----------
+    stats : pstats.Stats
+        Profiling statistics, see :func:`run_profiled`.
+    top : int, optional
+        Number of functions (and allocation sites) listed. By default 20.
+    memory : tuple, optional
+        ``(snapshot, peak_bytes)`` from :func:`run_profiled`. By default None.
+
+    Returns
+    -------
+    dict
+        ``total_seconds``, the self time of each package (``packages``) and
+        the ``top_functions`` by self time. With ``memory``, also the
+        ``memory`` held at the end of the run by package, its peak and the
+        ``top_allocations``.
+    """
+    packages = {}
+    functions = []
+    for (filename, line, name), (_, calls, self_time, cumulative, _) in stats.stats.items():
+        package = package_of(filename, name)
+        packages[package] = packages.get(package, 0.0) + self_time
+        functions.append({
+            "function": pstats.func_std_string((filename, line, name)),
+            "package": package,
+            "calls": calls,
+            "self_seconds": self_time,
+            "cumulative_seconds": cumulative,
+        })
+    functions.sort(key=lambda function: function["self_seconds"], reverse=True)
+    summary = {
+        "total_seconds": stats.total_tt,
+        "packages": _sorted_totals(packages),
+        "top_functions": functions[:top],
+    }
+    if memory is not None:
+        snapshot, peak = memory
+        allocations = snapshot.statistics("lineno")
+        memory_packages = {}
+        for allocation in allocations:
+            package = package_of(allocation.traceback[0].filename)
+            memory_packages[package] = memory_packages.get(package, 0) + allocation.size
+        summary["memory"] = {
+            "peak_bytes": peak,
+            "packages": _sorted_totals(memory_packages),
+            "top_allocations": [{"location": str(allocation.traceback[0]),
+                                 "package": package_of(allocation.traceback[0].filename),
+                                 "bytes": allocation.size,
+                                 "blocks": allocation.count}
+                                for allocation in allocations[:top]],
+        }
+    return summary
+
+
+def format_profile_summary(summary):
+    """
+    Formats a summary from :func:`summarize_profile` as text.
+
+    Parameters
+    ----------
+    summary : dict
+        Profile summary.
+
+    Returns
+    -------
+    str
+        Time (and memory) by package and the top functions (and allocations).
+    """
+    total = summary["total_seconds"]
+    lines = [f"Time by package (self time, {total:.3f} s in total):"]
+    for package, seconds in summary["packages"].items():
+        share = 100 * seconds / total if total > 0 else 0.0
+        lines.append(f"  {package:<12} {seconds:10.3f} s {share:6.1f}%")
+    lines.append("")
+    lines.append(f"Top {len(summary['top_functions'])} functions by self time:")
+    lines.append(f"  {'self [s]':>10} {'cumul. [s]':>10} {'calls':>8}  {'package':<12} function")
+    for function in summary["top_functions"]:
+        lines.append(f"  {function['self_seconds']:10.3f} {function['cumulative_seconds']:10.3f} "
+                     f"{function['calls']:8d}  {function['package']:<12} {function['function']}")
+    if "memory" in summary:
+        memory = summary["memory"]
+        lines.append("")
+        lines.append(f"Memory held at the end of the run by package "
+                     f"(peak of the traced memory {memory['peak_bytes'] / 2**20:.2f} MB):")
+        for package, size in memory["packages"].items():
+            lines.append(f"  {package:<12} {size / 2**20:10.2f} MB")
+        lines.append("")
+        lines.append(f"Top {len(memory['top_allocations'])} allocation sites:")
+        for allocation in memory["top_allocations"]:
+            lines.append(f"  {allocation['bytes'] / 2**20:10.2f} MB {allocation['blocks']:8d} blocks"
+                         f"  {allocation['package']:<12} {allocation['location']}")
+    return "\n".join(lines)
@@ -0,0 +1,210 @@
+# author: Arthur Loureiro <arthur.loureiro@fysik.su.se>
+# license: BSD 3-Clause
+'''
+Theory Samples (:mod:`smokescreen.sampling`)
+=============================================
+
+.. currentmodule:: smokescreen.sampling
+
+The :mod:`smokescreen.sampling` module provides the on-disk store of the
+theory vectors evaluated over a space-filling design of the shifts, used by
+:meth:`smokescreen.datavector.ConcealDataVector.sample_theory` and the
+``smokescreen sample-theory`` subcommand (e.g. to train
+:class:`smokescreen.emulator.TheoryEmulator` or for sensitivity studies).
+
+A store is a directory with:
+
+- ``design.json``: the parameters, bounds, seed and identifier of the
+  likelihood and data the design was drawn for;
+- ``samples.npy``: the design, one row per sample;
+- ``theory_vecs.npy``: the theory vectors, written in place through a
+  memory map as they are computed;
+- ``done.npy``: which samples have been computed;
+- ``cosmologies.jsonl``: one line per computed sample with its full
+  cosmology and evaluation time.
+
+A sample is flagged as done only after its theory vector has been flushed
+to disk, so an interrupted run can be resumed: opening the store again
+with the same design only leaves the samples that were not done.
+
+Smokescreen Theory Samples
+--------------------------
+
+.. autoclass:: TheorySampleStore
+    :members:
+'''
+import os
+import json
+import numpy as np
+
+from ._version import __version__
+
+
+class TheorySampleStore():
+    """
+    Chunked, resumable on-disk store of theory vectors.
+
+    Use :meth:`open` to create or resume a store.
+
+    Parameters
+    ----------
+    path : str
+        Directory of the store.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "design.json")) as file:
+            self.design = json.load(file)
+        self.parameters = self.design["parameters"]
+        self.samples = np.load(os.path.join(path, "samples.npy"))
+        self._done = np.lib.format.open_memmap(os.path.join(path, "done.npy"), mode="r+")
+        self._theory_vecs = None
+        if os.path.exists(os.path.join(path, "theory_vecs.npy")):
+            self._theory_vecs = np.lib.format.open_memmap(os.path.join(path, "theory_vecs.npy"),
+                                                          mode="r+")
+
+    @classmethod
+    def open(cls, path, parameters, bounds, samples, seed=None, key=None):
+        """
+        Creates a store for a design, or opens the existing store of the
+        same design to resume it.
+
+        Parameters
+        ----------
+        path : str
+            Directory of the store.
+        parameters : list
+            Names of the parameters (the columns of ``samples``).
+        bounds : array_like
+            Bounds of the design, one row per parameter.
+        samples : array_like
+            The design, one row per sample.
+        seed : int or str, optional
+            Seed the design was drawn with.
+        key : str, optional
+            Identifier of the likelihood and data.
+
+        Returns
+        -------
+        TheorySampleStore
+            The store.
+
+        Raises
+        ------
+        ValueError
+            If the directory holds the store of another design.
+        """
+        samples = np.asarray(samples, dtype=float)
+        design = {"parameters": list(parameters),
+                  "bounds": np.asarray(bounds, dtype=float).tolist(),
+                  "n_samples": len(samples), "seed": seed, "key": key}
+        if os.path.exists(os.path.join(path, "design.json")):
+            store = cls(path)
+            stored = {name: store.design.get(name) for name in design}
+            if stored != design or not np.array_equal(store.samples, samples):
+                raise ValueError(f"{path} holds theory samples of another design: "
+                                 f"{stored}")
+            return store
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "samples.npy"), samples)
+        done = np.lib.format.open_memmap(os.path.join(path, "done.npy"), mode="w+",
+                                         dtype=bool, shape=(len(samples),))
+        done.flush()
+        del done
+        # the design is written last: a directory without it is not a store yet
+        with open(os.path.join(path, "design.json"), "w") as file:
+            json.dump(dict(design, smokescreen_version=__version__), file, indent=2)
+        return cls(path)
+
+    @property
+    def done(self):
+        """
+        Boolean array flagging the computed samples.
+        """
+        return np.array(self._done)
+
+    def pending(self):
+        """
+        Indices of the samples not computed yet.
+        """
+        return np.flatnonzero(~self._done)
+
+    def write(self, indices, theory_vecs, cosmologies=None, seconds=None):
+        """
+        Writes the theory vectors of some samples and flags them as done.
+
+        Parameters
+        ----------
+        indices : array_like
+            Indices of the samples.
+        theory_vecs : array_like
+            Their theory vectors, one row per sample.
+        cosmologies : list of dict, optional
+            Their cosmological parameters, written to ``cosmologies.jsonl``.
+        seconds : array_like, optional
+            Their evaluation times.
+        """
+        indices = np.asarray(indices, dtype=int)
+        theory_vecs = np.atleast_2d(np.asarray(theory_vecs, dtype=float))
+        if self._theory_vecs is None:
+            # the length of the theory vector is known from the first result
+            self._theory_vecs = np.lib.format.open_memmap(
+                os.path.join(self.path, "theory_vecs.npy"), mode="w+", dtype=float,
+                shape=(len(self.samples), theory_vecs.shape[1]))
+        self._theory_vecs[indices] = theory_vecs
+        self._theory_vecs.flush()
+        if cosmologies is not None:
+            path = os.path.join(self.path, "cosmologies.jsonl")
+            with open(path, "ab+") as file:
+                # a line cut by an interruption is closed before appending
+                file.seek(0, os.SEEK_END)
+                if file.tell() > 0:
+                    file.seek(-1, os.SEEK_END)
+                    if file.read(1) != b"\n":
+                        file.write(b"\n")
+                for i, index in enumerate(indices):
+                    record = {"index": int(index), "cosmology": cosmologies[i]}
+                    if seconds is not None:
+                        record["seconds"] = float(seconds[i])
+                    file.write((json.dumps(record, default=str) + "\n").encode())
+        self._done[indices] = True
+        self._done.flush()
+
+    def cosmologies(self):
+        """
+        Cosmological parameters of the computed samples.
+
+        Returns
+        -------
+        dict
+            The cosmology (and evaluation time) of each written sample, by
+            index. Lines cut by an interruption are skipped.
+        """
+        records = {}
+        path = os.path.join(self.path, "cosmologies.jsonl")
+        if not os.path.exists(path):
+            return records
+        with open(path) as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                records[record["index"]] = record
+        return records
+
+    def theory_samples(self):
+        """
+        The computed samples and their theory vectors.
+
+        Returns
+        -------
+        samples : np.ndarray
+            Parameter values of the computed samples.
+        theory_vecs : np.ndarray
+            Their theory vectors.
+        """
+        done = self.done
+        if self._theory_vecs is None:
+            return self.samples[done], np.empty((0, 0))
+        return self.samples[done], np.array(self._theory_vecs[done])
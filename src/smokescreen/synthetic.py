@@ -0,0 +1,184 @@
+# author: Arthur Loureiro <arthur.loureiro@fysik.su.se>
+# license: BSD 3-Clause
+'''
+Synthetic Data (:mod:`smokescreen.synthetic`)
+===================================================
+
+.. currentmodule:: smokescreen.synthetic
+
+The :mod:`smokescreen.synthetic` module generates harmonic-space 3x2pt SACC
+files of configurable size, to benchmark and stress-test the concealment
+pipeline at survey sizes (e.g. LSST Y10) much larger than the examples.
+
+The number of source and lens tracers, of ell bins, the two-point data
+types and the covariance structure can be chosen. The tracers are named
+``src{i}`` and ``lens{i}``, as in the LSST Y1 3x2pt example, and the
+firecrown likelihood module at :data:`LIKELIHOOD_PATH` builds the
+matching likelihood for any of the generated files.
+
+The data values are smooth power laws, not theory predictions: they are
+meant for timing and memory measurements, not for inference.
+
+Smokescreen Synthetic Data
+--------------------------
+
+.. autofunction:: make_synthetic_sacc
+.. autofunction:: write_synthetic_sacc
+.. autodata:: LIKELIHOOD_PATH
+'''
+import os
+import numpy as np
+import sacc
+
+# firecrown likelihood module for the generated SACC files
+LIKELIHOOD_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               "synthetic_likelihood.py")
+SHEAR = "galaxy_shear_cl_ee"
+GGL = "galaxy_shearDensity_cl_e"
+CLUSTERING = "galaxy_density_cl"
+COVARIANCE_TYPES = ("dense", "block", "diagonal")
+
+
+def _gaussian_nz(z, centres, width):
+    """
+    Gaussian redshift distributions centred at ``centres``.
+    """
+    return [np.exp(-0.5 * ((z - centre) / (width * (1 + centre)))**2) for centre in centres]
+
+
+def _tracer_pairs(data_type, n_source, n_lens):
+    if data_type == SHEAR:
+        return [(f"src{i}", f"src{j}") for i in range(n_source) for j in range(i, n_source)]
+    if data_type == GGL:
+        return [(f"src{i}", f"lens{j}") for i in range(n_source) for j in range(n_lens)]
+    # galaxy clustering: auto-correlations only
+    return [(f"lens{i}", f"lens{i}") for i in range(n_lens)]
+
+
+def _correlation(n, correlation):
+    """
+    Correlation matrix with ``correlation**|i - j|`` entries, positive
+    definite for ``|correlation| < 1``.
+    """
+    index = np.arange(n)
+    return correlation**np.abs(index[:, None] - index[None, :])
+
+
+def make_synthetic_sacc(n_source=5, n_lens=5, n_ell=20,
+                        data_types=(SHEAR, GGL, CLUSTERING), covariance="block",
+                        ell_min=20.0, ell_max=2000.0, n_z=200, ell_correlation=0.3,
+                        block_correlation=0.1):
+    """
+    Builds a synthetic 3x2pt SACC object.
+
+    Parameters
+    ----------
+    n_source : int
+        Number of weak-lensing source tracers (``src0``, ``src1``, ...).
+    n_lens : int
+        Number of number-counts lens tracers (``lens0``, ``lens1``, ...).
+    n_ell : int
+        Number of logarithmically spaced ell bins of each two-point function.
+    data_types : tuple
+        SACC data types to include, any of ``galaxy_shear_cl_ee`` (all
+        source pairs), ``galaxy_shearDensity_cl_e`` (all source-lens pairs)
+        and ``galaxy_density_cl`` (lens auto-correlations).
+    covariance : str
+        Covariance structure: ``'dense'`` (a full matrix, correlating all
+        two-point functions), ``'block'`` (a block-diagonal matrix with one
+        block per two-point function) or ``'diagonal'``.
+    ell_min, ell_max : float
+        Range of the ell bins.
+    n_z : int
+        Number of redshift samples of the n(z) of the tracers.
+    ell_correlation : float
+        Correlation between neighbouring ell bins.
+    block_correlation : float
+        Correlation between two-point functions of a dense covariance.
+
+    Returns
+    -------
+    sacc.Sacc
+        Synthetic SACC object.
+
+    Raises
+    ------
+    ValueError
+        If the options are not valid.
+    """
+    if n_ell < 1:
+        raise ValueError("n_ell must be positive")
+    if covariance not in COVARIANCE_TYPES:
+        raise ValueError(f"Unknown covariance type {covariance}, options are {COVARIANCE_TYPES}")
+    for data_type in data_types:
+        if data_type not in (SHEAR, GGL, CLUSTERING):
+            raise ValueError(f"Unsupported data type {data_type}")
+    if n_source < 1 and (SHEAR in data_types or GGL in data_types):
+        raise ValueError("Shear data types need at least one source tracer")
+    if n_lens < 1 and (GGL in data_types or CLUSTERING in data_types):
+        raise ValueError("Clustering data types need at least one lens tracer")
+    if not (0 <= ell_correlation < 1 and 0 <= block_correlation < 1):
+        raise ValueError("Correlations must be in [0, 1)")
+
+    sacc_data = sacc.Sacc()
+    z = np.linspace(0.0, 3.0, n_z)
+    for i, nz in enumerate(_gaussian_nz(z, np.linspace(0.3, 1.5, n_source), 0.05)):
+        sacc_data.add_tracer("NZ", f"src{i}", z, nz, quantity="galaxy_shear")
+    for i, nz in enumerate(_gaussian_nz(z, np.linspace(0.25, 1.05, n_lens), 0.03)):
+        sacc_data.add_tracer("NZ", f"lens{i}", z, nz, quantity="galaxy_density")
+
+    ells = np.geomspace(ell_min, ell_max, n_ell)
+    # smooth spectra of roughly the right amplitude for each probe
+    amplitudes = {SHEAR: 1e-9, GGL: 1e-8, CLUSTERING: 1e-7}
+    n_blocks = 0
+    for data_type in data_types:
+        for tracer1, tracer2 in _tracer_pairs(data_type, n_source, n_lens):
+            values = amplitudes[data_type] * (ells / 100.0)**-1.2
+            sacc_data.add_ell_cl(data_type, tracer1, tracer2, ells, values)
+            n_blocks += 1
+
+    # 10% errors, correlated between ell bins
+    sigma = 0.1 * np.abs(sacc_data.mean)
+    if covariance == "diagonal":
+        sacc_data.add_covariance(sigma**2)
+        return sacc_data
+    ell_block = _correlation(n_ell, ell_correlation)
+    if covariance == "block":
+        blocks = [ell_block * np.outer(s, s) for s in sigma.reshape(n_blocks, n_ell)]
+        sacc_data.add_covariance(sacc.covariance.BlockDiagonalCovariance(blocks))
+        return sacc_data
+    # the Kronecker product of two positive-definite matrices is positive definite
+    between_blocks = np.full((n_blocks, n_blocks), block_correlation)
+    np.fill_diagonal(between_blocks, 1.0)
+    sacc_data.add_covariance(np.kron(between_blocks, ell_block) * np.outer(sigma, sigma))
+    return sacc_data
+
+
+def write_synthetic_sacc(path, file_format=None, overwrite=False, **kwargs):
+    """
+    Builds a synthetic 3x2pt SACC object and writes it to a file.
+
+    Parameters
+    ----------
+    path : str
+        Path of the SACC file.
+    file_format : str, optional
+        ``'fits'`` or ``'hdf5'``. By default None [HDF5 for ``.h5`` and
+        ``.hdf5`` files, FITS otherwise].
+    overwrite : bool, optional
+        If True, overwrites an existing file. By default False.
+    **kwargs
+        Options of :func:`make_synthetic_sacc`.
+
+    Returns
+    -------
+    sacc.Sacc
+        Synthetic SACC object written to the file.
+    """
+    if file_format is None:
+        file_format = "hdf5" if path.endswith((".h5", ".hdf5")) else "fits"
+    if file_format not in ("fits", "hdf5"):
+        raise ValueError(f"Unknown file format {file_format}")
+    sacc_data = make_synthetic_sacc(**kwargs)
+    getattr(sacc_data, f"save_{file_format}")(path, overwrite=overwrite)
+    return sacc_data
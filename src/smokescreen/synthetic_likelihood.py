@@ -0,0 +1,93 @@
+"""Firecrown likelihood for the synthetic 3x2pt SACC files of
+:mod:`smokescreen.synthetic`.
+
+Based on the LSST Y1 3x2pt example likelihood
+(``examples/lsst_3x2pt/3x2pt_likelihood.py``): the two-point functions are
+read from the SACC file, so the same module works for any number of
+tracers, ell bins and data types. The amplitude parameter is ``sigma8``.
+"""
+import pathlib
+import sacc
+from firecrown.data_functions import (
+    extract_all_harmonic_data,
+    check_two_point_consistence_harmonic,
+)
+from firecrown.likelihood import TwoPoint, TwoPointFactory
+from firecrown.modeling_tools import ModelingTools, CCLFactory, PoweSpecAmplitudeParameter
+from firecrown.metadata_types import TwoPointCorrelationSpace
+
+import firecrown.likelihood.weak_lensing as wl
+import firecrown.likelihood.number_counts as nc
+from firecrown.likelihood.weak_lensing import PhotoZShiftFactory
+
+from firecrown.likelihood import (
+    ConstGaussian,
+    Likelihood,
+    NamedParameters,
+)
+from smokescreen.utils import covariance_to_dense, load_sacc_file
+
+
+def build_likelihood(
+        build_parameters: NamedParameters,
+) -> tuple[Likelihood, ModelingTools]:
+    """
+    Create a firecrown likelihood for a synthetic 3x2pt analysis.
+
+    Parameters
+    ----------
+    build_parameters : NamedParameters
+        Must contain ``sacc_data``: a path to a SACC file or a SACC object.
+
+    Returns
+    -------
+    likelihood : firecrown.likelihood.Likelihood
+        A firecrown likelihood object.
+    tools : firecrown.modeling_tools.ModelingTools
+        Modeling tools of the likelihood.
+    """
+    try:
+        sacc_data = build_parameters['sacc_data']
+    except TypeError:
+        sacc_data = build_parameters.data['sacc_data']
+
+    # the sacc data can be given as a file or as an object
+    if isinstance(sacc_data, (str, pathlib.Path)):
+        sacc_data, _ = load_sacc_file(str(sacc_data))
+    elif isinstance(sacc_data, sacc.Sacc):
+        sacc_data = sacc_data.copy()
+
+    two_point_cls = extract_all_harmonic_data(sacc_data)
+    check_two_point_consistence_harmonic(two_point_cls)
+
+    # weak-lensing systematics: multiplicative bias and photo-z shift per
+    # source bin, linear intrinsic alignments for all of them
+    wlf = wl.WeakLensingFactory(
+        per_bin_systematics=[wl.MultiplicativeShearBiasFactory(), PhotoZShiftFactory()],
+        global_systematics=[wl.LinearAlignmentSystematicFactory()],
+    )
+    # number-counts systematics: photo-z shift per lens bin
+    ncf = nc.NumberCountsFactory(
+        per_bin_systematics=[PhotoZShiftFactory()],
+        global_systematics=[],
+    )
+
+    all_two_point_functions = TwoPoint.from_measurement(
+        two_point_cls,
+        tp_factory=TwoPointFactory(
+            correlation_space=TwoPointCorrelationSpace.HARMONIC,
+            weak_lensing_factories=[wlf],
+            number_counts_factories=[ncf],
+        ),
+    )
+
+    # covariance_to_dense does not cache the dense matrix on the sacc object,
+    # so only the likelihood holds it
+    likelihood_ready = ConstGaussian.create_ready(all_two_point_functions,
+                                                  covariance_to_dense(sacc_data.covariance))
+
+    tools = ModelingTools(ccl_factory=CCLFactory(
+        require_nonlinear_pk=True,
+        amplitude_parameter=PoweSpecAmplitudeParameter.SIGMA8,
+    ))
+    return likelihood_ready, tools
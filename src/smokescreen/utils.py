@@ -16,13 +16,38 @@ Smokescreen Utils
 .. autofunction:: load_cosmology_from_partial_dict
 .. autofunction:: load_module_from_path
 .. autofunction:: string_to_seed
+.. autofunction:: detect_sacc_format
 .. autofunction:: load_sacc_file
+.. autofunction:: load_sacc_file_and_content
+.. autofunction:: peek_sacc_metadata
+.. autoclass:: LazySacc
+   :members:
+.. autofunction:: load_sacc_fileobj
+.. autofunction:: covariance_row_blocks
+.. autofunction:: array_digest
+.. autofunction:: covariance_digest
+.. autofunction:: covariance_memory
+.. autofunction:: covariance_to_dense
+.. autofunction:: compress_covariance
+.. autofunction:: patch_sacc_file
 '''
+import io
+import copy
+import os
+import gzip
+import functools
+import shutil
 import hashlib
 import importlib.util
+import numpy as np
 import pyccl as ccl
 import sacc
 
+# magic bytes used to detect the format of SACC files
+_HDF5_SIGNATURE = b"\x89HDF\r\n\x1a\n"
+_FITS_SIGNATURE = b"SIMPLE"
+_GZIP_SIGNATURE = b"\x1f\x8b"
+
 
 def load_cosmology_from_partial_dict(cosmo_dict):
     """
@@ -79,7 +104,12 @@ def load_cosmology_from_partial_dict(cosmo_dict):
         raise
 
 
-def load_module_from_path(path):
+# per-process cache of the modules loaded by load_module_from_path,
+# keyed by absolute path and modification time
+_MODULE_CACHE = {}
+
+
+def load_module_from_path(path, use_cache=False):
     """
     Load a module from a given path.
 
@@ -87,15 +117,31 @@ def load_module_from_path(path):
     ----------
     path : str
         Path to the module to load.
+    use_cache : bool, optional
+        If True, a module already loaded from the same file in this process
+        is returned instead of executing the file again. The file is
+        re-executed if it was modified since. Default is False.
 
     Returns
     -------
     module
         Module loaded from the given path.
     """
+    if use_cache:
+        abspath = os.path.abspath(path)
+        cache_key = (abspath, os.stat(abspath).st_mtime_ns)
+        if cache_key in _MODULE_CACHE:
+            return _MODULE_CACHE[cache_key]
+
     spec = importlib.util.spec_from_file_location("module.name", path)
     module = importlib.util.module_from_spec(spec)
     spec.loader.exec_module(module)
+
+    if use_cache:
+        # drops stale versions of the same file
+        for key in [key for key in _MODULE_CACHE if key[0] == abspath]:
+            del _MODULE_CACHE[key]
+        _MODULE_CACHE[cache_key] = module
     return module
 
 
@@ -133,26 +179,119 @@ def modify_default_params(default_params, ccl_cosmology, systematics=None):
     Returns
     -------
     dict
-        Dictionary with the modified default parameters.
+        Copy of ``default_params`` (of the same type) with the modified
+        values. ``default_params`` itself is not changed, so it can be
+        shared between threads.
     """
-    for key, value in default_params.items():
+    params = copy.copy(default_params)
+    for key in default_params:
         if key in ccl_cosmology:
-            default_params[key] = ccl_cosmology[key]
+            params[key] = ccl_cosmology[key]
         elif systematics is not None and key in systematics:
-            default_params[key] = systematics[key]
-    return default_params
+            params[key] = systematics[key]
+    return params
+
+
+def _format_from_marker(marker):
+    """
+    SACC format ('fits' or 'hdf5') from the first 8 bytes of a file, or None.
+    """
+    if marker == _HDF5_SIGNATURE:
+        return 'hdf5'
+    if marker[:6] == _FITS_SIGNATURE:
+        return 'fits'
+    return None
+
+
+def _read_marker(path):
+    """
+    First 8 bytes of a file, looking inside gzip-compressed files.
 
+    Returns
+    -------
+    tuple
+        ``(marker, compressed)``
+    """
+    with open(path, 'rb') as file:
+        marker = file.read(8)
+    if marker[:2] != _GZIP_SIGNATURE:
+        return marker, False
+    with gzip.open(path, 'rb') as file:
+        return file.read(8), True
 
-def load_sacc_file(path_to_sacc: str) -> tuple[sacc.Sacc, str]:
+
+def detect_sacc_format(path_to_sacc: str) -> str:
+    """
+    Detects the format of a SACC file from its magic bytes.
+
+    HDF5 files start with the HDF5 signature and FITS files with the
+    ``SIMPLE`` keyword of their primary header. Gzip-compressed files
+    (as supported by sacc) are detected from their content.
+
+    Parameters
+    ----------
+    path_to_sacc : str
+        Path to the SACC file
+
+    Returns
+    -------
+    str
+        Detected format ('fits' or 'hdf5')
+
+    Raises
+    ------
+    ValueError
+        If the file cannot be read or is neither FITS nor HDF5.
+    """
+    try:
+        marker, _ = _read_marker(path_to_sacc)
+    except OSError as e:
+        raise ValueError(f"Cannot load SACC file {path_to_sacc}: {e}") from e
+    file_format = _format_from_marker(marker)
+    if file_format is None:
+        raise ValueError(f"Cannot load SACC file {path_to_sacc}: "
+                         "it is neither a FITS nor an HDF5 file")
+    return file_format
+
+
+def _load_sacc_lazily(source, file_format):
+    """
+    Loads a SACC file, given by its path or its content, without its
+    covariance, see :class:`LazySacc`.
+    """
+    tables, _ = _read_sacc_tables(source, file_format, part='data')
+    sacc_obj = LazySacc.from_tables(tables)
+    if isinstance(source, str):
+        source = os.path.abspath(source)
+    # the loader holds the path or the content, not an open file, so the
+    # object can be copied and pickled
+    sacc_obj._covariance_loader = functools.partial(_load_sacc_covariance, source, file_format)
+    return sacc_obj
+
+
+def load_sacc_file(path_to_sacc: str, lazy_covariance: bool = False) -> tuple[sacc.Sacc, str]:
     """
     Load a SACC file, automatically detecting if it's FITS or HDF5 format.
 
-    Tries load_hdf5 first (more specific), falls back to load_fits.
+    The format is detected from the magic bytes of the file (see
+    :func:`detect_sacc_format`) and the file is loaded once, with
+    ``load_hdf5`` or ``load_fits``.
+
+    With ``lazy_covariance``, the covariance tables (FITS HDUs or HDF5
+    datasets) are skipped and a :class:`LazySacc` is returned, which reads
+    the covariance from the file the first time it is accessed. This is
+    useful when only the mean, tracers or metadata are needed. FITS files
+    are memory-mapped, so the skipped HDUs are never read; HDF5 files only
+    have the attributes of the covariance dataset read. In both formats,
+    the first access to the covariance reads it in full. Compressed files
+    are always loaded in full.
 
     Parameters
     ----------
     path_to_sacc : str
         Path to the SACC file
+    lazy_covariance : bool, optional
+        If True, the covariance is only loaded when accessed. Default is False.
 
     Returns
     -------
@@ -164,23 +303,644 @@ def load_sacc_file(path_to_sacc: str) -> tuple[sacc.Sacc, str]:
     Raises
     ------
     ValueError
-        If the file cannot be loaded as either format
+        If the file format cannot be detected, or the file cannot be loaded
+        in the detected format (the original error is chained).
     """
-    # Try HDF5 first (more specific format check)
+    file_format = detect_sacc_format(path_to_sacc)
+    if lazy_covariance and _sacc_file_format(path_to_sacc) is not None:
+        loader = functools.partial(_load_sacc_lazily, file_format=file_format)
+    elif file_format == 'hdf5':
+        loader = sacc.Sacc.load_hdf5
+    else:
+        loader = sacc.Sacc.load_fits
     try:
-        sacc_obj = sacc.Sacc.load_hdf5(path_to_sacc)
-        sacc_obj._smokescreen_input_format = 'hdf5'
-        return sacc_obj, 'hdf5'
-    except Exception:
-        pass
+        sacc_obj = loader(path_to_sacc)
+    except Exception as e:
+        raise ValueError(
+            f"Cannot load SACC file {path_to_sacc} as {file_format.upper()}: {e}"
+        ) from e
+    sacc_obj._smokescreen_input_format = file_format
+    return sacc_obj, file_format
 
-    # Fall back to FITS format
+
+def load_sacc_file_and_content(path_to_sacc: str,
+                               lazy_covariance: bool = False) -> tuple[sacc.Sacc, str, bytes, str]:
+    """
+    Load a SACC file (see :func:`load_sacc_file`) from its raw content,
+    which is read once and returned together with its SHA-256 digest.
+
+    The SACC object is parsed from the content in memory, so the content
+    can then be encrypted with :func:`smokescreen.encryption.encrypt_file`
+    (``data=content, expected_digest=digest``) without reading the file
+    again, and the bytes encrypted are exactly the ones concealed. With
+    ``lazy_covariance``, the covariance is parsed from the content the
+    first time it is accessed. Gzip-compressed files are parsed from their
+    decompressed content; the compressed content is returned.
+
+    Parameters
+    ----------
+    path_to_sacc : str
+        Path to the SACC file
+    lazy_covariance : bool, optional
+        If True, the covariance is only parsed when accessed. Default is False.
+
+    Returns
+    -------
+    sacc.Sacc
+        Loaded SACC object with _smokescreen_input_format attribute set
+    str
+        Detected input format ('fits' or 'hdf5')
+    bytes
+        Content of the file
+    str
+        SHA-256 hexadecimal digest of the content
+
+    Raises
+    ------
+    ValueError
+        If the file cannot be read, is neither FITS nor HDF5, or cannot be
+        loaded in the detected format (the original error is chained).
+    """
+    try:
+        with open(path_to_sacc, 'rb') as file:
+            content = file.read()
+    except OSError as e:
+        raise ValueError(f"Cannot load SACC file {path_to_sacc}: {e}") from e
+    digest = hashlib.sha256(content).hexdigest()
+    raw = gzip.decompress(content) if content[:2] == _GZIP_SIGNATURE else content
+    file_format = _format_from_marker(raw[:8])
+    if file_format is None:
+        raise ValueError(f"Cannot load SACC file {path_to_sacc}: "
+                         "it is neither a FITS nor an HDF5 file")
     try:
-        sacc_obj = sacc.Sacc.load_fits(path_to_sacc)
-        sacc_obj._smokescreen_input_format = 'fits'
-        return sacc_obj, 'fits'
+        if lazy_covariance:
+            sacc_obj = _load_sacc_lazily(raw, file_format)
+        else:
+            sacc_obj, _ = load_sacc_fileobj(io.BytesIO(raw))
     except Exception as e:
         raise ValueError(
-            f"Cannot load SACC file {path_to_sacc}: "
-            f"HDF5 load failed and FITS load failed with: {e}"
-        )
+            f"Cannot load SACC file {path_to_sacc} as {file_format.upper()}: {e}"
+        ) from e
+    sacc_obj._smokescreen_input_format = file_format
+    return sacc_obj, file_format, content, digest
+
+
+def peek_sacc_metadata(path_to_sacc: str) -> dict:
+    """
+    Reads only the metadata of a SACC file.
+
+    Data points, tracers and covariance are not loaded, so this is cheap
+    even for large files, e.g. to check the ``concealed`` flag or the
+    ``seed_smokescreen`` of a file.
+
+    Parameters
+    ----------
+    path_to_sacc : str
+        Path to the SACC file (FITS or HDF5).
+
+    Returns
+    -------
+    dict
+        Metadata of the SACC file.
+    """
+    from astropy.table import Table
+
+    file_format = detect_sacc_format(path_to_sacc)
+    metadata = {}
+    if file_format == 'hdf5':
+        import h5py
+        with sacc.sacc.maybe_decompress(path_to_sacc) as actual_path:
+            with h5py.File(actual_path, 'r') as file:
+                if 'metadata' in file:
+                    table = Table.read(file, path='metadata')
+                    if len(table):
+                        metadata.update(sacc.io.table_to_metadata(table))
+        return metadata
+
+    from astropy.io import fits
+    # HDUs are loaded lazily: only the headers are read while looking
+    # for the metadata table
+    with fits.open(path_to_sacc, mode="readonly", memmap=True) as hdu_list:
+        for hdu in hdu_list:
+            if hdu.name.lower() == 'primary':
+                # metadata of old SACC FITS files is kept in the primary header
+                for i in range(hdu.header.get('NMETA', 0)):
+                    metadata[hdu.header[f'KEY{i}']] = hdu.header[f'VAL{i}']
+            elif hdu.header.get('SACCTYPE') == 'metadata':
+                table = Table.read(hdu)
+                if len(table):
+                    metadata.update(sacc.io.table_to_metadata(table))
+    return metadata
+
+
+# newest versions of the SACC FITS and HDF5 layouts known to _read_sacc_tables
+_SACC_FITS_VERSION = 2
+_SACC_HDF5_VERSION = 1
+
+
+def _check_sacc_version(version, file_format):
+    """
+    Raises if a SACC file was written in a layout newer than the ones known
+    to both Smokescreen and the installed sacc.
+    """
+    if file_format == 'hdf5':
+        supported = min(_SACC_HDF5_VERSION, getattr(sacc.sacc, 'SACCHDF5VER', _SACC_HDF5_VERSION))
+    else:
+        supported = min(_SACC_FITS_VERSION, getattr(sacc.sacc, 'SACCFVER', _SACC_FITS_VERSION))
+    if version > supported:
+        raise ValueError(f"Unsupported SACC {file_format.upper()} version: {version}")
+
+
+def _read_sacc_tables(source, file_format, part='all'):
+    """
+    Reads the tables of a SACC file, as ``sacc.Sacc.load_fits`` and
+    ``sacc.Sacc.load_hdf5`` do, optionally keeping only part of them.
+
+    This mirrors the file layout written by sacc, including its version
+    checks, and has to be updated by hand with it (see
+    ``_SACC_FITS_VERSION`` and ``_SACC_HDF5_VERSION``): files written in a
+    newer layout are rejected rather than parsed.
+
+    Parameters
+    ----------
+    source : str, bytes or file object
+        Path to an uncompressed SACC file, its content, or a binary file
+        object.
+    file_format : str
+        'fits' or 'hdf5'
+    part : str
+        'all', 'data' (everything but the covariance) or 'covariance'.
+
+    Returns
+    -------
+    tuple
+        ``(tables, legacy_covariance)``: astropy tables to be passed to
+        ``sacc.Sacc.from_tables`` and the covariance of legacy FITS files
+        stored in a ``covariance`` HDU (or None).
+    """
+    from astropy.table import Table
+
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+
+    def wanted(sacc_type):
+        if part == 'all':
+            return True
+        return (sacc_type == 'covariance') == (part == 'covariance')
+
+    tables = []
+    legacy_covariance = None
+    if file_format == 'hdf5':
+        import h5py
+        with h5py.File(source, 'r') as file:
+            version = 1
+            if 'sacc_hdf5_version' in file:
+                version = int(np.array(file['sacc_hdf5_version'])[0])
+            _check_sacc_version(version, file_format)
+            for key, item in file.items():
+                if key == 'sacc_hdf5_version':
+                    continue
+                if isinstance(item, h5py.Dataset):
+                    if wanted(item.attrs.get('SACCTYPE')):
+                        tables.append(Table.read(file, path=key))
+                elif part != 'covariance':
+                    # groups hold data points, tracers and windows
+                    for subkey in item.keys():
+                        tables.append(Table.read(item, path=subkey))
+        return tables, legacy_covariance
+
+    from astropy.io import fits
+    metadata = {}
+    # HDUs are memory-mapped and loaded lazily, so skipped HDUs are never read
+    with fits.open(source, mode="readonly", memmap=True) as hdu_list:
+        for hdu in hdu_list:
+            if hdu.name.lower() == 'primary':
+                _check_sacc_version(hdu.header.get('SACCFVER', 1), file_format)
+                # metadata of old SACC FITS files is kept in the primary header
+                for i in range(hdu.header.get('NMETA', 0)):
+                    metadata[hdu.header[f'KEY{i}']] = hdu.header[f'VAL{i}']
+            elif hdu.name.lower() == 'covariance':
+                if wanted('covariance'):
+                    legacy_covariance = sacc.covariance.BaseCovariance.from_hdu(hdu)
+            elif wanted(hdu.header.get('SACCTYPE')):
+                tables.append(Table.read(hdu))
+    if metadata and part != 'covariance':
+        tables.append(sacc.io.metadata_to_table(metadata))
+    return tables, legacy_covariance
+
+
+def _load_sacc_covariance(source, file_format):
+    """
+    Loads only the covariance of a SACC file, given by its path or its
+    content, or None if it has none.
+    """
+    tables, legacy_covariance = _read_sacc_tables(source, file_format, part='covariance')
+    if legacy_covariance is not None:
+        return legacy_covariance
+    if not tables:
+        return None
+    return sacc.io.from_tables(tables)['covariance']['cov']
+
+
+class LazySacc(sacc.Sacc):
+    """
+    SACC object whose covariance is only loaded from its file when it is
+    first accessed.
+
+    Created by :func:`load_sacc_file` and :func:`load_sacc_file_and_content`
+    with ``lazy_covariance=True``, from FITS or HDF5 files. It behaves as a
+    :class:`sacc.Sacc` object; the first access to :attr:`covariance` reads
+    the whole covariance from the file (or the content it was loaded
+    from), and assigning a covariance replaces the pending one.
+    """
+    @property
+    def covariance(self):
+        loader = self.__dict__.pop('_covariance_loader', None)
+        if loader is not None:
+            covariance = loader()
+            if covariance is not None and covariance.size != len(self):
+                raise ValueError("Covariance has the wrong size. "
+                                 f"Should be {len(self)} but is {covariance.size}")
+            self._covariance = covariance
+        return self._covariance
+
+    @covariance.setter
+    def covariance(self, value):
+        self.__dict__.pop('_covariance_loader', None)
+        self._covariance = value
+
+    @property
+    def covariance_loaded(self):
+        """
+        Whether the covariance has been loaded (or set).
+        """
+        return '_covariance_loader' not in self.__dict__
+
+
+def load_sacc_fileobj(fileobj) -> tuple[sacc.Sacc, str]:
+    """
+    Load a SACC object from a binary file object, in FITS or HDF5 format.
+
+    The format is detected from the first bytes. This mirrors
+    ``sacc.Sacc.load_fits`` and ``sacc.Sacc.load_hdf5``, which only accept
+    file names, so data held in memory (e.g. decrypted) never has to be
+    written to disk.
+
+    Parameters
+    ----------
+    fileobj : file object
+        Readable and seekable binary file object, positioned at the start
+        of the SACC content.
+
+    Returns
+    -------
+    sacc.Sacc
+        Loaded SACC object with _smokescreen_input_format attribute set
+    str
+        Detected input format ('fits' or 'hdf5')
+
+    Raises
+    ------
+    ValueError
+        If the content is neither FITS nor HDF5, or was written in a SACC
+        layout newer than the supported one.
+    """
+    start = fileobj.tell()
+    file_format = _format_from_marker(fileobj.read(8))
+    fileobj.seek(start)
+    if file_format is None:
+        raise ValueError("Cannot load SACC content: it is neither FITS nor HDF5")
+    tables, cov = _read_sacc_tables(fileobj, file_format)
+    sacc_obj = sacc.Sacc.from_tables(tables, cov=cov)
+    sacc_obj._smokescreen_input_format = file_format
+    return sacc_obj, file_format
+
+
+def covariance_row_blocks(covariance, max_rows=1024):
+    """
+    Iterates over the rows of a SACC covariance without building the dense matrix.
+
+    Each item covers the rows ``row_start:row_stop`` of the (virtual) dense
+    matrix. Their non-zero entries are in the columns ``col_start:col_stop``
+    and are given by ``block``; every other entry of these rows is zero.
+
+    Parameters
+    ----------
+    covariance : sacc.covariance.BaseCovariance
+        SACC covariance (full, block-diagonal or diagonal).
+    max_rows : int, optional
+        Maximum number of rows per item. Default is 1024.
+
+    Yields
+    ------
+    tuple
+        ``(row_start, row_stop, col_start, col_stop, block)`` with ``block``
+        of shape ``(row_stop - row_start, col_stop - col_start)``.
+    """
+    if isinstance(covariance, sacc.covariance.BlockDiagonalCovariance):
+        start = 0
+        for block in covariance.blocks:
+            stop = start + len(block)
+            for row in range(start, stop, max_rows):
+                row_stop = min(row + max_rows, stop)
+                yield row, row_stop, start, stop, block[row - start:row_stop - start]
+            start = stop
+    elif isinstance(covariance, sacc.covariance.DiagonalCovariance):
+        for row in range(0, covariance.size, max_rows):
+            row_stop = min(row + max_rows, covariance.size)
+            yield row, row_stop, row, row_stop, np.diag(covariance.diag[row:row_stop])
+    elif isinstance(covariance, sacc.covariance.FullCovariance):
+        for row in range(0, covariance.size, max_rows):
+            row_stop = min(row + max_rows, covariance.size)
+            yield row, row_stop, 0, covariance.size, covariance.covmat[row:row_stop]
+    else:  # pragma: no cover
+        dense = covariance.dense
+        for row in range(0, len(dense), max_rows):
+            row_stop = min(row + max_rows, len(dense))
+            yield row, row_stop, 0, len(dense), dense[row:row_stop]
+
+
+def array_digest(array):
+    """
+    Fast digest of the raw bytes of an array, taken as C-ordered float64.
+
+    Parameters
+    ----------
+    array : array_like
+        Array to digest.
+
+    Returns
+    -------
+    str
+        Hexadecimal digest, including the array shape.
+    """
+    array = np.ascontiguousarray(array, dtype=np.float64)
+    hasher = hashlib.blake2b(str(array.shape).encode('utf-8'))
+    hasher.update(array)
+    return hasher.hexdigest()
+
+
+def covariance_digest(covariance):
+    """
+    Digest of a SACC covariance, equal to :func:`array_digest` of its dense
+    matrix, but streamed row by row so the dense matrix is never built.
+
+    Parameters
+    ----------
+    covariance : sacc.covariance.BaseCovariance
+        SACC covariance (full, block-diagonal or diagonal).
+
+    Returns
+    -------
+    str
+        Hexadecimal digest.
+    """
+    size = covariance.size
+    hasher = hashlib.blake2b(str((size, size)).encode('utf-8'))
+    zeros = memoryview(np.zeros(size, dtype=np.float64)).cast('B')
+    itemsize = np.dtype(np.float64).itemsize
+    for _, _, col_start, col_stop, block in covariance_row_blocks(covariance):
+        block = np.ascontiguousarray(block, dtype=np.float64)
+        for row in block:
+            hasher.update(zeros[:col_start * itemsize])
+            hasher.update(row)
+            hasher.update(zeros[:(size - col_stop) * itemsize])
+    return hasher.hexdigest()
+
+
+def covariance_memory(covariance):
+    """
+    Memory held by a SACC covariance, compared with its dense equivalent.
+
+    Parameters
+    ----------
+    covariance : sacc.covariance.BaseCovariance
+        SACC covariance (full, block-diagonal or diagonal).
+
+    Returns
+    -------
+    tuple
+        ``(native_bytes, dense_bytes)``: bytes currently held by the
+        covariance object (including any cached dense matrix or inverse)
+        and bytes of the dense float64 matrix.
+    """
+    if isinstance(covariance, sacc.covariance.BlockDiagonalCovariance):
+        native_bytes = sum(np.asarray(block).nbytes for block in covariance.blocks)
+    elif isinstance(covariance, sacc.covariance.DiagonalCovariance):
+        native_bytes = covariance.diag.nbytes
+    elif isinstance(covariance, sacc.covariance.FullCovariance):
+        native_bytes = covariance.covmat.nbytes
+    else:  # pragma: no cover
+        native_bytes = 0
+    # sacc caches the dense matrix (a copy, even for full covariances)
+    # and its inverse on the covariance object
+    for cached in (getattr(covariance, '_dense', None),
+                   getattr(covariance, '_dense_inverse', None)):
+        if cached is not None:
+            native_bytes += cached.nbytes
+    dense_bytes = covariance.size ** 2 * np.dtype(np.float64).itemsize
+    return native_bytes, dense_bytes
+
+
+def covariance_to_dense(covariance):
+    """
+    Dense matrix of a SACC covariance, without caching it on the covariance.
+
+    ``covariance.dense`` keeps the dense matrix attached to the SACC object,
+    so it is held (and deep-copied) for as long as the SACC lives. This
+    function returns a matrix owned by the caller instead. For a full
+    covariance the stored matrix itself is returned, without copying.
+
+    Parameters
+    ----------
+    covariance : sacc.covariance.BaseCovariance
+        SACC covariance (full, block-diagonal or diagonal).
+
+    Returns
+    -------
+    np.ndarray
+        Dense covariance matrix.
+    """
+    if isinstance(covariance, sacc.covariance.FullCovariance):
+        return covariance.covmat
+    dense = np.zeros((covariance.size, covariance.size))
+    for row_start, row_stop, col_start, col_stop, block in covariance_row_blocks(covariance):
+        dense[row_start:row_stop, col_start:col_stop] = block
+    return dense
+
+
+def compress_covariance(covariance, atol=0.0, max_rows=1024):
+    """
+    Converts a full SACC covariance into its most compact equivalent.
+
+    The block-diagonal structure is detected from the non-zero entries:
+    a full covariance which is diagonal becomes a
+    :class:`sacc.covariance.DiagonalCovariance`, one with more than one
+    block becomes a :class:`sacc.covariance.BlockDiagonalCovariance`.
+    Any other covariance is returned unchanged.
+
+    Parameters
+    ----------
+    covariance : sacc.covariance.BaseCovariance
+        SACC covariance to compress.
+    atol : float, optional
+        Entries with absolute value up to ``atol`` are treated as zero.
+        Default is 0, so the compressed covariance is exactly equal
+        to the original one.
+    max_rows : int, optional
+        Number of rows scanned at once. Default is 1024.
+
+    Returns
+    -------
+    sacc.covariance.BaseCovariance
+        Compressed covariance.
+    """
+    if not isinstance(covariance, sacc.covariance.FullCovariance):
+        return covariance
+    covmat = covariance.covmat
+    size = covariance.size
+    # furthest column coupled to each row, and furthest row coupled to each column
+    last_col = np.zeros(size, dtype=int)
+    last_row = np.zeros(size, dtype=int)
+    for row in range(0, size, max_rows):
+        row_stop = min(row + max_rows, size)
+        nonzero = np.abs(covmat[row:row_stop]) > atol
+        cols = np.arange(size)
+        last_col[row:row_stop] = np.max(np.where(nonzero, cols, 0), axis=1)
+        rows = np.arange(row, row_stop)[:, None]
+        last_row = np.maximum(last_row, np.max(np.where(nonzero, rows, 0), axis=0))
+    reach = np.maximum.accumulate(np.maximum(last_col, last_row))
+    # a block ends where no earlier index is coupled to a later one
+    stops = np.flatnonzero(reach <= np.arange(size)) + 1
+    if len(stops) == 1:
+        return covariance
+    starts = np.concatenate([[0], stops[:-1]])
+    if len(stops) == size:
+        return sacc.covariance.DiagonalCovariance(np.diag(covmat).copy())
+    return sacc.covariance.BlockDiagonalCovariance(
+        [covmat[start:stop, start:stop].copy() for start, stop in zip(starts, stops)]
+    )
+
+
+def _sacc_file_format(path):
+    """
+    Format of an uncompressed SACC file from its first bytes, or None.
+    """
+    marker, compressed = _read_marker(path)
+    if compressed:
+        return None
+    return _format_from_marker(marker)
+
+
+def _patched_values(table, mean):
+    """
+    New ``value`` column of a SACC data table, or None if the table
+    cannot be patched (no ``value``/``sacc_ordering`` columns).
+    """
+    names = table.dtype.names or ()
+    if 'value' not in names or 'sacc_ordering' not in names:
+        return None
+    return mean[np.asarray(table['sacc_ordering'])]
+
+
+def _patch_fits(input_path, output_path, original_mean, mean, metadata):
+    from astropy.io import fits
+    from sacc.io import metadata_to_table
+
+    # memory-mapped (copy-on-write), so untouched HDUs are never loaded
+    with fits.open(input_path, memmap=True) as hdu_list:
+        hdus = list(hdu_list)
+        data_hdus = [hdu for hdu in hdus[1:] if hdu.header.get('SACCTYPE') == 'data']
+        new_values = [_patched_values(hdu.data, mean) for hdu in data_hdus]
+        if not data_hdus or any(values is None for values in new_values):
+            return False
+        # the file must hold the data we concealed
+        for hdu in data_hdus:
+            if not np.array_equal(hdu.data['value'],
+                                  original_mean[np.asarray(hdu.data['sacc_ordering'])]):
+                return False
+        for hdu, values in zip(data_hdus, new_values):
+            hdu.data['value'] = values
+
+        table = metadata_to_table(metadata)
+        table.meta['EXTNAME'] = 'metadata:metadata:metadata'
+        metadata_hdu = fits.table_to_hdu(table)
+        has_metadata = any(hdu.header.get('SACCTYPE') == 'metadata' for hdu in hdus)
+        hdus = [metadata_hdu if hdu.header.get('SACCTYPE') == 'metadata' else hdu
+                for hdu in hdus]
+        if not has_metadata:
+            hdus.append(metadata_hdu)
+        fits.HDUList(hdus).writeto(output_path, overwrite=True)
+    return True
+
+
+def _patch_hdf5(input_path, output_path, original_mean, mean, metadata):
+    import h5py
+    from sacc.io import metadata_to_table
+
+    with h5py.File(input_path, 'r') as file:
+        if 'data' not in file:
+            return False
+        for dataset in file['data'].values():
+            table = dataset[()]
+            values = _patched_values(table, original_mean)
+            if values is None or not np.array_equal(table['value'], values):
+                return False
+
+    shutil.copyfile(input_path, output_path)
+    with h5py.File(output_path, 'r+') as file:
+        for dataset in file['data'].values():
+            table = dataset[()]
+            table['value'] = _patched_values(table, mean)
+            dataset[...] = table
+        if 'metadata' in file:
+            del file['metadata']
+        table = metadata_to_table(metadata)
+        table.meta['EXTNAME'] = 'metadata:metadata:metadata'
+        table.write(file, path='metadata', serialize_meta=False)
+    return True
+
+
+def patch_sacc_file(input_path, output_path, original_mean, mean, metadata, output_format=None):
+    """
+    Writes a SACC file with a new mean by patching a copy of an existing file.
+
+    Only the ``value`` column of the data-point tables and the metadata are
+    rewritten: tracers, covariance and everything else are copied as they
+    are, without being parsed into a :class:`sacc.Sacc` object. The output
+    has the format of the input file.
+
+    Parameters
+    ----------
+    input_path : str
+        Path to the original (uncompressed) FITS or HDF5 SACC file.
+    output_path : str
+        Path of the patched SACC file.
+    original_mean : np.ndarray
+        Mean of the SACC object loaded from ``input_path``. The file is only
+        patched if its values match it.
+    mean : np.ndarray
+        New mean, in the order of the SACC data points.
+    metadata : dict
+        Metadata of the patched file.
+    output_format : str, optional
+        Required output format (``fits`` or ``hdf5``). Default is None,
+        which accepts the format of the input file.
+
+    Returns
+    -------
+    bool
+        True if the file was written, False if the input file cannot be
+        patched (unknown or different format, missing columns or values
+        that do not match ``original_mean``). Nothing is written in that case.
+    """
+    original_mean = np.asarray(original_mean)
+    mean = np.asarray(mean)
+    file_format = _sacc_file_format(input_path)
+    if output_format is not None and file_format != output_format:
+        return False
+    if file_format == 'fits':
+        return _patch_fits(input_path, output_path, original_mean, mean, metadata)
+    if file_format == 'hdf5':
+        return _patch_hdf5(input_path, output_path, original_mean, mean, metadata)
+    return False
@@ -0,0 +1,62 @@
+import pytest
+import numpy as np
+import pyccl as ccl
+from smokescreen.amplitude import (
+    amplitude_ratio,
+    calculator_args,
+    calculator_cosmology,
+    rescaling_error,
+)
+
+
+def _cosmology(sigma8=0.8, **kwargs):
+    return ccl.Cosmology(Omega_c=0.25, Omega_b=0.05, h=0.67, n_s=0.96, sigma8=sigma8,
+                         transfer_function='eisenstein_hu', **kwargs)
+
+
+def test_amplitude_ratio():
+    fiducial = _cosmology().to_dict()
+    assert np.isclose(amplitude_ratio(fiducial, _cosmology(sigma8=0.9).to_dict()),
+                      (0.9 / 0.8)**2)
+    fiducial_as = dict(fiducial, sigma8=None, A_s=2.1e-9)
+    assert np.isclose(amplitude_ratio(fiducial_as, dict(fiducial_as, A_s=2.3e-9)), 2.3 / 2.1)
+
+
+def test_amplitude_ratio_refuses_other_shifts():
+    fiducial = _cosmology().to_dict()
+    with pytest.raises(ValueError):
+        amplitude_ratio(fiducial, dict(fiducial, Omega_c=0.3))
+    with pytest.raises(ValueError):
+        amplitude_ratio(fiducial, dict(fiducial, Omega_c=0.3, sigma8=0.9))
+    with pytest.raises(ValueError):
+        amplitude_ratio(fiducial, fiducial)
+
+
+def test_rescaled_calculator_matches_full_computation():
+    fiducial = _cosmology()
+    concealed = _cosmology(sigma8=0.9)
+    ratio = amplitude_ratio(fiducial.to_dict(), concealed.to_dict())
+    rescaled = calculator_cosmology(concealed, calculator_args(fiducial, ratio))
+
+    k = np.geomspace(1e-3, 10.0, 30)
+    for a in (0.5, 1.0):
+        np.testing.assert_allclose(ccl.linear_matter_power(rescaled, k, a),
+                                   ccl.linear_matter_power(concealed, k, a), rtol=1e-4)
+        np.testing.assert_allclose(ccl.nonlin_matter_power(rescaled, k, a),
+                                   ccl.nonlin_matter_power(concealed, k, a), rtol=1e-4)
+
+    z = np.linspace(0.0, 2.0, 100)
+    nz = np.exp(-0.5 * ((z - 0.8) / 0.2)**2)
+    ell = np.geomspace(20, 2000, 15)
+    cls = [ccl.angular_cl(cosmo, ccl.WeakLensingTracer(cosmo, dndz=(z, nz)),
+                          ccl.WeakLensingTracer(cosmo, dndz=(z, nz)), ell)
+           for cosmo in (rescaled, concealed)]
+    np.testing.assert_allclose(cls[0], cls[1], rtol=1e-4)
+
+
+def test_rescaling_error():
+    assert rescaling_error(_cosmology()) < 1e-4
+    assert rescaling_error(_cosmology(), nonlinear=False) < 1e-4
+    # baryonic effects are not reproduced by the tabulated linear power spectrum
+    baryons = _cosmology(baryonic_effects=ccl.BaryonsSchneider15(log10Mc=14.))
+    assert rescaling_error(baryons) > 1e-2
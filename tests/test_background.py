@@ -0,0 +1,112 @@
+import pytest  # noqa: F401
+import numpy as np
+import pyccl as ccl
+from smokescreen.background import (
+    background_tables,
+    invariant_products,
+    share_background,
+)
+
+
+def _cosmology(**kwargs):
+    params = dict(Omega_c=0.25, Omega_b=0.05, h=0.67, n_s=0.96, sigma8=0.8, m_nu=0.06,
+                  transfer_function='eisenstein_hu')
+    params.update(kwargs)
+    return ccl.Cosmology(**params)
+
+
+def _fiducial_tables():
+    fiducial = _cosmology()
+    fiducial.compute_distances()
+    fiducial.compute_growth()
+    return background_tables(fiducial)
+
+
+def test_invariant_products():
+    parameters = _fiducial_tables()["parameters"]
+    assert invariant_products(parameters, _cosmology(sigma8=0.9)) == ("background", "growth")
+    assert invariant_products(parameters, _cosmology(n_s=0.9)) == ("background", "growth")
+    assert invariant_products(parameters, _cosmology(sigma8=None, A_s=2e-9)) == ("background",
+                                                                                 "growth")
+    assert invariant_products(parameters, _cosmology(Omega_c=0.3)) == ()
+    assert invariant_products(parameters, _cosmology(m_nu=0.1)) == ()
+    # modified gravity changes the growth, not the background
+    mg = ccl.modified_gravity.MuSigmaMG(mu_0=0.1)
+    assert invariant_products(parameters, _cosmology(mg_parametrization=mg)) == ("background",)
+
+
+def test_background_tables_only_computed_products():
+    cosmo = _cosmology()
+    assert list(background_tables(cosmo)) == ["parameters"]
+    cosmo.compute_growth()
+    assert list(background_tables(cosmo)) == ["parameters", "growth"]
+
+
+def test_share_background_identical():
+    tables = _fiducial_tables()
+    full = _cosmology(sigma8=0.9)
+    shared = _cosmology(sigma8=0.9)
+    products = ("background", "growth")
+    assert share_background(shared, tables, products=products) == products
+    assert shared.has_distances and shared.has_growth
+
+    a = np.linspace(0.1, 1.0, 50)
+    k = np.geomspace(1e-3, 10.0, 20)
+    for function in (ccl.comoving_radial_distance, ccl.h_over_h0, ccl.growth_factor,
+                     ccl.growth_factor_unnorm, ccl.growth_rate):
+        np.testing.assert_array_equal(function(shared, a), function(full, a))
+    np.testing.assert_array_equal(ccl.distance_modulus(shared, a[:-1]),
+                                  ccl.distance_modulus(full, a[:-1]))
+    np.testing.assert_array_equal(ccl.nonlin_matter_power(shared, k, 0.5),
+                                  ccl.nonlin_matter_power(full, k, 0.5))
+
+    z = np.linspace(0.0, 2.0, 100)
+    nz = np.exp(-0.5 * ((z - 0.8) / 0.2)**2)
+    ell = np.geomspace(20, 2000, 10)
+    cls = []
+    for cosmo in (shared, full):
+        shear = ccl.WeakLensingTracer(cosmo, dndz=(z, nz))
+        clustering = ccl.NumberCountsTracer(cosmo, has_rsd=False, dndz=(z, nz),
+                                            bias=(z, np.ones_like(z)))
+        cls.append(np.concatenate([ccl.angular_cl(cosmo, shear, shear, ell),
+                                   ccl.angular_cl(cosmo, clustering, shear, ell),
+                                   ccl.angular_cl(cosmo, clustering, clustering, ell)]))
+    # the radial kernels use the inverse a(chi) spline, which CCL rebuilds
+    np.testing.assert_allclose(cls[0], cls[1], rtol=1e-7)
+
+
+def test_share_background_refused():
+    tables = _fiducial_tables()
+    # the background depends on Omega_c
+    cosmo = _cosmology(Omega_c=0.3)
+    assert share_background(cosmo, tables) == ()
+    assert not cosmo.has_distances and not cosmo.has_growth
+    # products already computed are kept
+    cosmo = _cosmology(sigma8=0.9)
+    cosmo.compute_growth()
+    assert share_background(cosmo, tables, products=("background", "growth")) == ("background",)
+    assert share_background(None, tables) == ()
+
+
+def test_share_background_exact_products():
+    tables = _fiducial_tables()
+    full = _cosmology(sigma8=0.9)
+    shared = _cosmology(sigma8=0.9)
+    # by default, only the growth, which CCL rebuilds exactly
+    assert share_background(shared, tables) == ("growth",)
+    assert shared.has_growth and not shared.has_distances
+
+    z = np.linspace(0.0, 2.0, 100)
+    nz = np.exp(-0.5 * ((z - 0.8) / 0.2)**2)
+    ell = np.geomspace(20, 2000, 10)
+    for cosmo in (shared, full):
+        cosmo.compute_nonlin_power()
+    cls = []
+    for cosmo in (shared, full):
+        shear = ccl.WeakLensingTracer(cosmo, dndz=(z, nz))
+        clustering = ccl.NumberCountsTracer(cosmo, has_rsd=False, dndz=(z, nz),
+                                            bias=(z, np.ones_like(z)))
+        cls.append(np.concatenate([ccl.angular_cl(cosmo, shear, shear, ell),
+                                   ccl.angular_cl(cosmo, clustering, shear, ell),
+                                   ccl.angular_cl(cosmo, clustering, clustering, ell)]))
+    np.testing.assert_array_equal(cls[0], cls[1])
@@ -0,0 +1,152 @@
+import pytest  # noqa: F401
+import os
+from unittest.mock import patch
+import numpy as np
+import sacc
+import pyccl as ccl
+from smokescreen.cache import FiducialCache, fiducial_cache_key, _library_versions, _FILE_MODE
+
+
+@pytest.fixture
+def sacc_data():
+    sacc_data = sacc.Sacc()
+    sacc_data.add_tracer('misc', 'test')
+    for i in range(3):
+        sacc_data.add_data_point('galaxy_shear_cl_ee', ('test', 'test'), 1.0, ell=10 * (i + 1))
+    sacc_data.add_covariance(np.eye(3) * 0.1)
+    return sacc_data
+
+
+@pytest.fixture
+def likelihood_file(tmp_path):
+    path = tmp_path / "likelihood.py"
+    path.write_text("def build_likelihood(build_parameters):\n    return None\n")
+    return str(path)
+
+
+def test_fiducial_cache_key_is_deterministic(sacc_data, likelihood_file):
+    cosmo_dict = ccl.CosmologyVanillaLCDM().to_dict()
+    key = fiducial_cache_key(likelihood_file, sacc_data, cosmo_dict, {"syst": 0.1})
+    assert key == fiducial_cache_key(likelihood_file, sacc_data, cosmo_dict, {"syst": 0.1})
+
+
+def test_fiducial_cache_key_changes_with_inputs(sacc_data, likelihood_file, tmp_path):
+    cosmo_dict = ccl.CosmologyVanillaLCDM().to_dict()
+    key = fiducial_cache_key(likelihood_file, sacc_data, cosmo_dict, {"syst": 0.1})
+
+    # different systematics
+    assert key != fiducial_cache_key(likelihood_file, sacc_data, cosmo_dict, {"syst": 0.2})
+
+    # different reference cosmology
+    other_cosmo = dict(cosmo_dict, Omega_c=0.3)
+    assert key != fiducial_cache_key(likelihood_file, sacc_data, other_cosmo, {"syst": 0.1})
+
+    # different likelihood source
+    other_likelihood = tmp_path / "other_likelihood.py"
+    other_likelihood.write_text("def build_likelihood(build_parameters):\n    return 1\n")
+    assert key != fiducial_cache_key(str(other_likelihood), sacc_data, cosmo_dict, {"syst": 0.1})
+
+    # different data points
+    other_sacc = sacc.Sacc()
+    other_sacc.add_tracer('misc', 'test')
+    for i in range(3):
+        other_sacc.add_data_point('galaxy_shear_cl_ee', ('test', 'test'), 1.0, ell=20 * (i + 1))
+    assert key != fiducial_cache_key(likelihood_file, other_sacc, cosmo_dict, {"syst": 0.1})
+
+
+def test_fiducial_cache_key_ignores_covariance(sacc_data, likelihood_file):
+    cosmo_dict = ccl.CosmologyVanillaLCDM().to_dict()
+    key = fiducial_cache_key(likelihood_file, sacc_data, cosmo_dict)
+    other_sacc = sacc_data.copy()
+    other_sacc.add_covariance(np.eye(3) * 0.5, overwrite=True)
+    assert key == fiducial_cache_key(likelihood_file, other_sacc, cosmo_dict)
+
+
+def test_fiducial_cache_memory_only():
+    cache = FiducialCache()
+    assert cache.get("missing") is None
+    cache.put("a", np.arange(3.0))
+    np.testing.assert_array_equal(cache.get("a"), np.arange(3.0))
+
+    # returned values are copies
+    value = cache.get("a")
+    value[0] = 10.0
+    np.testing.assert_array_equal(cache.get("a"), np.arange(3.0))
+
+
+def test_fiducial_cache_memory_lru_eviction():
+    cache = FiducialCache(max_memory_entries=2)
+    cache.put("a", np.zeros(2))
+    cache.put("b", np.ones(2))
+    # touch "a" so that "b" becomes the least recently used
+    cache.get("a")
+    cache.put("c", np.ones(2) * 2)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+
+
+def test_fiducial_cache_disk_roundtrip(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    cache = FiducialCache(cache_dir)
+    cache.put("a", np.arange(5.0))
+    assert os.path.exists(os.path.join(cache_dir, "a.npy"))
+
+    # a new cache (i.e. a new process) reads the entry from disk
+    new_cache = FiducialCache(cache_dir)
+    np.testing.assert_array_equal(new_cache.get("a"), np.arange(5.0))
+
+    new_cache.clear()
+    assert new_cache.get("a") is None
+    assert not os.path.exists(os.path.join(cache_dir, "a.npy"))
+
+
+def test_fiducial_cache_disk_eviction(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    cache = FiducialCache(cache_dir, max_memory_entries=0, max_disk_bytes=2000)
+    cache.put("old", np.zeros(100))
+    os.utime(os.path.join(cache_dir, "old.npy"), (0, 0))
+    cache.put("new", np.ones(100))
+    # each entry is ~928 bytes, a third one exceeds the limit and evicts "old"
+    cache.put("newest", np.ones(100) * 2)
+    assert cache.get("old") is None
+    np.testing.assert_array_equal(cache.get("newest"), np.ones(100) * 2)
+
+
+def test_fiducial_cache_corrupted_entry_is_a_miss(tmp_path):
+    cache_dir = tmp_path / "cache"
+    cache = FiducialCache(str(cache_dir))
+    (cache_dir / "broken.npy").write_bytes(b"not a numpy file")
+    assert cache.get("broken") is None
+
+
+def test_fiducial_cache_invalid_limits():
+    with pytest.raises(ValueError):
+        FiducialCache(max_memory_entries=-1)
+    with pytest.raises(ValueError):
+        FiducialCache(max_disk_bytes=-1)
+
+
+def test_fiducial_cache_key_changes_with_library_versions(sacc_data, likelihood_file):
+    cosmo_dict = ccl.CosmologyVanillaLCDM().to_dict()
+    key = fiducial_cache_key(likelihood_file, sacc_data, cosmo_dict)
+    for package in ("pyccl", "firecrown"):
+        versions = dict(_library_versions(), **{package: "0.0.1"})
+        with patch("smokescreen.cache._library_versions", return_value=versions):
+            assert key != fiducial_cache_key(likelihood_file, sacc_data, cosmo_dict)
+
+
+def test_fiducial_cache_disk_entry_mode(tmp_path):
+    umask = os.umask(0o022)
+    os.umask(umask)
+    # the mode is read once, at import
+    assert _FILE_MODE == 0o666 & ~umask
+
+    cache_dir = str(tmp_path / "cache")
+    with patch("smokescreen.cache._FILE_MODE", 0o644), \
+            patch("smokescreen.cache.os.umask") as mock_umask:
+        FiducialCache(cache_dir).put("a", np.arange(5.0))
+    # the process-wide umask is not touched while writing
+    mock_umask.assert_not_called()
+    # the shared store is readable by other users, as files created with the umask
+    assert os.stat(os.path.join(cache_dir, "a.npy")).st_mode & 0o777 == 0o644
@@ -9,6 +9,7 @@ import sacc
 import pyccl as ccl
 import firecrown
 import shutil
+import importlib.util
 
 # Handle different Firecrown versions
 if Version(firecrown.__version__) >= Version("1.15.0a0"):
@@ -17,8 +18,13 @@ else:
     from firecrown.likelihood.likelihood import Likelihood
 
 from firecrown.modeling_tools import ModelingTools
-from smokescreen.datavector import ConcealDataVector
+from smokescreen.datavector import ConcealDataVector, _evaluate_theory_vectors
+from smokescreen.datavector import _worker_context, _ccl_configuration, _init_worker
+from smokescreen.cache import FiducialCache
+from smokescreen.emulator import TheoryEmulator
+from smokescreen.instrumentation import StageRecorder
 from smokescreen.utils import load_sacc_file
+from smokescreen.synthetic import make_synthetic_sacc, SHEAR, LIKELIHOOD_PATH as SYNTHETIC_LIKELIHOOD_PATH
 
 ccl.gsl_params.LENSING_KERNEL_SPLINE_INTEGRATION = False
 
@@ -1038,3 +1044,657 @@ def test_gaussian_distribution_and_deterministic_blinding_equivalence(cosmic_she
 
     # Step 4: Both strategies must produce the same blinded data vector
     np.testing.assert_array_almost_equal(blinded_dv_distribution, blinded_dv_deterministic)
+
+
+def test_calculate_concealing_factor_uses_fiducial_cache():
+    cosmo = COSMO
+    sacc_data = sacc.Sacc()
+    sacc_data.add_tracer('misc', 'test')
+    for i in range(3):
+        sacc_data.add_data_point('galaxy_shear_cl_ee', ('test', 'test'), 1.0, ell=10)
+    sacc_data.mean = np.array([1.0, 2.0, 3.0])
+    sacc_data.add_covariance(np.eye(3) * 0.1)
+    likelihood = MockLikelihoodModule("mock_likelihood")
+    systematics_dict = {"systematic1": 0.1}
+    shifts_dict = {"Omega_c": 1}
+    cache = FiducialCache()
+
+    smokescreen = ConcealDataVector(cosmo, likelihood, shifts_dict, sacc_data,
+                                    systematics_dict, fiducial_cache=cache, debug=True)
+    factor = smokescreen.calculate_concealing_factor(factor_type="add")
+
+    # a second run with the same inputs loads the fiducial vector from the cache
+    smokescreen_cached = ConcealDataVector(cosmo, likelihood, shifts_dict, sacc_data,
+                                           systematics_dict, fiducial_cache=cache, debug=True)
+    with patch.object(smokescreen_cached.likelihood, 'compute_theory_vector',
+                      wraps=smokescreen_cached.likelihood.compute_theory_vector) as mock_theory:
+        factor_cached = smokescreen_cached.calculate_concealing_factor(factor_type="add")
+    # only the concealed theory vector was computed
+    assert mock_theory.call_count == 1
+    assert factor_cached == factor
+
+
+def test_concealing_stages_are_recorded():
+    sacc_data = sacc.Sacc()
+    sacc_data.add_tracer('misc', 'test')
+    for i in range(3):
+        sacc_data.add_data_point('galaxy_shear_cl_ee', ('test', 'test'), 1.0, ell=10)
+    sacc_data.mean = np.array([1.0, 2.0, 3.0])
+    sacc_data.add_covariance(np.eye(3) * 0.1)
+    likelihood = MockLikelihoodModule("mock_likelihood")
+    recorder = StageRecorder()
+
+    smokescreen = ConcealDataVector(COSMO, likelihood, {"Omega_c": 1}, sacc_data,
+                                    {"systematic1": 0.1}, stage_recorder=recorder)
+    smokescreen.calculate_concealing_factor(factor_type="add")
+
+    # the likelihood is given as a module, so there is no module_load stage
+    assert [stage["name"] for stage in recorder.stages] == [
+        "likelihood_build", "sacc_verification", "fiducial_prepare", "fiducial_theory",
+        "concealed_prepare", "concealed_theory"]
+
+
+def test_conceal_batch_shares_fiducial_theory_vector(tmp_path):
+    cosmo = COSMO
+    sacc_data = sacc.Sacc()
+    sacc_data.add_tracer('misc', 'test')
+    for i in range(3):
+        sacc_data.add_data_point('galaxy_shear_cl_ee', ('test', 'test'), 1.0, ell=10)
+    sacc_data.mean = np.array([1.0, 2.0, 3.0])
+    sacc_data.add_covariance(np.eye(3) * 0.1)
+    likelihood = MockLikelihoodModule("mock_likelihood")
+    systematics_dict = {"systematic1": 0.1}
+
+    smokescreen = ConcealDataVector(cosmo, likelihood, {"Omega_c": (0.2, 0.3)}, sacc_data,
+                                    systematics_dict, seed=2112)
+    blind_specs = [({"Omega_c": (0.2, 0.3)}, 2112, "blind_A"),
+                   {"shifts_dict": {"Omega_c": (0.2, 0.3)}, "seed": 4224, "suffix": "blind_B"},
+                   {"shifts_dict": {"Omega_c": 0.25}}]
+
+    with patch.object(smokescreen.likelihood, 'compute_theory_vector',
+                      wraps=smokescreen.likelihood.compute_theory_vector) as mock_theory, \
+            patch.object(smokescreen, 'save_concealed_datavector') as mock_save:
+        output_paths = smokescreen.conceal_batch(blind_specs, str(tmp_path), "root")
+
+    # one fiducial evaluation plus one per blind
+    assert mock_theory.call_count == len(blind_specs) + 1
+    assert output_paths == [f"{tmp_path}/root_blind_A.fits",
+                            f"{tmp_path}/root_blind_B.fits",
+                            f"{tmp_path}/root_concealed_data_vector.fits"]
+    assert [c.kwargs['suffix'] for c in mock_save.call_args_list] == ["blind_A", "blind_B", None]
+    # the object holds the state of the last blind, with the default seed
+    assert smokescreen.shifts_dict == {"Omega_c": 0.25}
+    assert smokescreen.seed == 2112
+    np.testing.assert_array_equal(smokescreen.concealed_data_vector,
+                                  smokescreen.likelihood.get_data_vector()
+                                  + smokescreen.theory_vec_conceal - smokescreen.theory_vec_fid)
+
+
+class CosmologyDependentLikelihood(EmptyLikelihood):
+    def compute_theory_vector(self, ModellingTools):
+        cosmo = ModellingTools.get_ccl_cosmology()
+        return np.array([cosmo["Omega_c"], ccl.comoving_radial_distance(cosmo, 0.5) / 1e3,
+                         ccl.comoving_radial_distance(cosmo, 1.0) / 1e3])
+
+
+class CosmologyDependentLikelihoodModule(types.ModuleType):
+    def build_likelihood(self, *args, **kwargs):
+        return CosmologyDependentLikelihood(), ModelingTools()
+
+
+def test_conceal_batch_threads_match_serial(tmp_path):
+    sacc_data = sacc.Sacc()
+    sacc_data.add_tracer('misc', 'test')
+    for i in range(3):
+        sacc_data.add_data_point('galaxy_shear_cl_ee', ('test', 'test'), 1.0, ell=10)
+    sacc_data.mean = np.array([1.0, 2.0, 3.0])
+    sacc_data.add_covariance(np.eye(3) * 0.1)
+    metadata = dict(sacc_data.metadata)
+    blind_specs = [({"Omega_c": (0.2, 0.3)}, seed, f"blind_{seed}") for seed in range(24)]
+    blind_specs.append(({"Omega_c": 0.25}, "last", "blind_last"))
+
+    def conceal(path, threads):
+        os.makedirs(path)
+        likelihood = CosmologyDependentLikelihoodModule("cosmology_dependent_likelihood")
+        smokescreen = ConcealDataVector(COSMO, likelihood, {"Omega_c": (0.2, 0.3)}, sacc_data,
+                                        {"systematic1": 0.1}, seed=2112)
+        output_paths = smokescreen.conceal_batch(blind_specs, path, "root", threads=threads)
+        return smokescreen, output_paths
+
+    serial, serial_paths = conceal(str(tmp_path / "serial"), 1)
+    threaded, threaded_paths = conceal(str(tmp_path / "threaded"), 8)
+
+    for serial_path, threaded_path, (_, seed, _) in zip(serial_paths, threaded_paths, blind_specs):
+        serial_sacc = sacc.Sacc.load_fits(serial_path)
+        threaded_sacc = sacc.Sacc.load_fits(threaded_path)
+        np.testing.assert_array_equal(serial_sacc.mean, threaded_sacc.mean)
+        assert threaded_sacc.metadata['seed_smokescreen'] == seed
+    # every blind was concealed with its own shifts
+    assert len({tuple(sacc.Sacc.load_fits(path).mean) for path in threaded_paths}) == len(blind_specs)
+    # both objects hold the state of the last blind
+    assert threaded.seed == serial.seed == "last"
+    np.testing.assert_array_equal(threaded.concealed_data_vector, serial.concealed_data_vector)
+    np.testing.assert_array_equal(threaded.theory_vec_conceal, serial.theory_vec_conceal)
+    # the input sacc data is not changed by saving the blinds
+    assert sacc_data.metadata == metadata
+    np.testing.assert_array_equal(sacc_data.mean, [1.0, 2.0, 3.0])
+
+
+def test_conceal_batch_invalid_factor_type(tmp_path):
+    cosmo = COSMO
+    sacc_data = sacc.Sacc()
+    sacc_data.add_tracer('misc', 'test')
+    for i in range(3):
+        sacc_data.add_data_point('galaxy_shear_cl_ee', ('test', 'test'), 1.0, ell=10)
+    sacc_data.mean = np.array([1.0, 2.0, 3.0])
+    sacc_data.add_covariance(np.eye(3) * 0.1)
+    likelihood = MockLikelihoodModule("mock_likelihood")
+
+    smokescreen = ConcealDataVector(cosmo, likelihood, {"Omega_c": 0.25}, sacc_data,
+                                    {"systematic1": 0.1})
+    with pytest.raises(NotImplementedError):
+        smokescreen.conceal_batch([({"Omega_c": 0.25}, 1, None)], str(tmp_path), "root",
+                                  factor_type="invalid")
+
+
+def test_calculate_concealing_factor_parallel_matches_serial(cosmic_shear_resources):
+    likelihood = cosmic_shear_resources['likelihood']
+    syst_dict = {"trc1_delta_z": 0.1, "trc0_delta_z": 0.1}
+    shift_dict = {"Omega_c": (0.20, 0.39), "sigma8": (0.6, 0.9)}
+    sacc_data = sacc.Sacc.load_fits(cosmic_shear_resources['fits_sacc'])
+
+    sck_serial = ConcealDataVector(COSMO, likelihood, shift_dict, sacc_data, syst_dict,
+                                   seed=1234, debug=True)
+    factor_serial = sck_serial.calculate_concealing_factor()
+
+    sck_parallel = ConcealDataVector(COSMO, likelihood, shift_dict, sacc_data, syst_dict,
+                                     seed=1234, debug=True)
+    factor_parallel = sck_parallel.calculate_concealing_factor(parallel=True)
+
+    # the workers reproduce the serial computation bit-for-bit
+    np.testing.assert_array_equal(factor_parallel, factor_serial)
+    np.testing.assert_array_equal(sck_parallel.theory_vec_fid, sck_serial.theory_vec_fid)
+    np.testing.assert_array_equal(sck_parallel.apply_concealing_to_likelihood_datavec(),
+                                  sck_serial.apply_concealing_to_likelihood_datavec())
+
+
+def test_calculate_concealing_factor_parallel_needs_likelihood_file():
+    cosmo = COSMO
+    sacc_data = sacc.Sacc()
+    sacc_data.add_tracer('misc', 'test')
+    for i in range(3):
+        sacc_data.add_data_point('galaxy_shear_cl_ee', ('test', 'test'), 1.0, ell=10)
+    sacc_data.mean = np.array([1.0, 2.0, 3.0])
+    sacc_data.add_covariance(np.eye(3) * 0.1)
+    likelihood = MockLikelihoodModule("mock_likelihood")
+
+    smokescreen = ConcealDataVector(cosmo, likelihood, {"Omega_c": 0.25}, sacc_data,
+                                    {"systematic1": 0.1})
+    # the mock module has no source file, so workers cannot rebuild it
+    with pytest.raises(ValueError):
+        smokescreen.calculate_concealing_factor(parallel=True)
+
+
+def test_worker_context_does_not_fork():
+    # the parent runs thread pools, so the workers are never forked
+    assert _worker_context().get_start_method() in ("forkserver", "spawn")
+
+
+def test_init_worker_applies_ccl_configuration():
+    original = _ccl_configuration()
+    configuration = _ccl_configuration()
+    configuration["gsl_params"]["INTEGRATION_EPSREL"] = 1e-5
+    try:
+        _init_worker(configuration)
+        assert ccl.gsl_params["INTEGRATION_EPSREL"] == 1e-5
+        assert _ccl_configuration() == configuration
+    finally:
+        _init_worker(original)
+    assert _ccl_configuration() == original
+
+
+def test_calculate_concealing_factor_amplitude_fast_path_parallel():
+    cosmo = COSMO
+    sacc_data = sacc.Sacc()
+    sacc_data.add_tracer('misc', 'test')
+    for i in range(3):
+        sacc_data.add_data_point('galaxy_shear_cl_ee', ('test', 'test'), 1.0, ell=10)
+    sacc_data.mean = np.array([1.0, 2.0, 3.0])
+    sacc_data.add_covariance(np.eye(3) * 0.1)
+    likelihood = MockLikelihoodModule("mock_likelihood")
+
+    smokescreen = ConcealDataVector(cosmo, likelihood, {"sigma8": 0.85}, sacc_data,
+                                    {"systematic1": 0.1})
+    with pytest.raises(ValueError):
+        smokescreen.calculate_concealing_factor(parallel=True, amplitude_fast_path=True)
+
+
+def _synthetic_shear_factors(shifts_dict, **kwargs):
+    """Concealing factors of a synthetic cosmic-shear SACC with and without ``kwargs``."""
+    sacc_data = make_synthetic_sacc(n_source=2, n_lens=0, n_ell=6, data_types=(SHEAR,))
+    factors = []
+    for factor_kwargs in ({}, kwargs):
+        smokescreen = ConcealDataVector(COSMO, SYNTHETIC_LIKELIHOOD_PATH, shifts_dict, sacc_data,
+                                        seed=2112, debug=True)
+        factors.append(smokescreen.calculate_concealing_factor(**factor_kwargs))
+    return factors
+
+
+def test_calculate_concealing_factor_amplitude_fast_path():
+    fast_path_rtol = 1e-3
+    with patch.object(ConcealDataVector, '_calculate_theory_vectors_rescaled', autospec=True,
+                      side_effect=ConcealDataVector._calculate_theory_vectors_rescaled) \
+            as mock_rescaled:
+        full, fast = _synthetic_shear_factors({"sigma8": 0.85}, amplitude_fast_path=True,
+                                              fast_path_rtol=fast_path_rtol)
+    mock_rescaled.assert_called_once()
+    # the rescaled power spectrum reproduces the full firecrown computation
+    assert np.any(full != 0)
+    np.testing.assert_allclose(fast, full, rtol=fast_path_rtol)
+
+
+def test_calculate_concealing_factor_amplitude_fast_path_fallback():
+    # Omega_c changes the shape of the power spectrum, so the shift is computed in full
+    with patch('smokescreen.datavector.ConcealDataVector._calculate_theory_vectors_rescaled') \
+            as mock_rescaled:
+        full, fallback = _synthetic_shear_factors({"Omega_c": 0.27, "sigma8": 0.85},
+                                                  amplitude_fast_path=True)
+    mock_rescaled.assert_not_called()
+    np.testing.assert_array_equal(fallback, full)
+
+
+def test_load_likelihood_executes_module_once(cosmic_shear_resources):
+    likelihood = cosmic_shear_resources['likelihood']
+    syst_dict = {"trc1_delta_z": 0.1, "trc0_delta_z": 0.1}
+    shift_dict = {"Omega_c": 0.34, "sigma8": 0.85}
+    sacc_data = sacc.Sacc.load_fits(cosmic_shear_resources['fits_sacc'])
+
+    with patch('smokescreen.utils.importlib.util.spec_from_file_location',
+               wraps=importlib.util.spec_from_file_location) as mock_spec:
+        ConcealDataVector(COSMO, likelihood, shift_dict, sacc_data, syst_dict)
+        # a second instance in the same process reuses the loaded module
+        ConcealDataVector(COSMO, likelihood, shift_dict, sacc_data, syst_dict)
+    assert mock_spec.call_count == 1
+
+
+def _block_diagonal_sacc():
+    """3-point SACC with a block-diagonal covariance matching EmptyLikelihood."""
+    sacc_data = sacc.Sacc()
+    sacc_data.add_tracer('misc', 'test')
+    for i in range(3):
+        sacc_data.add_data_point('galaxy_shear_cl_ee', ('test', 'test'), 1.0, ell=10)
+    sacc_data.mean = np.array([1.0, 2.0, 3.0])
+    sacc_data.add_covariance([np.eye(1) * 0.1, np.eye(2) * 0.1])
+    return sacc_data
+
+
+@pytest.mark.parametrize("verify_level", ['none', 'hash', 'blockwise', 'full'])
+def test_verify_sacc_consistency_levels_matching(verify_level):
+    sacc_data = _block_diagonal_sacc()
+    likelihood = MockLikelihoodModule("mock_likelihood")
+    smokescreen = ConcealDataVector(COSMO, likelihood, {"Omega_c": 1}, sacc_data,
+                                    {"systematic1": 0.1}, verify_level=verify_level)
+    mock_likelihood = MagicMock()
+    mock_likelihood.get_data_vector.return_value = np.array([1.0, 2.0, 3.0])
+    # tiny differences are tolerated at every level
+    mock_likelihood.get_cov.return_value = np.eye(3) * 0.1 + 1e-14
+    smokescreen._verify_sacc_consistency(mock_likelihood)
+
+
+@pytest.mark.parametrize("verify_level", ['hash', 'blockwise', 'full'])
+def test_verify_sacc_consistency_levels_mismatch(verify_level):
+    sacc_data = _block_diagonal_sacc()
+    likelihood = MockLikelihoodModule("mock_likelihood")
+    smokescreen = ConcealDataVector(COSMO, likelihood, {"Omega_c": 1}, sacc_data,
+                                    {"systematic1": 0.1}, verify_level=verify_level)
+
+    # mismatch inside a block
+    mock_likelihood = MagicMock()
+    mock_likelihood.get_data_vector.return_value = np.array([1.0, 2.0, 3.0])
+    mock_likelihood.get_cov.return_value = np.eye(3) * 0.5
+    with pytest.raises(ValueError) as exc_info:
+        smokescreen._verify_sacc_consistency(mock_likelihood)
+    assert "Covariance matrix mismatch" in str(exc_info.value)
+
+    # correlations outside the SACC blocks
+    off_block = np.eye(3) * 0.1
+    off_block[0, 2] = off_block[2, 0] = 0.01
+    mock_likelihood.get_cov.return_value = off_block
+    with pytest.raises(ValueError) as exc_info:
+        smokescreen._verify_sacc_consistency(mock_likelihood)
+    assert "Covariance matrix mismatch" in str(exc_info.value)
+
+    # wrong shape
+    mock_likelihood.get_cov.return_value = np.eye(4) * 0.1
+    with pytest.raises(ValueError):
+        smokescreen._verify_sacc_consistency(mock_likelihood)
+
+
+def test_verify_sacc_consistency_level_none_skips_checks():
+    sacc_data = _block_diagonal_sacc()
+    likelihood = MockLikelihoodModule("mock_likelihood")
+    smokescreen = ConcealDataVector(COSMO, likelihood, {"Omega_c": 1}, sacc_data,
+                                    {"systematic1": 0.1}, verify_level='none')
+    mock_likelihood = MagicMock()
+    smokescreen._verify_sacc_consistency(mock_likelihood)
+    mock_likelihood.get_cov.assert_not_called()
+
+
+def test_verify_sacc_consistency_hash_does_not_build_dense():
+    sacc_data = _block_diagonal_sacc()
+    likelihood = MockLikelihoodModule("mock_likelihood")
+    smokescreen = ConcealDataVector(COSMO, likelihood, {"Omega_c": 1}, sacc_data,
+                                    {"systematic1": 0.1}, verify_level='hash')
+    mock_likelihood = MagicMock()
+    mock_likelihood.get_data_vector.return_value = np.array([1.0, 2.0, 3.0])
+    mock_likelihood.get_cov.return_value = np.eye(3) * 0.1
+    smokescreen._verify_sacc_consistency(mock_likelihood)
+    assert sacc_data.covariance._dense is None
+
+
+def test_verify_level_invalid():
+    sacc_data = _block_diagonal_sacc()
+    likelihood = MockLikelihoodModule("mock_likelihood")
+    with pytest.raises(ValueError):
+        ConcealDataVector(COSMO, likelihood, {"Omega_c": 1}, sacc_data,
+                          {"systematic1": 0.1}, verify_level='sometimes')
+
+
+def test_verify_sacc_consistency_full_keeps_blocks():
+    # block-diagonal covariances are compared without building the dense matrix
+    sacc_data = _block_diagonal_sacc()
+    likelihood = MockLikelihoodModule("mock_likelihood")
+    smokescreen = ConcealDataVector(COSMO, likelihood, {"Omega_c": 1}, sacc_data,
+                                    {"systematic1": 0.1}, verify_level='full')
+    mock_likelihood = MagicMock()
+    mock_likelihood.get_data_vector.return_value = np.array([1.0, 2.0, 3.0])
+    mock_likelihood.get_cov.return_value = np.eye(3) * 0.1
+    smokescreen._verify_sacc_consistency(mock_likelihood)
+    assert sacc_data.covariance._dense is None
+
+
+@patch('src.smokescreen.datavector.getpass.getuser', return_value='test_user')
+def test_compress_covariance_and_returned_covariance(mock_getuser, cosmic_shear_resources, tmp_path):
+    syst_dict = {
+        "trc1_delta_z": 0.1,
+        "trc0_delta_z": 0.1,
+    }
+    shift_dict = {"Omega_c": 0.34, "sigma8": 0.85}
+    sacc_data = sacc.Sacc.load_fits(cosmic_shear_resources['fits_sacc'])
+    original_covmat = sacc_data.covariance.covmat.copy()
+    sck = ConcealDataVector(COSMO, cosmic_shear_resources['likelihood'],
+                            shift_dict, sacc_data, syst_dict, seed=1234,
+                            compress_covariance=True)
+    # the example covariance is diagonal
+    assert isinstance(sck.sacc_data.covariance, sacc.covariance.DiagonalCovariance)
+
+    sck.calculate_concealing_factor()
+    sck.apply_concealing_to_likelihood_datavec()
+    returned_sacc = sck.save_concealed_datavector(str(tmp_path), "temp_sacc",
+                                                  return_sacc=True)
+    # the returned sacc owns a copy of the covariance
+    assert returned_sacc.covariance is not sck.sacc_data.covariance
+    np.testing.assert_array_equal(returned_sacc.covariance.dense, original_covmat)
+    returned_sacc.covariance.diag[0] *= 2
+    np.testing.assert_array_equal(sck.sacc_data.covariance.dense, original_covmat)
+    loaded_sacc = sacc.Sacc.load_fits(f"{tmp_path}/temp_sacc_concealed_data_vector.fits")
+    np.testing.assert_array_equal(loaded_sacc.covariance.dense, original_covmat)
+
+
+@pytest.mark.parametrize("file_format", ["fits", "hdf5"])
+@patch('src.smokescreen.datavector.getpass.getuser', return_value='test_user')
+def test_save_concealed_datavector_fast_output(mock_getuser, file_format,
+                                               cosmic_shear_resources, tmp_path):
+    syst_dict = {
+        "trc1_delta_z": 0.1,
+        "trc0_delta_z": 0.1,
+    }
+    shift_dict = {"Omega_c": 0.34, "sigma8": 0.85}
+    input_path = cosmic_shear_resources[f'{file_format}_sacc']
+    sacc_data = getattr(sacc.Sacc, f"load_{file_format}")(input_path)
+    sck = ConcealDataVector(COSMO, cosmic_shear_resources['likelihood'],
+                            shift_dict, sacc_data, syst_dict, seed=1234,
+                            input_format=file_format)
+    sck.calculate_concealing_factor()
+    blinded_dv = sck.apply_concealing_to_likelihood_datavec()
+
+    full_path = str(tmp_path / "full")
+    fast_path = str(tmp_path / "fast")
+    os.makedirs(full_path)
+    os.makedirs(fast_path)
+    sck.save_concealed_datavector(full_path, "temp_sacc")
+    with patch('src.smokescreen.datavector.save_to_sacc') as mock_save_to_sacc:
+        returned = sck.save_concealed_datavector(fast_path, "temp_sacc",
+                                                 input_path=input_path)
+    # the sacc is not rebuilt in memory
+    mock_save_to_sacc.assert_not_called()
+    assert returned is None
+
+    load = getattr(sacc.Sacc, f"load_{file_format}")
+    full_sacc = load(f"{full_path}/temp_sacc_concealed_data_vector.{file_format}")
+    fast_sacc = load(f"{fast_path}/temp_sacc_concealed_data_vector.{file_format}")
+    np.testing.assert_array_equal(fast_sacc.mean, blinded_dv)
+    # metadata only differ by the creation time
+    full_sacc.metadata['creation'] = fast_sacc.metadata['creation']
+    assert fast_sacc == full_sacc
+
+
+@patch('src.smokescreen.datavector.getpass.getuser', return_value='test_user')
+def test_save_concealed_datavector_fast_output_fallback(mock_getuser, cosmic_shear_resources,
+                                                        tmp_path):
+    syst_dict = {
+        "trc1_delta_z": 0.1,
+        "trc0_delta_z": 0.1,
+    }
+    shift_dict = {"Omega_c": 0.34, "sigma8": 0.85}
+    sacc_data = sacc.Sacc.load_fits(cosmic_shear_resources['fits_sacc'])
+    sck = ConcealDataVector(COSMO, cosmic_shear_resources['likelihood'],
+                            shift_dict, sacc_data, syst_dict, seed=1234)
+    sck.calculate_concealing_factor()
+    blinded_dv = sck.apply_concealing_to_likelihood_datavec()
+
+    # a different output format cannot be patched, the full output is used
+    sck.save_concealed_datavector(str(tmp_path), "temp_sacc", output_format='hdf5',
+                                  input_path=cosmic_shear_resources['fits_sacc'])
+    loaded_sacc = sacc.Sacc.load_hdf5(f"{tmp_path}/temp_sacc_concealed_data_vector.hdf5")
+    np.testing.assert_array_equal(loaded_sacc.mean, blinded_dv)
+
+
+@pytest.mark.parametrize("covariance", ["dense", "block"])
+def test_synthetic_likelihood_matches_synthetic_sacc(covariance):
+    # the likelihood built for a synthetic SACC passes the verification
+    sacc_data = make_synthetic_sacc(n_source=2, n_lens=2, n_ell=4, covariance=covariance)
+    smokescreen = ConcealDataVector(COSMO, SYNTHETIC_LIKELIHOOD_PATH, {"sigma8": (0.75, 0.85)},
+                                    sacc_data)
+    np.testing.assert_array_equal(smokescreen.likelihood.get_data_vector(), sacc_data.mean)
+
+
+class DistanceLikelihood(EmptyLikelihood):
+    def compute_theory_vector(self, ModellingTools):
+        cosmo = ModellingTools.get_ccl_cosmology()
+        a = np.array([0.5, 0.7, 0.9])
+        return np.concatenate([ccl.distance_modulus(cosmo, a), ccl.growth_factor(cosmo, a)])
+
+
+class DistanceLikelihoodModule(types.ModuleType):
+    def build_likelihood(self, *args, **kwargs):
+        return DistanceLikelihood(), ModelingTools()
+
+
+@pytest.mark.parametrize("shifts_dict, shared", [({"sigma8": (0.7, 0.9)}, "('growth',)"),
+                                                 ({"Omega_c": (0.2, 0.3)}, "()")])
+def test_share_background_theory_vectors_identical(shifts_dict, shared, capsys):
+    sacc_data = sacc.Sacc()
+    sacc_data.add_tracer('misc', 'test')
+    for i in range(3):
+        sacc_data.add_data_point('galaxy_shear_cl_ee', ('test', 'test'), 1.0, ell=10)
+    sacc_data.mean = np.array([1.0, 2.0, 3.0])
+    sacc_data.add_covariance(np.eye(3) * 0.1)
+
+    factors = []
+    for share in (False, True):
+        likelihood = DistanceLikelihoodModule("distance_likelihood")
+        smokescreen = ConcealDataVector(COSMO, likelihood, shifts_dict, sacc_data,
+                                        {"systematic1": 0.1}, seed=2112, debug=True,
+                                        share_background=share)
+        factors.append(smokescreen.calculate_concealing_factor())
+    assert f"[DEBUG] Shared with the fiducial cosmology: {shared}" in capsys.readouterr().out
+    np.testing.assert_array_equal(factors[1], factors[0])
+
+
+def test_share_background_synthetic_3x2pt(capsys):
+    sacc_data = make_synthetic_sacc(n_source=2, n_lens=2, n_ell=4)
+    theory_vectors = []
+    for share in (False, True):
+        smokescreen = ConcealDataVector(COSMO, SYNTHETIC_LIKELIHOOD_PATH, {"sigma8": (0.75, 0.85)},
+                                        sacc_data, debug=True, share_background=share)
+        smokescreen.calculate_concealing_factor()
+        theory_vectors.append(smokescreen.theory_vec_conceal)
+    assert "[DEBUG] Shared with the fiducial cosmology: ('growth',)" in capsys.readouterr().out
+    np.testing.assert_array_equal(theory_vectors[1], theory_vectors[0])
+
+
+def test_share_background_fiducial_cache_hit(tmp_path, capsys):
+    sacc_data = make_synthetic_sacc(n_source=2, n_lens=2, n_ell=4)
+    theory_vectors = []
+    for share in (False, True):
+        # the second run loads the fiducial theory vector from the cache
+        smokescreen = ConcealDataVector(COSMO, SYNTHETIC_LIKELIHOOD_PATH, {"sigma8": (0.75, 0.85)},
+                                        sacc_data, debug=True, share_background=share,
+                                        fiducial_cache=FiducialCache(tmp_path))
+        smokescreen.calculate_concealing_factor()
+        theory_vectors.append(smokescreen.theory_vec_conceal)
+    out = capsys.readouterr().out
+    assert "[DEBUG] Fiducial theory vector loaded from cache" in out
+    assert "[DEBUG] Shared with the fiducial cosmology: ('growth',)" in out
+    np.testing.assert_array_equal(theory_vectors[1], theory_vectors[0])
+
+
+def test_linear_response():
+    sacc_data = sacc.Sacc()
+    sacc_data.add_tracer('misc', 'test')
+    for i in range(3):
+        sacc_data.add_data_point('galaxy_shear_cl_ee', ('test', 'test'), 1.0, ell=10)
+    sacc_data.mean = np.array([1.0, 2.0, 3.0])
+    sacc_data.add_covariance(np.eye(3) * 0.1)
+    cosmo = ccl.Cosmology(Omega_c=0.25, Omega_b=0.05, h=0.67, n_s=0.96, sigma8=0.8)
+    shifts_dict = {"Omega_c": (0.24, 0.26)}
+
+    def smokescreen():
+        likelihood = CosmologyDependentLikelihoodModule("cosmology_dependent_likelihood")
+        return ConcealDataVector(cosmo, likelihood, shifts_dict, sacc_data,
+                                 {"systematic1": 0.1}, seed=2112, debug=True)
+
+    serial = smokescreen()
+    response = serial.linear_response(step=1e-3, validation_shifts=4)
+    assert response.parameters == ["Omega_c"]
+    # the first entry of the theory vector is Omega_c itself
+    np.testing.assert_allclose(response.jacobian[:, 0][0], 1.0)
+    assert response.validation["add_relative_error"].shape == (4,)
+    assert np.all(response.validation["add_relative_error"] < 1e-2)
+    # the concealing factor of the object's shift is approximated
+    factor = serial.calculate_concealing_factor()
+    concealed_omega_c = serial.theory_vec_conceal[0]
+    np.testing.assert_allclose(response.concealing_factor({"Omega_c": concealed_omega_c}),
+                               factor, rtol=1e-2, atol=1e-12)
+
+    # the evaluations in threads give the same response
+    threaded = smokescreen().linear_response(step=1e-3, threads=4, validation_shifts=4)
+    np.testing.assert_array_equal(threaded.jacobian, response.jacobian)
+    np.testing.assert_array_equal(threaded.validation["add_relative_error"],
+                                  response.validation["add_relative_error"])
+    with pytest.raises(ValueError):
+        serial.linear_response(parameters=["A_s"])
+
+
+def test_train_emulator(tmp_path):
+    sacc_data = sacc.Sacc()
+    sacc_data.add_tracer('misc', 'test')
+    for i in range(3):
+        sacc_data.add_data_point('galaxy_shear_cl_ee', ('test', 'test'), 1.0, ell=10)
+    sacc_data.mean = np.array([1.0, 2.0, 3.0])
+    sacc_data.add_covariance(np.eye(3) * 0.1)
+    cosmo = ccl.Cosmology(Omega_c=0.25, Omega_b=0.05, h=0.67, n_s=0.96, sigma8=0.8)
+    likelihood = CosmologyDependentLikelihoodModule("cosmology_dependent_likelihood")
+    smokescreen = ConcealDataVector(cosmo, likelihood, {"Omega_c": (0.2, 0.3), "h": 0.7},
+                                    sacc_data, {"systematic1": 0.1}, seed=2112)
+
+    emulator = smokescreen.train_emulator(n_train=12, n_validation=3, degree=3)
+    assert emulator.parameters == ["Omega_c"]
+    assert emulator.training_samples.shape == (12, 1)
+    assert np.all(emulator.validation["relative_error"] < 1e-3)
+    # the prediction does not change the object
+    emulated = smokescreen.emulate_concealing_factor(emulator)
+    assert not hasattr(smokescreen, 'concealed_data_vector')
+    # the deterministic shift of h is part of the emulated cosmologies
+    factor = smokescreen.calculate_concealing_factor()
+    np.testing.assert_allclose(emulated, factor, rtol=1e-3, atol=1e-12)
+
+    # the emulator is reusable across sessions for the same likelihood and data
+    path = str(tmp_path / "emulator.npz")
+    emulator.save(path)
+    loaded = TheoryEmulator.load(path)
+    np.testing.assert_array_equal(smokescreen.emulate_concealing_factor(loaded), emulated)
+    other = ConcealDataVector(cosmo, likelihood, {"Omega_c": (0.2, 0.3), "h": 0.68},
+                              sacc_data, {"systematic1": 0.1}, seed=2112)
+    with pytest.raises(ValueError):
+        other.emulate_concealing_factor(loaded)
+
+
+def test_train_emulator_processes():
+    sacc_data = make_synthetic_sacc(n_source=1, n_lens=1, n_ell=4)
+    smokescreen = ConcealDataVector(COSMO, SYNTHETIC_LIKELIHOOD_PATH, {"sigma8": (0.75, 0.85)},
+                                    sacc_data)
+    serial = smokescreen.train_emulator(n_train=4, n_validation=1, degree=2)
+    pooled = smokescreen.train_emulator(n_train=4, n_validation=1, degree=2, processes=2)
+    np.testing.assert_array_equal(pooled.training_theory_vecs, serial.training_theory_vecs)
+    np.testing.assert_array_equal(pooled.validation["relative_error"],
+                                  serial.validation["relative_error"])
+
+
+def test_sample_theory_resumes(tmp_path):
+    sacc_data = sacc.Sacc()
+    sacc_data.add_tracer('misc', 'test')
+    for i in range(3):
+        sacc_data.add_data_point('galaxy_shear_cl_ee', ('test', 'test'), 1.0, ell=10)
+    sacc_data.mean = np.array([1.0, 2.0, 3.0])
+    sacc_data.add_covariance(np.eye(3) * 0.1)
+    cosmo = ccl.Cosmology(Omega_c=0.25, Omega_b=0.05, h=0.67, n_s=0.96, sigma8=0.8)
+    likelihood = CosmologyDependentLikelihoodModule("cosmology_dependent_likelihood")
+    smokescreen = ConcealDataVector(cosmo, likelihood, {"Omega_c": (0.2, 0.3), "h": 0.7},
+                                    sacc_data, {"systematic1": 0.1}, seed=2112)
+    path = str(tmp_path / "samples")
+
+    store = smokescreen.sample_theory(path, 4, processes=1, chunk_size=3)
+    assert store.pending().size == 0
+    samples, theory_vecs = store.theory_samples()
+    assert samples.shape == (4, 1)
+    assert theory_vecs.shape == (4, 3)
+    # the deterministic shift of h is part of the sampled cosmologies
+    cosmologies = store.cosmologies()
+    assert all(cosmologies[i]["cosmology"]["h"] == 0.7 for i in range(4))
+    assert all(cosmologies[i]["cosmology"]["Omega_c"] == samples[i, 0] for i in range(4))
+
+    # an interrupted run only computes the missing samples
+    store._done[[1, 3]] = False
+    store._done.flush()
+    with patch('smokescreen.datavector._evaluate_theory_vectors',
+               wraps=_evaluate_theory_vectors) as mock_evaluate:
+        resumed = smokescreen.sample_theory(path, 4, processes=1, chunk_size=3)
+    assert mock_evaluate.call_count == 1
+    assert len(mock_evaluate.call_args.args[2]) == 2
+    np.testing.assert_array_equal(resumed.theory_samples()[1], theory_vecs)
+
+    # the store of another design is not overwritten
+    with pytest.raises(ValueError):
+        smokescreen.sample_theory(path, 5, processes=1)
+
+
+def test_sample_theory_processes(tmp_path):
+    sacc_data = make_synthetic_sacc(n_source=1, n_lens=1, n_ell=4)
+    smokescreen = ConcealDataVector(COSMO, SYNTHETIC_LIKELIHOOD_PATH, {"sigma8": (0.75, 0.85)},
+                                    sacc_data)
+    serial = smokescreen.sample_theory(str(tmp_path / "serial"), 3, processes=1)
+    pooled = smokescreen.sample_theory(str(tmp_path / "pooled"), 3, processes=2)
+    np.testing.assert_array_equal(pooled.theory_samples()[1], serial.theory_samples()[1])
+    assert sorted(pooled.cosmologies()) == [0, 1, 2]
@@ -0,0 +1,120 @@
+import pytest
+import numpy as np
+import pyccl as ccl
+from smokescreen.emulator import (
+    TheoryEmulator,
+    latin_hypercube,
+    shift_bounds,
+    delta_chi2,
+)
+
+COSMO = ccl.Cosmology(Omega_c=0.25, Omega_b=0.05, h=0.67, n_s=0.96, sigma8=0.8,
+                      transfer_function='eisenstein_hu')
+BOUNDS = np.array([[0.2, 0.3], [0.7, 0.9]])
+
+
+def _theory_vector(Omega_c, sigma8):
+    cosmo = ccl.Cosmology(Omega_c=Omega_c, Omega_b=0.05, h=0.67, n_s=0.96, sigma8=sigma8,
+                          transfer_function='eisenstein_hu', matter_power_spectrum='linear')
+    z = np.linspace(0.0, 2.0, 100)
+    shear = ccl.WeakLensingTracer(cosmo, dndz=(z, np.exp(-0.5 * ((z - 0.8) / 0.2)**2)))
+    cl = ccl.angular_cl(cosmo, shear, shear, np.geomspace(20, 2000, 10))
+    return np.concatenate([cl * 1e9, ccl.comoving_radial_distance(cosmo, [0.5, 0.8]) / 1e3])
+
+
+@pytest.fixture(scope="module")
+def training_set():
+    samples = latin_hypercube(BOUNDS, 20, 42)
+    return samples, np.array([_theory_vector(*sample) for sample in samples])
+
+
+@pytest.fixture(scope="module")
+def validation_set():
+    samples = latin_hypercube(BOUNDS, 4, 7)
+    return samples, np.array([_theory_vector(*sample) for sample in samples])
+
+
+def _emulator(training_set, degree=3):
+    samples, theory_vecs = training_set
+    return TheoryEmulator.train(["Omega_c", "sigma8"], BOUNDS, samples, theory_vecs,
+                                _theory_vector(0.25, 0.8), degree=degree, key="abc")
+
+
+def test_shift_bounds():
+    parameters, bounds = shift_bounds(COSMO, {"sigma8": (0.7, 0.9), "Omega_c": (0.2, 0.3),
+                                              "h": 0.7})
+    assert parameters == ["Omega_c", "sigma8"]
+    np.testing.assert_array_equal(bounds, BOUNDS)
+    _, bounds = shift_bounds(COSMO, {"sigma8": (0.8, 0.01)}, "gaussian", n_sigma=3)
+    np.testing.assert_allclose(bounds, [[0.77, 0.83]])
+    with pytest.raises(ValueError):
+        shift_bounds(COSMO, {"h": 0.7})
+    with pytest.raises(ValueError):
+        shift_bounds(COSMO, {"h": (0.7, 0.6)})
+
+
+def test_latin_hypercube():
+    samples = latin_hypercube(BOUNDS, 10, "2112")
+    assert samples.shape == (10, 2)
+    # one sample in each of the 10 strata of every parameter
+    for i, (low, high) in enumerate(BOUNDS):
+        strata = np.floor(10 * (samples[:, i] - low) / (high - low)).astype(int)
+        assert sorted(strata) == list(range(10))
+    np.testing.assert_array_equal(samples, latin_hypercube(BOUNDS, 10, "2112"))
+    assert not np.array_equal(samples, latin_hypercube(BOUNDS, 10, 1))
+
+
+def test_delta_chi2():
+    covariance = np.diag([1.0, 4.0])
+    assert delta_chi2([1.0, 2.0], covariance) == pytest.approx(2.0)
+    np.testing.assert_allclose(delta_chi2([[1.0, 2.0], [0.0, 4.0]], covariance), [2.0, 4.0])
+
+
+def test_emulator_accuracy(training_set, validation_set):
+    emulator = _emulator(training_set)
+    samples, exact = validation_set
+    np.testing.assert_allclose(emulator.predict(samples), exact, rtol=1e-3)
+    validation = emulator.validate(samples, exact, sigma=np.full(exact.shape[1], 0.1))
+    assert emulator.validation is validation
+    assert np.all(validation["relative_error"] < 1e-3)
+    assert validation["error_over_sigma"].shape == (4,)
+
+    # a dictionary, or columns in another order
+    shift = {"sigma8": 0.85, "Omega_c": 0.22}
+    np.testing.assert_allclose(emulator.predict(shift), _theory_vector(0.22, 0.85), rtol=1e-3)
+    np.testing.assert_array_equal(emulator.predict([[0.85, 0.22]], parameters=["sigma8", "Omega_c"]),
+                                  emulator.predict([[0.22, 0.85]]))
+    np.testing.assert_allclose(emulator.concealing_factor(shift),
+                               emulator.predict(shift) - emulator.theory_vec_fid)
+    np.testing.assert_allclose(emulator.concealing_factor(shift, factor_type="mult"),
+                               emulator.predict(shift) / emulator.theory_vec_fid)
+    with pytest.raises(ValueError):
+        emulator.predict({"sigma8": 0.85})
+    with pytest.raises(NotImplementedError):
+        emulator.concealing_factor(shift, factor_type="invalid")
+
+
+def test_emulator_needs_enough_samples():
+    samples = latin_hypercube(BOUNDS, 5, 42)
+    with pytest.raises(ValueError):
+        TheoryEmulator.train(["Omega_c", "sigma8"], BOUNDS, samples, np.ones((5, 3)),
+                             np.ones(3), degree=2)
+
+
+def test_emulator_save_load(training_set, validation_set, tmp_path):
+    emulator = _emulator(training_set, degree=2)
+    samples, exact = validation_set
+    emulator.validate(samples, exact)
+    path = str(tmp_path / "emulator.npz")
+    emulator.save(path)
+
+    loaded = TheoryEmulator.load(path)
+    assert loaded.parameters == emulator.parameters
+    assert loaded.key == "abc"
+    assert loaded.degree == 2
+    np.testing.assert_array_equal(loaded.training_samples, emulator.training_samples)
+    np.testing.assert_array_equal(loaded.training_theory_vecs, emulator.training_theory_vecs)
+    np.testing.assert_array_equal(loaded.predict(samples), emulator.predict(samples))
+    assert sorted(loaded.validation) == sorted(emulator.validation)
+    np.testing.assert_array_equal(loaded.validation["relative_error"],
+                                  emulator.validation["relative_error"])
@@ -1,6 +1,13 @@
 import os
+import shutil
+import hashlib
+import struct
 import pytest
-from smokescreen.encryption import encrypt_file, decrypt_file
+from unittest.mock import patch
+import sacc
+from smokescreen.encryption import encrypt_file, decrypt_file, file_digest
+from smokescreen.encryption import decrypt_to_sacc, open_encrypted_file
+from smokescreen.encryption import ENCRYPTION_MAGIC, MAX_CHUNK_SIZE
 
 
 @pytest.fixture
@@ -108,6 +115,17 @@ def test_decrypt_file_save(encrypted_file_and_key):
     assert saved_decrypted_sacc == b"This is a test file."
 
 
+def test_encrypt_and_decrypt_file_mode(encrypted_file_and_key, tmp_path):
+    encrypted_file_path, key_file_path = encrypted_file_and_key
+    decrypt_file(str(encrypted_file_path), str(key_file_path), save_file=True)
+    reference = tmp_path / "reference"
+    reference.write_bytes(b"")
+    # the outputs get the same mode as files created with open (not 0600)
+    mode = os.stat(reference).st_mode & 0o777
+    assert os.stat(encrypted_file_path).st_mode & 0o777 == mode
+    assert os.stat(os.path.join(os.path.dirname(encrypted_file_path), "test_file")).st_mode & 0o777 == mode
+
+
 def test_decrypt_file_nonexistent():
     # Test decrypting a nonexistent file
     with pytest.raises(FileNotFoundError):
@@ -179,3 +197,316 @@ def test_decrypt_file_save_with_fallback_extension_removal(tmp_path):
     decrypted_file = tmp_path / "data"
     assert decrypted_file.exists()
     assert decrypted_file.read_bytes() == backup_content
+
+
+@pytest.fixture
+def large_file(tmp_path):
+    file_path = tmp_path / "large_file.sacc"
+    file_path.write_bytes(os.urandom(10_000))
+    return file_path
+
+
+@pytest.mark.parametrize("chunk_size", [1, 4096, 10_000, 2**20])
+def test_encrypt_decrypt_v2_roundtrip(large_file, tmp_path, chunk_size):
+    original = large_file.read_bytes()
+    path_to_save = tmp_path / "encrypted"
+    encrypted_sacc, key = encrypt_file(str(large_file), path_to_save=str(path_to_save),
+                                       save_file=True, keep_original=True,
+                                       chunk_size=chunk_size)
+    encrypted_file_path = path_to_save / "large_file.encrpt"
+    assert encrypted_file_path.read_bytes() == encrypted_sacc
+    assert encrypted_sacc.startswith(ENCRYPTION_MAGIC)
+    # raw binary output: header plus a 16-byte tag per chunk, no base64 growth
+    n_chunks = -(-len(original) // chunk_size)
+    assert len(encrypted_sacc) == len(original) + 16 + 16 * n_chunks
+
+    decrypted_sacc = decrypt_file(str(encrypted_file_path), str(path_to_save / "large_file.key"))
+    assert decrypted_sacc == original
+
+
+def test_encrypt_decrypt_v2_empty_file(tmp_path):
+    empty_file = tmp_path / "empty.sacc"
+    empty_file.write_bytes(b"")
+    encrypt_file(str(empty_file), save_file=True)
+    assert decrypt_file(str(tmp_path / "empty.encrpt"), str(tmp_path / "empty.key")) == b""
+
+
+def test_encrypt_decrypt_without_returning_data(large_file, tmp_path):
+    original = large_file.read_bytes()
+    encrypted_sacc, key = encrypt_file(str(large_file), save_file=True,
+                                       return_data=False, chunk_size=1000)
+    assert encrypted_sacc is None
+    assert isinstance(key, bytes)
+    assert not os.path.exists(large_file)
+
+    decrypted_sacc = decrypt_file(str(tmp_path / "large_file.encrpt"),
+                                  str(tmp_path / "large_file.key"),
+                                  save_file=True, return_data=False)
+    assert decrypted_sacc is None
+    assert (tmp_path / "large_file").read_bytes() == original
+    # no temporary files are left behind
+    assert sorted(os.listdir(tmp_path)) == ["large_file", "large_file.encrpt", "large_file.key"]
+
+
+@pytest.mark.parametrize("version", [1, 2])
+def test_encrypt_file_with_digest(large_file, tmp_path, version):
+    original = large_file.read_bytes()
+    digest = file_digest(str(large_file), chunk_size=1000)
+    assert digest == hashlib.sha256(original).hexdigest()
+    encrypt_file(str(large_file), save_file=True, keep_original=False, return_data=False,
+                 version=version, chunk_size=1000, expected_digest=digest)
+    decrypted_sacc = decrypt_file(str(tmp_path / "large_file.encrpt"),
+                                  str(tmp_path / "large_file.key"))
+    assert decrypted_sacc == original
+
+
+def test_encrypt_file_changed_since_hashed(large_file, tmp_path):
+    digest = file_digest(str(large_file))
+    # the file changes on disk after it was hashed (e.g. during the concealment)
+    with open(large_file, "r+b") as file:
+        file.seek(5000)
+        file.write(b"changed")
+    with pytest.raises(ValueError, match="does not match the expected digest"):
+        encrypt_file(str(large_file), save_file=True, chunk_size=1000, expected_digest=digest)
+    # no encrypted file or key is written and the original is kept
+    assert sorted(os.listdir(tmp_path)) == ["large_file.sacc"]
+
+
+def test_encrypt_file_digest_mismatch(large_file, tmp_path):
+    wrong_digest = hashlib.sha256(b"other content").hexdigest()
+    with pytest.raises(ValueError, match="does not match the expected digest"):
+        encrypt_file(str(large_file), save_file=True, chunk_size=1000,
+                     expected_digest=wrong_digest)
+    # nothing is saved and the original is kept
+    assert sorted(os.listdir(tmp_path)) == ["large_file.sacc"]
+
+
+@pytest.mark.parametrize("version", [1, 2])
+def test_encrypt_file_from_data(large_file, tmp_path, version):
+    original = large_file.read_bytes()
+    digest = hashlib.sha256(original).hexdigest()
+    with patch("builtins.open", wraps=open) as mock_open:
+        encrypt_file(str(large_file), save_file=True, keep_original=False, return_data=False,
+                     version=version, chunk_size=1000, expected_digest=digest, data=original)
+    # the original file is not read again
+    assert str(large_file) not in [c.args[0] for c in mock_open.call_args_list]
+    assert not os.path.exists(large_file)
+    decrypted_sacc = decrypt_file(str(tmp_path / "large_file.encrpt"),
+                                  str(tmp_path / "large_file.key"))
+    assert decrypted_sacc == original
+
+
+def test_encrypt_file_from_data_mismatch(large_file, tmp_path):
+    original = large_file.read_bytes()
+    digest = hashlib.sha256(original).hexdigest()
+    # the content encrypted is not the one hashed
+    with pytest.raises(ValueError, match=f"{len(original) - 1} bytes.*does not match"):
+        encrypt_file(str(large_file), save_file=True, chunk_size=1000, expected_digest=digest,
+                     data=original[:-1], keep_original=True)
+    # the file on disk changed since it was read
+    large_file.write_bytes(original + b"appended")
+    with pytest.raises(ValueError, match="changed since it was read"):
+        encrypt_file(str(large_file), save_file=True, chunk_size=1000, expected_digest=digest,
+                     data=original)
+    # nothing is saved and the original is kept
+    assert sorted(os.listdir(tmp_path)) == ["large_file.sacc"]
+
+
+def test_decrypt_legacy_fernet_file(temp_file, tmp_path):
+    encrypted_sacc, key = encrypt_file(str(temp_file), save_file=True, version=1)
+    assert not encrypted_sacc.startswith(ENCRYPTION_MAGIC)
+    decrypted_sacc = decrypt_file(str(tmp_path / "test_file.encrpt"),
+                                  str(tmp_path / "test_file.key"))
+    assert decrypted_sacc == b"This is a test file."
+
+
+def test_encrypt_file_invalid_options(temp_file):
+    with pytest.raises(ValueError):
+        encrypt_file(str(temp_file), version=3)
+    with pytest.raises(ValueError):
+        encrypt_file(str(temp_file), chunk_size=0)
+    with pytest.raises(ValueError):
+        encrypt_file(str(temp_file), chunk_size=MAX_CHUNK_SIZE + 1)
+
+
+def _encrypt_in_chunks(large_file, tmp_path):
+    encrypt_file(str(large_file), save_file=True, chunk_size=1000)
+    return tmp_path / "large_file.encrpt", tmp_path / "large_file.key"
+
+
+def test_decrypt_v2_detects_tampering(large_file, tmp_path):
+    encrypted_file_path, key_file_path = _encrypt_in_chunks(large_file, tmp_path)
+    content = bytearray(encrypted_file_path.read_bytes())
+    content[5000] ^= 1
+    encrypted_file_path.write_bytes(bytes(content))
+    with pytest.raises(ValueError, match="Integrity check failed"):
+        decrypt_file(str(encrypted_file_path), str(key_file_path), save_file=True)
+    # nothing is saved when the check fails
+    assert not os.path.exists(tmp_path / "large_file")
+
+
+def test_decrypt_v2_detects_truncation_and_reordering(large_file, tmp_path):
+    encrypted_file_path, key_file_path = _encrypt_in_chunks(large_file, tmp_path)
+    content = encrypted_file_path.read_bytes()
+    header, body = content[:16], content[16:]
+    chunks = [body[i:i + 1016] for i in range(0, len(body), 1016)]
+
+    # last chunk dropped
+    encrypted_file_path.write_bytes(header + b"".join(chunks[:-1]))
+    with pytest.raises(ValueError, match="Integrity check failed"):
+        decrypt_file(str(encrypted_file_path), str(key_file_path))
+
+    # two chunks swapped
+    encrypted_file_path.write_bytes(header + chunks[1] + chunks[0] + b"".join(chunks[2:]))
+    with pytest.raises(ValueError, match="Integrity check failed"):
+        decrypt_file(str(encrypted_file_path), str(key_file_path))
+
+    # incomplete header
+    encrypted_file_path.write_bytes(header[:10])
+    with pytest.raises(ValueError):
+        decrypt_file(str(encrypted_file_path), str(key_file_path))
+
+
+def test_decrypt_v2_wrong_key(large_file, tmp_path):
+    encrypted_file_path, _ = _encrypt_in_chunks(large_file, tmp_path)
+    other_file = tmp_path / "other.txt"
+    other_file.write_bytes(b"other")
+    encrypt_file(str(other_file), save_file=True)
+    with pytest.raises(ValueError, match="Integrity check failed"):
+        decrypt_file(str(encrypted_file_path), str(tmp_path / "other.key"))
+
+
+@pytest.mark.parametrize("encrypt_workers, decrypt_workers", [(4, 1), (1, 4), (3, 3)])
+def test_encrypt_decrypt_v2_workers(large_file, tmp_path, encrypt_workers, decrypt_workers):
+    original = large_file.read_bytes()
+    encrypted_sacc, _ = encrypt_file(str(large_file), save_file=True, keep_original=True,
+                                     chunk_size=100, workers=encrypt_workers)
+    n_chunks = len(original) // 100
+    assert len(encrypted_sacc) == len(original) + 16 + 16 * n_chunks
+    decrypted_sacc = decrypt_file(str(tmp_path / "large_file.encrpt"),
+                                  str(tmp_path / "large_file.key"),
+                                  workers=decrypt_workers)
+    assert decrypted_sacc == original
+
+
+def test_decrypt_v2_workers_detects_tampering(large_file, tmp_path):
+    encrypted_file_path, key_file_path = _encrypt_in_chunks(large_file, tmp_path)
+    content = bytearray(encrypted_file_path.read_bytes())
+    content[-1] ^= 1
+    encrypted_file_path.write_bytes(bytes(content))
+    with pytest.raises(ValueError, match="Integrity check failed for chunk 9"):
+        decrypt_file(str(encrypted_file_path), str(key_file_path), save_file=True, workers=4)
+    assert not os.path.exists(tmp_path / "large_file")
+
+
+def test_encrypt_decrypt_invalid_workers(temp_file):
+    with pytest.raises(ValueError):
+        encrypt_file(str(temp_file), workers=0)
+    with pytest.raises(ValueError):
+        decrypt_file(str(temp_file), str(temp_file), workers=0)
+
+
+@pytest.mark.parametrize("file_format", ["fits", "hdf5"])
+@pytest.mark.parametrize("version", [1, 2])
+def test_decrypt_to_sacc(tmp_path, file_format, version):
+    original_path = f"./examples/cosmic_shear/cosmicshear_sacc.{file_format}"
+    sacc_path = tmp_path / f"cosmicshear_sacc.{file_format}"
+    shutil.copy(original_path, sacc_path)
+    chunk_kwargs = {'chunk_size': 1000} if version == 2 else {}
+    encrypt_file(str(sacc_path), save_file=True, version=version, **chunk_kwargs)
+
+    sacc_data = decrypt_to_sacc(str(tmp_path / "cosmicshear_sacc.encrpt"),
+                                str(tmp_path / "cosmicshear_sacc.key"))
+    assert sacc_data == getattr(sacc.Sacc, f"load_{file_format}")(original_path)
+    # nothing is written to disk
+    assert sorted(os.listdir(tmp_path)) == ["cosmicshear_sacc.encrpt", "cosmicshear_sacc.key"]
+
+
+@pytest.mark.parametrize("file_format", ["fits", "hdf5"])
+def test_decrypt_to_sacc_newer_version(tmp_path, file_format):
+    sacc_path = str(tmp_path / f"newer.{file_format}")
+    shutil.copy(f"./examples/cosmic_shear/cosmicshear_sacc.{file_format}", sacc_path)
+    # written as if by a newer version of sacc
+    if file_format == "fits":
+        from astropy.io import fits
+        with fits.open(sacc_path, mode="update") as hdu_list:
+            hdu_list[0].header["SACCFVER"] = 99
+    else:
+        import h5py
+        with h5py.File(sacc_path, "r+") as file:
+            del file["sacc_hdf5_version"]
+            file.create_dataset("sacc_hdf5_version", data=[99])
+    encrypt_file(sacc_path, save_file=True)
+
+    with pytest.raises(ValueError, match="Unsupported SACC .* version: 99"):
+        decrypt_to_sacc(str(tmp_path / "newer.encrpt"), str(tmp_path / "newer.key"))
+
+
+def test_open_encrypted_file_random_access(large_file, tmp_path):
+    original = large_file.read_bytes()
+    encrypted_file_path, key_file_path = _encrypt_in_chunks(large_file, tmp_path)
+    with open_encrypted_file(str(encrypted_file_path), str(key_file_path)) as file:
+        assert file.seekable()
+        assert file.read() == original
+        for offset, size in [(0, 10), (995, 10), (2000, 3000), (9990, 100), (20000, 10)]:
+            file.seek(offset)
+            assert file.read(size) == original[offset:offset + size]
+        file.seek(-5, os.SEEK_END)
+        assert file.read() == original[-5:]
+        with pytest.raises(ValueError):
+            file.seek(-1)
+
+
+def test_open_encrypted_file_detects_tampering_and_truncation(large_file, tmp_path):
+    encrypted_file_path, key_file_path = _encrypt_in_chunks(large_file, tmp_path)
+    content = encrypted_file_path.read_bytes()
+
+    # corrupted third chunk: the first chunks can be read, the third cannot
+    tampered = bytearray(content)
+    tampered[16 + 2 * 1016 + 10] ^= 1
+    encrypted_file_path.write_bytes(bytes(tampered))
+    with open_encrypted_file(str(encrypted_file_path), str(key_file_path)) as file:
+        file.read(1000)
+        with pytest.raises(ValueError, match="Integrity check failed for chunk 2"):
+            file.read()
+
+    # dropped last chunk: the new last chunk is not flagged as final
+    encrypted_file_path.write_bytes(content[:-1016])
+    with open_encrypted_file(str(encrypted_file_path), str(key_file_path)) as file:
+        file.seek(-1, os.SEEK_END)
+        with pytest.raises(ValueError, match="Integrity check failed"):
+            file.read()
+
+    # incomplete chunk
+    encrypted_file_path.write_bytes(content[:16 + 10])
+    with pytest.raises(ValueError, match="truncated"):
+        open_encrypted_file(str(encrypted_file_path), str(key_file_path))
+
+
+def test_decrypt_corrupted_header_chunk_size(large_file, tmp_path):
+    encrypted_file_path, key_file_path = _encrypt_in_chunks(large_file, tmp_path)
+    content = bytearray(encrypted_file_path.read_bytes())
+    # chunk size field of the header (after the magic and version bytes) set to zero
+    content[8:12] = struct.pack(">I", 0)
+    encrypted_file_path.write_bytes(bytes(content))
+    with pytest.raises(ValueError, match="invalid chunk size 0"):
+        open_encrypted_file(str(encrypted_file_path), str(key_file_path))
+    with pytest.raises(ValueError, match="invalid chunk size 0"):
+        decrypt_file(str(encrypted_file_path), str(key_file_path))
+
+
+def test_decrypt_corrupted_header_huge_chunk_size(large_file, tmp_path):
+    encrypted_file_path, key_file_path = _encrypt_in_chunks(large_file, tmp_path)
+    content = bytearray(encrypted_file_path.read_bytes())
+    # a chunk size of about 4 GiB would be buffered before any integrity check
+    content[8:12] = struct.pack(">I", 2**32 - 1)
+    encrypted_file_path.write_bytes(bytes(content))
+    with pytest.raises(ValueError, match="invalid chunk size"):
+        open_encrypted_file(str(encrypted_file_path), str(key_file_path))
+    with pytest.raises(ValueError, match="invalid chunk size"):
+        decrypt_file(str(encrypted_file_path), str(key_file_path), workers=4)
+
+
+def test_open_encrypted_file_nonexistent(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        open_encrypted_file(str(tmp_path / "nonexistent.encrpt"), str(tmp_path / "key.key"))
@@ -0,0 +1,89 @@
+import pytest  # noqa: F401
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from smokescreen.instrumentation import StageRecorder, DISABLED, peak_rss_bytes
+
+
+def test_stage_recorder_records_stages():
+    recorder = StageRecorder()
+    with recorder.stage("first"):
+        np.ones(10**5).sum()
+    with recorder.stage("second"):
+        pass
+    with recorder.stage("first"):
+        pass
+
+    assert [stage["name"] for stage in recorder.stages] == ["first", "second", "first"]
+    for stage in recorder.stages:
+        assert stage["wall_seconds"] >= 0
+        assert stage["cpu_seconds"] >= 0
+        assert stage["children_cpu_seconds"] >= 0
+        assert stage["peak_rss_bytes"] > 0
+        assert stage["peak_rss_increase_bytes"] >= 0
+    report = recorder.report(command="test")
+    assert report["command"] == "test"
+    assert report["totals"]["first"]["calls"] == 2
+    assert report["totals"]["second"]["calls"] == 1
+    assert report["total_wall_seconds"] >= sum(s["wall_seconds"] for s in recorder.stages)
+
+
+def test_stage_recorder_concurrent_stages_cpu():
+    recorder = StageRecorder()
+
+    def work():
+        with recorder.stage("work"):
+            end = time.perf_counter() + 0.2
+            while time.perf_counter() < end:
+                pass
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        list(executor.map(lambda _: work(), range(2)))
+    # each stage only counts the CPU time of its own thread
+    for stage in recorder.stages:
+        assert stage["cpu_seconds"] <= stage["wall_seconds"] + 0.05
+    idle = StageRecorder()
+    with idle.stage("idle"):
+        time.sleep(0.1)
+    assert idle.stages[0]["cpu_seconds"] < 0.05
+
+
+def test_stage_recorder_records_failed_stage():
+    recorder = StageRecorder()
+    with pytest.raises(RuntimeError):
+        with recorder.stage("failing"):
+            raise RuntimeError("stage failed")
+    assert [stage["name"] for stage in recorder.stages] == ["failing"]
+
+
+def test_disabled_stage_recorder():
+    recorder = StageRecorder(enabled=False)
+    with recorder.stage("first"):
+        pass
+    assert recorder.stages == []
+    # the same no-op context manager is handed out for every stage
+    assert recorder.stage("first") is DISABLED.stage("second")
+    assert recorder.report()["stages"] == []
+
+
+def test_stage_recorder_write_json(tmp_path):
+    recorder = StageRecorder()
+    with recorder.stage("save"):
+        pass
+    path = tmp_path / "report.json"
+    recorder.write_json(str(path), path_to_sacc="data.fits")
+
+    with open(path) as file:
+        report = json.load(file)
+    assert report["path_to_sacc"] == "data.fits"
+    assert report["stages"][0]["name"] == "save"
+    assert "smokescreen_version" in report
+
+
+def test_peak_rss_bytes():
+    peak = peak_rss_bytes()
+    # at least the size of a large array held in memory
+    array = np.ones(2**22)
+    assert peak_rss_bytes() >= max(peak, array.nbytes)
+    assert peak_rss_bytes(children=True) >= 0
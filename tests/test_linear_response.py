@@ -0,0 +1,79 @@
+import pytest
+import numpy as np
+import pyccl as ccl
+from smokescreen.linear_response import LinearResponse, finite_difference_steps
+
+PARAMETERS = ["Omega_c", "sigma8"]
+REFERENCE = np.array([0.25, 0.8])
+
+
+def _theory_vector(Omega_c, sigma8):
+    # cosmic shear power spectrum and distances, depending non-linearly on the parameters
+    cosmo = ccl.Cosmology(Omega_c=Omega_c, Omega_b=0.05, h=0.67, n_s=0.96, sigma8=sigma8,
+                          transfer_function='eisenstein_hu')
+    z = np.linspace(0.0, 2.0, 100)
+    shear = ccl.WeakLensingTracer(cosmo, dndz=(z, np.exp(-0.5 * ((z - 0.8) / 0.2)**2)))
+    cl = ccl.angular_cl(cosmo, shear, shear, np.geomspace(20, 2000, 8))
+    return np.concatenate([cl * 1e9, ccl.comoving_radial_distance(cosmo, [0.5, 0.8]) / 1e3])
+
+
+def _response(step=1e-3):
+    steps = finite_difference_steps(REFERENCE, step)
+    plus = [_theory_vector(*(REFERENCE + steps * np.eye(2)[i])) for i in range(2)]
+    minus = [_theory_vector(*(REFERENCE - steps * np.eye(2)[i])) for i in range(2)]
+    return LinearResponse.from_finite_differences(PARAMETERS, REFERENCE, steps,
+                                                  _theory_vector(*REFERENCE), plus, minus)
+
+
+def test_finite_difference_steps():
+    np.testing.assert_allclose(finite_difference_steps([0.25, -2.0, 0.0], 1e-3),
+                               [2.5e-4, 2e-3, 1e-3])
+
+
+def test_linear_response_exact_for_linear_theory():
+    jacobian = np.array([[1.0, 2.0], [0.0, -1.0], [3.0, 0.5]])
+    fid = np.array([1.0, 2.0, 4.0])
+    steps = finite_difference_steps(REFERENCE)
+    plus = [fid + jacobian @ (steps * np.eye(2)[i]) for i in range(2)]
+    minus = [fid - jacobian @ (steps * np.eye(2)[i]) for i in range(2)]
+    response = LinearResponse.from_finite_differences(PARAMETERS, REFERENCE, steps, fid,
+                                                      plus, minus)
+    np.testing.assert_allclose(response.jacobian, jacobian)
+
+    shift = {"Omega_c": 0.3, "sigma8": 0.7}
+    offset = np.array([0.05, -0.1])
+    np.testing.assert_allclose(response.concealing_factor(shift), jacobian @ offset)
+    np.testing.assert_allclose(response.concealing_factor(shift, factor_type="mult"),
+                               (fid + jacobian @ offset) / fid)
+    # parameters that are not shifted stay at their reference value
+    np.testing.assert_allclose(response.concealing_factor({"sigma8": 0.7}),
+                               jacobian @ [0.0, -0.1])
+    # a batch of shifts, with the columns in another order
+    batch = np.array([[0.7, 0.3], [0.8, 0.25]])
+    np.testing.assert_allclose(response.concealing_factor(batch, parameters=["sigma8", "Omega_c"]),
+                               [jacobian @ offset, np.zeros(3)], atol=1e-15)
+    with pytest.raises(ValueError):
+        response.concealing_factor({"h": 0.7})
+    with pytest.raises(ValueError):
+        response.concealing_factor(np.ones(3))
+    with pytest.raises(NotImplementedError):
+        response.concealing_factor(shift, factor_type="invalid")
+    with pytest.raises(ValueError):
+        LinearResponse(PARAMETERS, REFERENCE, fid, jacobian.T)
+
+
+def test_linear_response_accuracy():
+    response = _response()
+    shifts = [{"Omega_c": 0.255, "sigma8": 0.81}, {"Omega_c": 0.3, "sigma8": 0.9}]
+    exact = [_theory_vector(**shift) for shift in shifts]
+    accuracy = response.accuracy(shifts, exact, sigma=np.full(len(exact[0]), 0.1))
+    # the neglected curvature grows with the size of the shift
+    assert accuracy["add_relative_error"][0] < 2e-2
+    assert accuracy["add_relative_error"][1] > accuracy["add_relative_error"][0]
+    assert accuracy["mult_relative_error"][0] < 5e-2
+    assert accuracy["add_error_over_sigma"].shape == (2,)
+    # the same validation from an array of shifts
+    array_accuracy = response.accuracy([[0.255, 0.81], [0.3, 0.9]], exact)
+    np.testing.assert_allclose(array_accuracy["add_relative_error"],
+                               accuracy["add_relative_error"])
+    assert "add_error_over_sigma" not in array_accuracy
@@ -1,16 +1,28 @@
 import pytest  # noqa: F401
 import os
+import sys
+import json
+import hashlib
+import shutil
+import subprocess
 from unittest.mock import patch, MagicMock
 from cryptography.fernet import Fernet
 from pyccl import CosmologyVanillaLCDM
 from smokescreen.utils import load_cosmology_from_partial_dict
+from smokescreen.cache import FiducialCache
+from smokescreen.instrumentation import StageRecorder
 from smokescreen import __main__
-from smokescreen.__main__ import encrypt_main, decrypt_main
+from smokescreen.__main__ import encrypt_main, decrypt_main, main
+
+# content of the example file and its digest, checked when it is encrypted
+with open("./examples/cosmic_shear/cosmicshear_sacc.fits", "rb") as _file:
+    SACC_CONTENT = _file.read()
+SACC_DIGEST = hashlib.sha256(SACC_CONTENT).hexdigest()
 
 
 @patch('builtins.print')
 @patch('smokescreen.__main__.ConcealDataVector')
-@patch('smokescreen.__main__.load_sacc_file')
+@patch('smokescreen.__main__.load_sacc_file_and_content')
 def test_main(mock_load_sacc, mock_smokescreen, mock_print):
     # Arrange
     path_to_sacc = "./examples/cosmic_shear/cosmicshear_sacc.fits"
@@ -28,7 +40,7 @@ def test_main(mock_load_sacc, mock_smokescreen, mock_print):
     mock_smokescreen.return_value = mock_smokescreen_instance
 
     sacc_file = MagicMock()  # Create a mock sacc_file
-    mock_load_sacc.return_value = (sacc_file, 'fits')  # Make load_sacc return tuple of (sacc, format)
+    mock_load_sacc.return_value = (sacc_file, 'fits', SACC_CONTENT, SACC_DIGEST)  # (sacc, format, content, digest)
 
     # Act
     __main__.datavector_main(path_to_sacc, likelihood_path, shifts_dict, systematics,
@@ -36,7 +48,7 @@ def test_main(mock_load_sacc, mock_smokescreen, mock_print):
                              path_to_output, keep_original_sacc)
 
     # Assert
-    mock_load_sacc.assert_called_once_with(path_to_sacc)
+    mock_load_sacc.assert_called_once_with(path_to_sacc, lazy_covariance=True)
     mock_smokescreen.assert_called_once_with(reference_cosmology, likelihood_path,
                                              shifts_dict, sacc_file, systematics, seed,
                                              shift_distr=shift_distribution, input_format='fits')
@@ -49,7 +61,7 @@ def test_main(mock_load_sacc, mock_smokescreen, mock_print):
 
 @patch('builtins.print')
 @patch('smokescreen.__main__.ConcealDataVector')
-@patch('smokescreen.__main__.load_sacc_file')
+@patch('smokescreen.__main__.load_sacc_file_and_content')
 def test_main_loads_cosmology_from_dict(mock_load_sacc, mock_smokescreen, mock_print):
     # Arrange
     path_to_sacc = "./examples/cosmic_shear/cosmicshear_sacc.fits"
@@ -67,7 +79,7 @@ def test_main_loads_cosmology_from_dict(mock_load_sacc, mock_smokescreen, mock_p
     mock_smokescreen.return_value = mock_smokescreen_instance
 
     sacc_file = MagicMock()  # Create a mock sacc_file
-    mock_load_sacc.return_value = (sacc_file, 'fits')  # Make load_sacc return tuple of (sacc, format)
+    mock_load_sacc.return_value = (sacc_file, 'fits', SACC_CONTENT, SACC_DIGEST)  # (sacc, format, content, digest)
 
     # Act
     __main__.datavector_main(path_to_sacc, likelihood_path, shifts_dict, systematics, shift_type,
@@ -76,7 +88,7 @@ def test_main_loads_cosmology_from_dict(mock_load_sacc, mock_smokescreen, mock_p
 
     # Assert
     mod_ref_cosmo = load_cosmology_from_partial_dict(reference_cosmology)
-    mock_load_sacc.assert_called_once_with(path_to_sacc)
+    mock_load_sacc.assert_called_once_with(path_to_sacc, lazy_covariance=True)
     mock_smokescreen.assert_called_once_with(mod_ref_cosmo, likelihood_path, shifts_dict,
                                              sacc_file, systematics, seed,
                                              shift_distr=shift_distribution, input_format='fits')
@@ -89,7 +101,7 @@ def test_main_loads_cosmology_from_dict(mock_load_sacc, mock_smokescreen, mock_p
 
 @patch('builtins.print')
 @patch('smokescreen.__main__.ConcealDataVector')
-@patch('smokescreen.__main__.load_sacc_file')
+@patch('smokescreen.__main__.load_sacc_file_and_content')
 def test_main_gaussian_shift(mock_load_sacc, mock_smokescreen, mock_print):
     # Arrange
     path_to_sacc = "./examples/cosmic_shear/cosmicshear_sacc.fits"
@@ -107,7 +119,7 @@ def test_main_gaussian_shift(mock_load_sacc, mock_smokescreen, mock_print):
     mock_smokescreen.return_value = mock_smokescreen_instance
 
     sacc_file = MagicMock()  # Create a mock sacc_file
-    mock_load_sacc.return_value = (sacc_file, 'fits')  # Make load_sacc return tuple of (sacc, format)
+    mock_load_sacc.return_value = (sacc_file, 'fits', SACC_CONTENT, SACC_DIGEST)  # (sacc, format, content, digest)
 
     # Act
     __main__.datavector_main(path_to_sacc, likelihood_path, shifts_dict,
@@ -116,7 +128,7 @@ def test_main_gaussian_shift(mock_load_sacc, mock_smokescreen, mock_print):
                              path_to_output, keep_original_sacc)
 
     # Assert
-    mock_load_sacc.assert_called_once_with(path_to_sacc)
+    mock_load_sacc.assert_called_once_with(path_to_sacc, lazy_covariance=True)
     mock_smokescreen.assert_called_once_with(reference_cosmology,
                                              likelihood_path, shifts_dict, sacc_file,
                                              systematics, seed,
@@ -130,7 +142,7 @@ def test_main_gaussian_shift(mock_load_sacc, mock_smokescreen, mock_print):
 
 @patch('builtins.print')
 @patch('smokescreen.__main__.ConcealDataVector')
-@patch('smokescreen.__main__.load_sacc_file')
+@patch('smokescreen.__main__.load_sacc_file_and_content')
 def test_datavector_main_custom_suffix(mock_load_sacc, mock_smokescreen, mock_print):
     # Arrange
     path_to_sacc = "./examples/cosmic_shear/cosmicshear_sacc.fits"
@@ -149,7 +161,7 @@ def test_datavector_main_custom_suffix(mock_load_sacc, mock_smokescreen, mock_pr
     mock_smokescreen.return_value = mock_smokescreen_instance
 
     sacc_file = MagicMock()
-    mock_load_sacc.return_value = (sacc_file, 'fits')
+    mock_load_sacc.return_value = (sacc_file, 'fits', SACC_CONTENT, SACC_DIGEST)
 
     # Act
     __main__.datavector_main(path_to_sacc, likelihood_path, shifts_dict, systematics,
@@ -163,6 +175,110 @@ def test_datavector_main_custom_suffix(mock_load_sacc, mock_smokescreen, mock_pr
     )
 
 
+@patch('builtins.print')
+@patch('smokescreen.__main__.encrypt_file')
+@patch('smokescreen.__main__.ConcealDataVector')
+@patch('smokescreen.__main__.load_sacc_file_and_content')
+def test_datavector_main_fiducial_cache_dir(mock_load_sacc, mock_smokescreen, mock_encrypt,
+                                            mock_print, tmp_path):
+    mock_encrypt.return_value = (b'encrypted_sacc', b'key')
+    mock_load_sacc.return_value = (MagicMock(), 'fits', SACC_CONTENT, SACC_DIGEST)
+    cache_dir = str(tmp_path / "fid_cache")
+
+    __main__.datavector_main("./examples/cosmic_shear/cosmicshear_sacc.fits",
+                             "./tests/test_data/mock_likelihood.py",
+                             {"Omega_c": [-0.1, 0.2]}, {}, 'add', 'flat', 2112,
+                             CosmologyVanillaLCDM(), str(tmp_path), True,
+                             fiducial_cache_dir=cache_dir)
+
+    _, kwargs = mock_smokescreen.call_args
+    assert isinstance(kwargs['fiducial_cache'], FiducialCache)
+    assert kwargs['fiducial_cache'].cache_dir == cache_dir
+    assert os.path.isdir(cache_dir)
+
+
+@patch('builtins.print')
+@patch('smokescreen.__main__.encrypt_file')
+@patch('smokescreen.__main__.ConcealDataVector')
+@patch('smokescreen.__main__.load_sacc_file_and_content')
+def test_datavector_batch_main(mock_load_sacc, mock_smokescreen, mock_encrypt, mock_print):
+    path_to_sacc = "./examples/cosmic_shear/cosmicshear_sacc.fits"
+    likelihood_path = "./tests/test_data/mock_likelihood.py"
+    path_to_output = "./tests/test_data/"
+    reference_cosmology = CosmologyVanillaLCDM()
+    blinds = [{"shifts_dict": {"Omega_c": [0.2, 0.3]}, "seed": 2112, "suffix": "blind_A"},
+              {"shifts_dict": {"Omega_c": 0.25}, "suffix": "blind_B"}]
+
+    mock_smokescreen_instance = MagicMock()
+    mock_smokescreen_instance.conceal_batch.return_value = ["a.fits", "b.fits"]
+    mock_smokescreen.return_value = mock_smokescreen_instance
+    sacc_file = MagicMock()
+    mock_load_sacc.return_value = (sacc_file, 'fits', SACC_CONTENT, SACC_DIGEST)
+    mock_encrypt.return_value = (b'encrypted_sacc', b'key')
+
+    __main__.datavector_batch_main(path_to_sacc, likelihood_path, blinds, {}, 'add', 'flat',
+                                   reference_cosmology, path_to_output, True)
+
+    expected_specs = [({"Omega_c": (0.2, 0.3)}, 2112, "blind_A"),
+                      ({"Omega_c": 0.25}, 2112, "blind_B")]
+    # a single likelihood build, for the first blind
+    mock_load_sacc.assert_called_once_with(path_to_sacc, lazy_covariance=True)
+    mock_smokescreen.assert_called_once_with(reference_cosmology, likelihood_path,
+                                             {"Omega_c": (0.2, 0.3)}, sacc_file, {}, 2112,
+                                             shift_distr='flat', input_format='fits')
+    mock_smokescreen_instance.conceal_batch.assert_called_once_with(
+        expected_specs, path_to_output, 'cosmicshear_sacc', factor_type='add', output_format='fits'
+    )
+    # the original file is encrypted once
+    mock_encrypt.assert_called_once_with(path_to_sacc, path_to_output, save_file=True,
+                                         keep_original=True, return_data=False,
+                                         expected_digest=SACC_DIGEST, data=SACC_CONTENT)
+
+
+@patch('builtins.print')
+@patch('smokescreen.__main__.encrypt_file')
+@patch('smokescreen.__main__.ConcealDataVector')
+@patch('smokescreen.__main__.load_sacc_file_and_content')
+def test_datavector_batch_main_threads(mock_load_sacc, mock_smokescreen, mock_encrypt,
+                                       mock_print, tmp_path):
+    mock_smokescreen.return_value.conceal_batch.return_value = ["a.fits"]
+    mock_load_sacc.return_value = (MagicMock(), 'fits', SACC_CONTENT, SACC_DIGEST)
+    mock_encrypt.return_value = (b'encrypted_sacc', b'key')
+
+    __main__.datavector_batch_main("./examples/cosmic_shear/cosmicshear_sacc.fits",
+                                   "./tests/test_data/mock_likelihood.py",
+                                   [{"shifts_dict": {"Omega_c": 0.25}}], {}, 'add', 'flat',
+                                   CosmologyVanillaLCDM(), str(tmp_path), True, threads=4)
+
+    _, kwargs = mock_smokescreen.return_value.conceal_batch.call_args
+    assert kwargs['threads'] == 4
+
+
+def test_datavector_batch_main_no_blinds():
+    with pytest.raises(AssertionError):
+        __main__.datavector_batch_main("./examples/cosmic_shear/cosmicshear_sacc.fits",
+                                       "./tests/test_data/mock_likelihood.py", [])
+
+
+@patch('builtins.print')
+@patch('smokescreen.__main__.encrypt_file')
+@patch('smokescreen.__main__.ConcealDataVector')
+@patch('smokescreen.__main__.load_sacc_file_and_content')
+def test_datavector_main_verify_sacc(mock_load_sacc, mock_smokescreen, mock_encrypt,
+                                     mock_print, tmp_path):
+    mock_encrypt.return_value = (b'encrypted_sacc', b'key')
+    mock_load_sacc.return_value = (MagicMock(), 'fits', SACC_CONTENT, SACC_DIGEST)
+
+    __main__.datavector_main("./examples/cosmic_shear/cosmicshear_sacc.fits",
+                             "./tests/test_data/mock_likelihood.py",
+                             {"Omega_c": [-0.1, 0.2]}, {}, 'add', 'flat', 2112,
+                             CosmologyVanillaLCDM(), str(tmp_path), True,
+                             verify_sacc='blockwise')
+
+    _, kwargs = mock_smokescreen.call_args
+    assert kwargs['verify_level'] == 'blockwise'
+
+
 @pytest.fixture
 def temp_file(tmp_path):
     file_path = tmp_path / "test_file.sacc"
@@ -188,7 +304,7 @@ def test_encrypt_main(mock_getuser, mock_encrypt_file, temp_file, temp_dir, caps
     # Check if the encrypt_file function was called with the correct parameters
     mock_encrypt_file.assert_called_once_with(str(temp_file),
                                               str(temp_dir), save_file=True,
-                                              keep_original=True)
+                                              keep_original=True, return_data=False)
 
     # Check if the output messages are correct
     captured = capsys.readouterr()
@@ -212,7 +328,8 @@ def test_encrypt_main_remove_original(mock_getuser, mock_encrypt_file, temp_file
     mock_encrypt_file.assert_called_once_with(str(temp_file),
                                               str(temp_dir),
                                               save_file=True,
-                                              keep_original=False)
+                                              keep_original=False,
+                                              return_data=False)
 
     # Check if the output messages are correct
     captured = capsys.readouterr()
@@ -274,7 +391,8 @@ def test_decrypt_main(mock_getuser, mock_decrypt_file, temp_encrypted_file_and_k
     # Check if the decrypt_file function was called with the correct parameters
     mock_decrypt_file.assert_called_once_with(str(encrypted_file_path),
                                               str(key_file_path),
-                                              save_file=True)
+                                              save_file=True,
+                                              return_data=False)
 
     # Check if the output messages are correct
     captured = capsys.readouterr()
@@ -311,3 +429,284 @@ def test_decrypt_main_key_not_found(temp_encrypted_file_and_key):
 #     assert "SACC file" in captured.out
 #     assert "decrypted successfully" in captured.out
 #     assert "Decrypted file saved as" in captured.out
+
+
+@patch('builtins.print')
+@patch('smokescreen.__main__.encrypt_file')
+@patch('smokescreen.__main__.ConcealDataVector')
+@patch('smokescreen.__main__.load_sacc_file_and_content')
+def test_datavector_main_compress_covariance(mock_load_sacc, mock_smokescreen, mock_encrypt,
+                                             mock_print, tmp_path):
+    mock_encrypt.return_value = (b'encrypted_sacc', b'key')
+    mock_load_sacc.return_value = (MagicMock(), 'fits', SACC_CONTENT, SACC_DIGEST)
+
+    __main__.datavector_main("./examples/cosmic_shear/cosmicshear_sacc.fits",
+                             "./tests/test_data/mock_likelihood.py",
+                             {"Omega_c": [-0.1, 0.2]}, {}, 'add', 'flat', 2112,
+                             CosmologyVanillaLCDM(), str(tmp_path), True,
+                             compress_covariance=True)
+
+    _, kwargs = mock_smokescreen.call_args
+    assert kwargs['compress_covariance'] is True
+
+
+@patch('builtins.print')
+@patch('smokescreen.__main__.encrypt_file')
+@patch('smokescreen.__main__.ConcealDataVector')
+@patch('smokescreen.__main__.load_sacc_file_and_content')
+def test_datavector_main_fast_output(mock_load_sacc, mock_smokescreen, mock_encrypt,
+                                     mock_print, tmp_path):
+    mock_encrypt.return_value = (b'encrypted_sacc', b'key')
+    mock_load_sacc.return_value = (MagicMock(), 'fits', SACC_CONTENT, SACC_DIGEST)
+    path_to_sacc = "./examples/cosmic_shear/cosmicshear_sacc.fits"
+
+    __main__.datavector_main(path_to_sacc,
+                             "./tests/test_data/mock_likelihood.py",
+                             {"Omega_c": [-0.1, 0.2]}, {}, 'add', 'flat', 2112,
+                             CosmologyVanillaLCDM(), str(tmp_path), True,
+                             fast_output=True)
+
+    mock_smokescreen.return_value.save_concealed_datavector.assert_called_once_with(
+        str(tmp_path), 'cosmicshear_sacc', output_format='fits', suffix=None,
+        input_path=path_to_sacc
+    )
+
+
+@patch('smokescreen.__main__.decrypt_file')
+@patch('smokescreen.__main__.encrypt_file')
+def test_encrypt_decrypt_main_workers(mock_encrypt_file, mock_decrypt_file, temp_file,
+                                      temp_dir, temp_encrypted_file_and_key):
+    mock_encrypt_file.return_value = (None, b'key')
+    encrypt_main(path_to_sacc=str(temp_file), path_to_save=str(temp_dir), keep_original=True,
+                 workers=4)
+    mock_encrypt_file.assert_called_once_with(str(temp_file), str(temp_dir), save_file=True,
+                                              keep_original=True, return_data=False,
+                                              workers=4)
+
+    encrypted_file_path, key_file_path = temp_encrypted_file_and_key
+    decrypt_main(path_to_sacc=str(encrypted_file_path), path_to_key=str(key_file_path),
+                 workers=4)
+    mock_decrypt_file.assert_called_once_with(str(encrypted_file_path), str(key_file_path),
+                                              save_file=True, return_data=False, workers=4)
+
+
+def _imported_modules(*python_args):
+    """Modules imported by a fresh interpreter, from ``python -X importtime``."""
+    import smokescreen
+    env = dict(os.environ)
+    package_root = os.path.dirname(os.path.dirname(smokescreen.__file__))
+    env["PYTHONPATH"] = os.pathsep.join([package_root, env.get("PYTHONPATH", "")])
+    result = subprocess.run([sys.executable, "-X", "importtime", *python_args],
+                            capture_output=True, text=True, env=env)
+    return {line.split("|")[-1].strip() for line in result.stderr.splitlines()
+            if line.startswith("import time:")}
+
+
+@pytest.mark.parametrize("python_args", [
+    ("-c", "import smokescreen.__main__"),
+    ("-m", "smokescreen", "encrypt", "--help"),
+    ("-m", "smokescreen", "decrypt", "--help"),
+])
+def test_cli_import_time(python_args):
+    modules = _imported_modules(*python_args)
+    assert "smokescreen.encryption" in modules
+    # the heavy dependencies of the datavector subcommands are not imported
+    for heavy in ("pyccl", "sacc", "firecrown", "astropy", "smokescreen.datavector"):
+        assert heavy not in modules
+
+
+def test_package_lazy_attributes():
+    import smokescreen
+    assert "ConcealDataVector" in dir(smokescreen)
+    with pytest.raises(AttributeError):
+        smokescreen.not_an_attribute
+    with pytest.raises(AttributeError):
+        __main__.not_an_attribute
+
+
+@patch('smokescreen.__main__.encrypt_file')
+def test_main_light_subcommand(mock_encrypt_file, temp_file):
+    mock_encrypt_file.return_value = (None, b'key')
+    main(["encrypt", "--path_to_sacc", str(temp_file), "--keep_original", "true"])
+    mock_encrypt_file.assert_called_once_with(str(temp_file), None, save_file=True,
+                                              keep_original=True, return_data=False)
+
+
+@patch('builtins.print')
+@patch('smokescreen.__main__.encrypt_file')
+@patch('smokescreen.__main__.ConcealDataVector')
+@patch('smokescreen.__main__.load_sacc_file_and_content')
+def test_datavector_main_report_json(mock_load_sacc, mock_smokescreen, mock_encrypt,
+                                     mock_print, tmp_path):
+    mock_encrypt.return_value = (b'encrypted_sacc', b'key')
+    mock_load_sacc.return_value = (MagicMock(), 'fits', SACC_CONTENT, SACC_DIGEST)
+    report_path = tmp_path / "report.json"
+
+    __main__.datavector_main("./examples/cosmic_shear/cosmicshear_sacc.fits",
+                             "./tests/test_data/mock_likelihood.py",
+                             {"Omega_c": [-0.1, 0.2]}, {}, 'add', 'flat', 2112,
+                             CosmologyVanillaLCDM(), str(tmp_path), True,
+                             report_json=str(report_path))
+
+    _, kwargs = mock_smokescreen.call_args
+    assert isinstance(kwargs['stage_recorder'], StageRecorder)
+    with open(report_path) as file:
+        report = json.load(file)
+    assert report['command'] == 'datavector'
+    assert [stage['name'] for stage in report['stages']] == ['imports', 'load_sacc', 'encrypt']
+    assert report['totals']['encrypt']['calls'] == 1
+
+
+@patch('builtins.print')
+@patch('smokescreen.__main__.encrypt_file')
+@patch('smokescreen.__main__.ConcealDataVector')
+@patch('smokescreen.__main__.load_sacc_file_and_content')
+def test_datavector_main_amplitude_fast_path(mock_load_sacc, mock_smokescreen, mock_encrypt,
+                                             mock_print, tmp_path):
+    mock_encrypt.return_value = (b'encrypted_sacc', b'key')
+    mock_load_sacc.return_value = (MagicMock(), 'fits', SACC_CONTENT, SACC_DIGEST)
+
+    __main__.datavector_main("./examples/cosmic_shear/cosmicshear_sacc.fits",
+                             "./tests/test_data/mock_likelihood.py",
+                             {"sigma8": [0.7, 0.9]}, {}, 'add', 'flat', 2112,
+                             CosmologyVanillaLCDM(), str(tmp_path), True,
+                             amplitude_fast_path=True)
+
+    mock_smokescreen.return_value.calculate_concealing_factor.assert_called_once_with(
+        factor_type='add', parallel=False, amplitude_fast_path=True)
+
+
+@patch('builtins.print')
+@patch('smokescreen.__main__.encrypt_file')
+@patch('smokescreen.__main__.ConcealDataVector')
+@patch('smokescreen.__main__.load_sacc_file_and_content')
+def test_datavector_main_share_background(mock_load_sacc, mock_smokescreen, mock_encrypt,
+                                          mock_print, tmp_path):
+    mock_encrypt.return_value = (b'encrypted_sacc', b'key')
+    mock_load_sacc.return_value = (MagicMock(), 'fits', SACC_CONTENT, SACC_DIGEST)
+
+    __main__.datavector_main("./examples/cosmic_shear/cosmicshear_sacc.fits",
+                             "./tests/test_data/mock_likelihood.py",
+                             {"sigma8": [0.7, 0.9]}, {}, 'add', 'flat', 2112,
+                             CosmologyVanillaLCDM(), str(tmp_path), True,
+                             share_background=True)
+
+    _, kwargs = mock_smokescreen.call_args
+    assert kwargs['share_background'] is True
+
+
+@patch('builtins.print')
+@patch('smokescreen.__main__.encrypt_file')
+@patch('smokescreen.__main__.ConcealDataVector')
+@patch('smokescreen.__main__.load_sacc_file')
+def test_profile_main_writes_nothing_by_default(mock_load_sacc, mock_smokescreen, mock_encrypt,
+                                                mock_print, tmp_path):
+    mock_load_sacc.return_value = (MagicMock(), 'fits')
+    profile_output = tmp_path / "profile.pstats"
+
+    __main__.profile_main("./examples/cosmic_shear/cosmicshear_sacc.fits",
+                          "./tests/test_data/mock_likelihood.py",
+                          {"Omega_c": [-0.1, 0.2]}, profile_output=str(profile_output),
+                          top=5)
+
+    mock_smokescreen.return_value.calculate_concealing_factor.assert_called_once_with(
+        factor_type='add', parallel=False)
+    mock_smokescreen.return_value.save_concealed_datavector.assert_not_called()
+    mock_encrypt.assert_not_called()
+    assert sorted(os.listdir(tmp_path)) == ["profile.pstats", "profile.txt"]
+    assert "Time by package" in (tmp_path / "profile.txt").read_text()
+
+
+@patch('builtins.print')
+@patch('smokescreen.__main__.encrypt_file')
+@patch('smokescreen.__main__.ConcealDataVector')
+@patch('smokescreen.__main__.load_sacc_file')
+def test_profile_main_amplitude_fast_path(mock_load_sacc, mock_smokescreen, mock_encrypt,
+                                          mock_print, tmp_path):
+    mock_load_sacc.return_value = (MagicMock(), 'fits')
+
+    __main__.profile_main("./examples/cosmic_shear/cosmicshear_sacc.fits",
+                          "./tests/test_data/mock_likelihood.py",
+                          {"sigma8": [0.7, 0.9]}, amplitude_fast_path=True,
+                          profile_output=str(tmp_path / "profile.pstats"))
+
+    # the profile runs the same code path as the datavector subcommand
+    mock_smokescreen.return_value.calculate_concealing_factor.assert_called_once_with(
+        factor_type='add', parallel=False, amplitude_fast_path=True)
+
+
+@patch('builtins.print')
+@patch('smokescreen.__main__.encrypt_file')
+@patch('smokescreen.__main__.ConcealDataVector')
+@patch('smokescreen.__main__.load_sacc_file')
+def test_profile_main_share_background(mock_load_sacc, mock_smokescreen, mock_encrypt,
+                                       mock_print, tmp_path):
+    mock_load_sacc.return_value = (MagicMock(), 'fits')
+
+    __main__.profile_main("./examples/cosmic_shear/cosmicshear_sacc.fits",
+                          "./tests/test_data/mock_likelihood.py",
+                          {"sigma8": [0.7, 0.9]}, share_background=True,
+                          profile_output=str(tmp_path / "profile.pstats"))
+
+    _, kwargs = mock_smokescreen.call_args
+    assert kwargs['share_background'] is True
+
+
+@patch('builtins.print')
+@patch('smokescreen.__main__.datavector_main')
+def test_profile_main_write_outputs(mock_datavector_main, mock_print, tmp_path):
+    profile_output = str(tmp_path / "profile.pstats")
+    __main__.profile_main("./examples/cosmic_shear/cosmicshear_sacc.fits",
+                          "./tests/test_data/mock_likelihood.py",
+                          {"Omega_c": [-0.1, 0.2]}, path_to_output=str(tmp_path),
+                          keep_original_sacc=True, profile_output=profile_output,
+                          write_outputs=True)
+
+    _, kwargs = mock_datavector_main.call_args
+    assert kwargs['path_to_output'] == str(tmp_path)
+    assert kwargs['keep_original_sacc'] is True
+    assert kwargs['share_background'] is False
+    assert os.path.exists(profile_output)
+
+
+@patch('builtins.print')
+@patch('smokescreen.__main__.encrypt_file')
+@patch('smokescreen.__main__.ConcealDataVector')
+@patch('smokescreen.__main__.load_sacc_file')
+def test_sample_theory_main(mock_load_sacc, mock_smokescreen, mock_encrypt, mock_print,
+                            tmp_path):
+    mock_load_sacc.return_value = (MagicMock(), 'fits')
+    output = str(tmp_path / "samples")
+
+    __main__.sample_theory_main("./examples/cosmic_shear/cosmicshear_sacc.fits",
+                                "./tests/test_data/mock_likelihood.py",
+                                {"sigma8": [0.7, 0.9], "h": 0.7}, output, n_samples=8,
+                                processes=2, chunk_size=4, verify_sacc='hash')
+
+    args, kwargs = mock_smokescreen.call_args
+    assert args[2] == {"sigma8": (0.7, 0.9), "h": 0.7}
+    assert kwargs['verify_level'] == 'hash'
+    mock_smokescreen.return_value.sample_theory.assert_called_once_with(
+        output, 8, processes=2, chunk_size=4)
+    # the input file is neither concealed nor encrypted
+    mock_smokescreen.return_value.save_concealed_datavector.assert_not_called()
+    mock_encrypt.assert_not_called()
+
+
+@patch('builtins.print')
+@patch('smokescreen.__main__.ConcealDataVector')
+def test_datavector_main_keeps_changed_original(mock_smokescreen, mock_print, tmp_path):
+    path_to_sacc = str(tmp_path / "cosmicshear_sacc.fits")
+    shutil.copy("./examples/cosmic_shear/cosmicshear_sacc.fits", path_to_sacc)
+
+    def change_file(*args, **kwargs):
+        with open(path_to_sacc, "ab") as file:
+            file.write(b"changed during the concealment")
+    mock_smokescreen.return_value.calculate_concealing_factor.side_effect = change_file
+
+    with pytest.raises(ValueError, match="changed since it was read"):
+        __main__.datavector_main(path_to_sacc, "./tests/test_data/mock_likelihood.py",
+                                 {"sigma8": [0.7, 0.9]}, {}, 'add', 'flat', 2112,
+                                 CosmologyVanillaLCDM(), str(tmp_path), False)
+    # the file on disk is not the one concealed: nothing is encrypted or removed
+    assert sorted(os.listdir(tmp_path)) == ["cosmicshear_sacc.fits"]
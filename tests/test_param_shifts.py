@@ -1,8 +1,12 @@
 import pytest  # noqa  F401
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pyccl as ccl
 from smokescreen.param_shifts import draw_flat_param_shifts
 from smokescreen.param_shifts import draw_flat_or_deterministic_param_shifts
 from smokescreen.param_shifts import draw_gaussian_param_shifts
+from smokescreen.param_shifts import draw_flat_or_deterministic_param_shifts_batch
+from smokescreen.param_shifts import draw_gaussian_param_shifts_batch
 
 
 # tests for draw_flat_param_shifts
@@ -142,3 +146,98 @@ def test_draw_gaussian_param_shifts_string_seed():
     for key, value in shifts.items():
         mean, std = shifts_dict[key]
         assert mean - 3 * std <= value <= mean + 3 * std
+
+
+# the single-draw functions must keep giving the same shifts for a seed
+def test_single_draw_shifts_are_reproducible():
+    cosmo = ccl.CosmologyVanillaLCDM()
+    shifts = draw_flat_or_deterministic_param_shifts(
+        cosmo, {"Omega_c": (0.2, 0.3), "sigma8": (0.7, 0.9), "h": 0.01}, "2112")
+    assert shifts == {"Omega_c": 0.2279478911323865, "h": 0.01, "sigma8": 0.7523342795879359}
+    shifts = draw_gaussian_param_shifts(cosmo, {"Omega_c": (0.25, 0.01), "sigma8": (0.8, 0.02)}, 1234)
+    assert shifts == {"Omega_c": 0.2547143516373249, "sigma8": 0.7761804861058708}
+    shifts = draw_flat_param_shifts({"a": (1, 2), "b": (2, 3)}, 123)
+    assert shifts == {"a": 1.6964691855978615, "b": 2.2861393349503794}
+
+
+# tests for the batch variants
+def test_draw_flat_or_deterministic_param_shifts_batch():
+    cosmo = ccl.CosmologyVanillaLCDM()
+    shifts_dict = {"sigma8": (0.7, 0.9), "Omega_c": (0.2, 0.3), "h": 0.01}
+
+    params, shifts = draw_flat_or_deterministic_param_shifts_batch(cosmo, shifts_dict, "2112", 1000)
+
+    # columns in the order of the cosmology parameters
+    assert params == [key for key in cosmo.to_dict() if key in shifts_dict]
+    assert shifts.shape == (1000, 3)
+    omega_c, h, sigma8 = (shifts[:, params.index(key)] for key in ("Omega_c", "h", "sigma8"))
+    assert np.all((omega_c >= 0.2) & (omega_c <= 0.3))
+    assert np.all((sigma8 >= 0.7) & (sigma8 <= 0.9))
+    assert np.all(h == 0.01)
+    # the draws are independent
+    assert len(np.unique(omega_c)) == 1000
+    assert abs(np.corrcoef(omega_c, sigma8)[0, 1]) < 0.1
+
+
+def test_param_shifts_batch_reproducible_in_chunks():
+    cosmo = ccl.CosmologyVanillaLCDM()
+    shifts_dict = {"Omega_c": (0.25, 0.01), "sigma8": (0.8, 0.02)}
+
+    params, shifts = draw_gaussian_param_shifts_batch(cosmo, shifts_dict, 1234, 10)
+    _, again = draw_gaussian_param_shifts_batch(cosmo, shifts_dict, 1234, 10)
+    _, first = draw_gaussian_param_shifts_batch(cosmo, shifts_dict, 1234, 4)
+    _, rest = draw_gaussian_param_shifts_batch(cosmo, shifts_dict, 1234, 6, first_draw=4)
+    _, other = draw_gaussian_param_shifts_batch(cosmo, shifts_dict, 4321, 10)
+
+    np.testing.assert_array_equal(shifts, again)
+    np.testing.assert_array_equal(shifts, np.vstack([first, rest]))
+    assert not np.any(shifts == other)
+    # each draw comes from a stream spawned from the seed sequence
+    children = np.random.SeedSequence(1234).spawn(10)
+    expected = np.random.default_rng(children[7]).standard_normal(2)
+    np.testing.assert_allclose(shifts[7], [0.25, 0.8] + np.array([0.01, 0.02]) * expected)
+
+
+def test_param_shifts_batch_string_seed():
+    cosmo = ccl.CosmologyVanillaLCDM()
+    shifts_dict = {"Omega_c": (0.2, 0.3)}
+    _, shifts = draw_flat_or_deterministic_param_shifts_batch(cosmo, shifts_dict, "abc", 5)
+    _, same = draw_flat_or_deterministic_param_shifts_batch(cosmo, shifts_dict, "abc", 5)
+    np.testing.assert_array_equal(shifts, same)
+
+
+def test_param_shifts_batch_invalid_inputs():
+    cosmo = ccl.CosmologyVanillaLCDM()
+    with pytest.raises(ValueError):
+        draw_flat_or_deterministic_param_shifts_batch(cosmo, {"invalid_key": (0.1, 0.2)}, 1, 5)
+    with pytest.raises(ValueError):
+        draw_flat_or_deterministic_param_shifts_batch(cosmo, {"Omega_c": (0.1, 0.2, 0.3)}, 1, 5)
+    with pytest.raises(ValueError):
+        draw_gaussian_param_shifts_batch(cosmo, {"Omega_c": 0.1}, 1, 5)
+    with pytest.raises(ValueError):
+        draw_gaussian_param_shifts_batch(cosmo, {"Omega_c": (0.25, 0.01)}, 1, -1)
+
+
+def test_param_shifts_do_not_use_global_random_state():
+    cosmo = ccl.CosmologyVanillaLCDM()
+    np.random.seed(42)
+    expected = np.random.random()
+    np.random.seed(42)
+    draw_flat_param_shifts({"a": (1, 2)}, 1)
+    draw_flat_or_deterministic_param_shifts(cosmo, {"Omega_c": (0.2, 0.3)}, 1)
+    draw_gaussian_param_shifts(cosmo, {"Omega_c": (0.25, 0.01)}, "1")
+    assert np.random.random() == expected
+
+
+def test_param_shifts_thread_safe():
+    cosmo = ccl.CosmologyVanillaLCDM()
+    shifts_dict = {"Omega_c": (0.2, 0.3), "sigma8": (0.7, 0.9), "h": 0.01}
+    seeds = list(range(200)) * 4
+
+    def draw(seed):
+        return draw_flat_or_deterministic_param_shifts(cosmo, shifts_dict, seed)
+
+    serial = [draw(seed) for seed in seeds]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        threaded = list(executor.map(draw, seeds))
+    assert threaded == serial
@@ -0,0 +1,69 @@
+import pytest  # noqa: F401
+import numpy as np
+import sacc
+from smokescreen.profiling import (
+    package_of,
+    run_profiled,
+    summarize_profile,
+    format_profile_summary,
+)
+
+
+def _build_sacc(n):
+    sacc_data = sacc.Sacc()
+    sacc_data.add_tracer('misc', 'test')
+    for i in range(n):
+        sacc_data.add_data_point('galaxy_shear_cl_ee', ('test', 'test'), 1.0, ell=10 * (i + 1))
+    sacc_data.add_covariance(np.eye(n))
+    return sacc_data
+
+
+def test_package_of():
+    assert package_of("/usr/lib/python3/site-packages/pyccl/cosmology.py") == "pyccl"
+    assert package_of("/usr/lib/python3/site-packages/firecrown/likelihood/gaussian.py") == "firecrown"
+    assert package_of("/usr/lib/python3/site-packages/sacc/sacc.py") == "sacc"
+    assert package_of("/home/user/smokescreen/src/smokescreen/datavector.py") == "smokescreen"
+    assert package_of("/usr/lib/python3/site-packages/numpy/core/numeric.py") == "other"
+    assert package_of("<frozen importlib._bootstrap>") == "imports"
+    assert package_of("~", "<built-in method pyccl._ccllib.cosmology_compute_growth>") == "pyccl"
+    assert package_of("~", "<built-in method builtins.len>") == "builtins"
+
+
+def test_run_profiled():
+    result, stats, memory = run_profiled(_build_sacc, 50)
+    assert len(result.mean) == 50
+    assert memory is None
+
+    summary = summarize_profile(stats, top=5)
+    assert len(summary["top_functions"]) == 5
+    assert "sacc" in summary["packages"]
+    # the package self times add up to the total time
+    assert np.isclose(sum(summary["packages"].values()), summary["total_seconds"])
+    times = [function["self_seconds"] for function in summary["top_functions"]]
+    assert times == sorted(times, reverse=True)
+    text = format_profile_summary(summary)
+    assert "Time by package" in text
+    assert "Top 5 functions by self time" in text
+
+
+def test_run_profiled_trace_memory():
+    _, stats, memory = run_profiled(_build_sacc, 50, trace_memory=True)
+    snapshot, peak = memory
+    assert peak > 0
+
+    summary = summarize_profile(stats, top=3, memory=memory)
+    assert summary["memory"]["peak_bytes"] == peak
+    assert len(summary["memory"]["top_allocations"]) <= 3
+    assert "sacc" in summary["memory"]["packages"]
+    assert "allocation sites" in format_profile_summary(summary)
+
+
+def test_run_profiled_stops_tracing_on_error():
+    import tracemalloc
+
+    def failing():
+        raise RuntimeError("failed")
+
+    with pytest.raises(RuntimeError):
+        run_profiled(failing, trace_memory=True)
+    assert not tracemalloc.is_tracing()
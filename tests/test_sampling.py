@@ -0,0 +1,66 @@
+import os
+import pytest
+import numpy as np
+from smokescreen.sampling import TheorySampleStore
+
+
+PARAMETERS = ["Omega_c", "sigma8"]
+BOUNDS = [[0.2, 0.3], [0.7, 0.9]]
+SAMPLES = np.array([[0.21, 0.72], [0.25, 0.81], [0.29, 0.88]])
+
+
+def _open(path, samples=SAMPLES, **kwargs):
+    return TheorySampleStore.open(str(path), PARAMETERS, BOUNDS, samples, seed=2112,
+                                  key="abc", **kwargs)
+
+
+def test_open_creates_store(tmp_path):
+    store = _open(tmp_path / "samples")
+    assert sorted(os.listdir(tmp_path / "samples")) == ["design.json", "done.npy",
+                                                        "samples.npy"]
+    assert store.parameters == PARAMETERS
+    np.testing.assert_array_equal(store.samples, SAMPLES)
+    np.testing.assert_array_equal(store.pending(), [0, 1, 2])
+    samples, theory_vecs = store.theory_samples()
+    assert samples.shape == (0, 2)
+    assert theory_vecs.size == 0
+
+
+def test_write_and_resume(tmp_path):
+    store = _open(tmp_path)
+    store.write([2], [[1.0, 2.0, 3.0, 4.0]], [{"Omega_c": 0.29, "sigma8": 0.88}], [0.5])
+    store.write([0], [[5.0, 6.0, 7.0, 8.0]], [{"Omega_c": 0.21, "sigma8": 0.72}], [0.25])
+    del store
+
+    resumed = _open(tmp_path)
+    np.testing.assert_array_equal(resumed.done, [True, False, True])
+    np.testing.assert_array_equal(resumed.pending(), [1])
+    samples, theory_vecs = resumed.theory_samples()
+    np.testing.assert_array_equal(samples, SAMPLES[[0, 2]])
+    np.testing.assert_array_equal(theory_vecs, [[5.0, 6.0, 7.0, 8.0], [1.0, 2.0, 3.0, 4.0]])
+    cosmologies = resumed.cosmologies()
+    assert sorted(cosmologies) == [0, 2]
+    assert cosmologies[2]["cosmology"] == {"Omega_c": 0.29, "sigma8": 0.88}
+    assert cosmologies[0]["seconds"] == 0.25
+
+    resumed.write([1], [[0.0, 0.0, 0.0, 0.0]])
+    assert resumed.pending().size == 0
+
+
+def test_open_other_design_raises(tmp_path):
+    _open(tmp_path)
+    with pytest.raises(ValueError):
+        _open(tmp_path, samples=SAMPLES + 0.01)
+    with pytest.raises(ValueError):
+        TheorySampleStore.open(str(tmp_path), PARAMETERS, BOUNDS, SAMPLES, seed=4224, key="abc")
+
+
+def test_cosmologies_skip_interrupted_line(tmp_path):
+    store = _open(tmp_path)
+    store.write([0], [[1.0]], [{"sigma8": 0.72}])
+    # a line cut by an interruption
+    with open(tmp_path / "cosmologies.jsonl", "a") as file:
+        file.write('{"index": 1, "cosmo')
+    assert list(store.cosmologies()) == [0]
+    store.write([1], [[2.0]], [{"sigma8": 0.81}])
+    assert sorted(store.cosmologies()) == [0, 1]
@@ -0,0 +1,81 @@
+import pytest  # noqa: F401
+import os
+import numpy as np
+import sacc
+from smokescreen.synthetic import make_synthetic_sacc, write_synthetic_sacc, LIKELIHOOD_PATH
+from smokescreen.utils import load_sacc_file
+
+
+def test_make_synthetic_sacc_sizes():
+    sacc_data = make_synthetic_sacc(n_source=3, n_lens=2, n_ell=4)
+    assert sorted(sacc_data.tracers) == ['lens0', 'lens1', 'src0', 'src1', 'src2']
+    # 6 shear pairs, 6 source-lens pairs and 2 lens auto-correlations
+    assert len(sacc_data.get_tracer_combinations('galaxy_shear_cl_ee')) == 6
+    assert len(sacc_data.get_tracer_combinations('galaxy_shearDensity_cl_e')) == 6
+    assert len(sacc_data.get_tracer_combinations('galaxy_density_cl')) == 2
+    assert len(sacc_data) == (6 + 6 + 2) * 4
+    ell, _ = sacc_data.get_ell_cl('galaxy_shear_cl_ee', 'src0', 'src1')
+    np.testing.assert_allclose(ell, np.geomspace(20.0, 2000.0, 4))
+
+    shear_only = make_synthetic_sacc(n_source=4, n_lens=0, n_ell=5,
+                                     data_types=('galaxy_shear_cl_ee',))
+    assert len(shear_only) == 10 * 5
+    assert sorted(shear_only.tracers) == ['src0', 'src1', 'src2', 'src3']
+
+
+@pytest.mark.parametrize("covariance, covariance_class", [
+    ("dense", sacc.covariance.FullCovariance),
+    ("block", sacc.covariance.BlockDiagonalCovariance),
+    ("diagonal", sacc.covariance.DiagonalCovariance),
+])
+def test_make_synthetic_sacc_covariance(covariance, covariance_class):
+    sacc_data = make_synthetic_sacc(n_source=2, n_lens=2, n_ell=3, covariance=covariance)
+    assert isinstance(sacc_data.covariance, covariance_class)
+    dense = sacc_data.covariance.dense
+    assert dense.shape == (len(sacc_data), len(sacc_data))
+    np.testing.assert_allclose(dense, dense.T)
+    assert np.linalg.eigvalsh(dense).min() > 0
+    # 10% errors on the data
+    np.testing.assert_allclose(np.sqrt(np.diag(dense)), 0.1 * np.abs(sacc_data.mean))
+    if covariance == "dense":
+        # different two-point functions are correlated
+        assert dense[0, -1] != 0
+
+
+def test_make_synthetic_sacc_block_matches_dense_blocks():
+    block = make_synthetic_sacc(n_source=2, n_lens=1, n_ell=3, covariance="block").covariance
+    dense = make_synthetic_sacc(n_source=2, n_lens=1, n_ell=3, covariance="dense",
+                                block_correlation=0.0).covariance
+    np.testing.assert_allclose(block.dense, dense.dense)
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"n_ell": 0},
+    {"covariance": "sparse"},
+    {"data_types": ("cmb_convergence_cl",)},
+    {"n_source": 0},
+    {"n_lens": 0},
+    {"ell_correlation": 1.0},
+])
+def test_make_synthetic_sacc_invalid(kwargs):
+    with pytest.raises(ValueError):
+        make_synthetic_sacc(**kwargs)
+
+
+@pytest.mark.parametrize("extension, file_format", [("fits", "fits"), ("hdf5", "hdf5")])
+def test_write_synthetic_sacc(tmp_path, extension, file_format):
+    path = str(tmp_path / f"synthetic.{extension}")
+    sacc_data = write_synthetic_sacc(path, n_source=2, n_lens=2, n_ell=3)
+    loaded, detected_format = load_sacc_file(path)
+    assert detected_format == file_format
+    assert loaded == sacc_data
+
+    with pytest.raises(OSError):
+        write_synthetic_sacc(path, n_source=2, n_lens=2, n_ell=3)
+    write_synthetic_sacc(path, overwrite=True, n_source=1, n_lens=1, n_ell=3)
+    with pytest.raises(ValueError):
+        write_synthetic_sacc(path, file_format="npz")
+
+
+def test_likelihood_path():
+    assert os.path.isfile(LIKELIHOOD_PATH)
@@ -1,11 +1,26 @@
 import pytest  # noqa  F401
+import io
+import gzip
+import shutil
 import tempfile
+from unittest.mock import patch
 import os
+import pickle
+import hashlib
 import numpy as np
+import scipy.linalg
 import pyccl as ccl
-from smokescreen.utils import string_to_seed, load_module_from_path
+import sacc
+from smokescreen.utils import string_to_seed, load_module_from_path, modify_default_params
 from smokescreen.utils import load_cosmology_from_partial_dict
-from smokescreen.utils import load_sacc_file
+from smokescreen.utils import load_sacc_file, load_sacc_fileobj
+from smokescreen.utils import load_sacc_file_and_content
+from smokescreen.utils import detect_sacc_format, peek_sacc_metadata
+from smokescreen.utils import covariance_row_blocks, array_digest, covariance_digest
+from smokescreen.utils import covariance_memory, covariance_to_dense, compress_covariance
+from smokescreen.utils import patch_sacc_file, LazySacc
+from sacc.covariance import BaseCovariance
+import smokescreen.utils as smokescreen_utils
 
 
 def test_load_module_from_path():
@@ -24,6 +39,26 @@ def test_load_module_from_path():
     os.remove(temp_path)
 
 
+def test_load_module_from_path_cache(tmp_path):
+    module_path = tmp_path / "cached_module.py"
+    module_path.write_text("value = 1\n")
+
+    module = load_module_from_path(str(module_path), use_cache=True)
+    assert module.value == 1
+    # the same module object is returned, the file is not executed again
+    assert load_module_from_path(str(module_path), use_cache=True) is module
+    # without the cache the file is always executed
+    assert load_module_from_path(str(module_path)) is not module
+
+    # a modified file is executed again
+    module_path.write_text("value = 2\n")
+    stat = os.stat(module_path)
+    os.utime(module_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    new_module = load_module_from_path(str(module_path), use_cache=True)
+    assert new_module is not module
+    assert new_module.value == 2
+
+
 def test_string_to_seed():
     seed_string = "test_seed"
     result = string_to_seed(seed_string)
@@ -152,3 +187,373 @@ class TestLoadSaccFile:
         # Test that it raises ValueError
         with pytest.raises(ValueError):
             load_sacc_file(str(invalid_path))
+
+
+@pytest.mark.parametrize("covariance", [
+    BaseCovariance.make(np.arange(49.0).reshape(7, 7)),
+    BaseCovariance.make([np.eye(3) * 2.0, np.arange(16.0).reshape(4, 4)]),
+    BaseCovariance.make(np.arange(1.0, 8.0)),
+])
+def test_covariance_row_blocks_rebuild_dense(covariance):
+    dense = np.zeros((covariance.size, covariance.size))
+    for row_start, row_stop, col_start, col_stop, block in covariance_row_blocks(covariance,
+                                                                                 max_rows=2):
+        assert row_stop - row_start <= 2
+        dense[row_start:row_stop, col_start:col_stop] = block
+    np.testing.assert_array_equal(dense, covariance.dense)
+
+
+@pytest.mark.parametrize("covariance", [
+    BaseCovariance.make(np.arange(49.0).reshape(7, 7)),
+    BaseCovariance.make([np.eye(3) * 2.0, np.arange(16.0).reshape(4, 4)]),
+    BaseCovariance.make(np.arange(1.0, 8.0)),
+])
+def test_covariance_digest_matches_dense_digest(covariance):
+    assert covariance_digest(covariance) == array_digest(covariance.dense)
+    assert covariance_digest(covariance) != array_digest(covariance.dense * 2.0)
+
+
+def test_array_digest():
+    array = np.arange(6.0).reshape(2, 3)
+    assert array_digest(array) == array_digest(array.copy())
+    # the digest is taken over float64 values in C order
+    assert array_digest(array) == array_digest(np.asfortranarray(array))
+    assert array_digest(array) == array_digest(array.astype(np.float32))
+    # same bytes but different shape
+    assert array_digest(array) != array_digest(array.reshape(3, 2))
+
+
+def test_covariance_to_dense_does_not_cache():
+    blocks = [np.eye(2) * 2.0, np.array([[1.0, 0.5], [0.5, 1.0]])]
+    block_covariance = sacc.covariance.BlockDiagonalCovariance(blocks)
+    dense = covariance_to_dense(block_covariance)
+    np.testing.assert_array_equal(dense, block_covariance.dense)
+    block_covariance._dense = None
+    covariance_to_dense(block_covariance)
+    assert block_covariance._dense is None
+
+    # the matrix of a full covariance is returned without copying
+    full_covariance = sacc.covariance.FullCovariance(dense)
+    assert covariance_to_dense(full_covariance) is full_covariance.covmat
+
+    diagonal_covariance = sacc.covariance.DiagonalCovariance(np.array([1.0, 2.0]))
+    np.testing.assert_array_equal(covariance_to_dense(diagonal_covariance), np.diag([1.0, 2.0]))
+
+
+@pytest.mark.parametrize("max_rows", [1, 2, 1024])
+def test_compress_covariance_block_diagonal(max_rows):
+    blocks = [np.array([[2.0, 0.5], [0.5, 1.0]]), np.array([[3.0]]),
+              np.array([[1.0, 0.1, 0.2], [0.1, 1.0, 0.3], [0.2, 0.3, 1.0]])]
+    full_covariance = sacc.covariance.FullCovariance(scipy.linalg.block_diag(*blocks))
+    compressed = compress_covariance(full_covariance, max_rows=max_rows)
+    assert isinstance(compressed, sacc.covariance.BlockDiagonalCovariance)
+    assert [len(block) for block in compressed.blocks] == [2, 1, 3]
+    np.testing.assert_array_equal(covariance_to_dense(compressed), full_covariance.covmat)
+
+
+def test_compress_covariance_diagonal_and_full():
+    diagonal = compress_covariance(sacc.covariance.FullCovariance(np.diag([1.0, 2.0, 3.0])))
+    assert isinstance(diagonal, sacc.covariance.DiagonalCovariance)
+    np.testing.assert_array_equal(diagonal.diag, [1.0, 2.0, 3.0])
+
+    # a correlation between the first and last entries couples everything
+    covmat = np.eye(3)
+    covmat[0, 2] = covmat[2, 0] = 0.1
+    full_covariance = sacc.covariance.FullCovariance(covmat)
+    assert compress_covariance(full_covariance) is full_covariance
+
+    # small entries can be dropped with atol
+    covmat[0, 2] = covmat[2, 0] = 1e-20
+    assert isinstance(compress_covariance(sacc.covariance.FullCovariance(covmat), atol=1e-15),
+                      sacc.covariance.DiagonalCovariance)
+
+    # non-full covariances are returned unchanged
+    block_covariance = sacc.covariance.BlockDiagonalCovariance([np.eye(2)])
+    assert compress_covariance(block_covariance) is block_covariance
+
+
+def test_covariance_memory():
+    blocks = [np.eye(2), np.eye(3)]
+    block_covariance = sacc.covariance.BlockDiagonalCovariance(blocks)
+    assert covariance_memory(block_covariance) == ((4 + 9) * 8, 25 * 8)
+    # a cached dense matrix counts towards the memory held
+    block_covariance.dense
+    assert covariance_memory(block_covariance) == ((4 + 9 + 25) * 8, 25 * 8)
+
+    full_covariance = sacc.covariance.FullCovariance(np.eye(5))
+    assert covariance_memory(full_covariance) == (25 * 8, 25 * 8)
+    # sacc caches a copy of the matrix as the dense one
+    full_covariance.dense
+    assert covariance_memory(full_covariance) == (50 * 8, 25 * 8)
+
+    diagonal_covariance = sacc.covariance.DiagonalCovariance(np.ones(5))
+    assert covariance_memory(diagonal_covariance) == (5 * 8, 25 * 8)
+
+
+@pytest.mark.parametrize("file_format", ["fits", "hdf5"])
+def test_patch_sacc_file_matches_full_save(file_format, tmp_path):
+    input_path = f"./examples/cosmic_shear/cosmicshear_sacc.{file_format}"
+    original, _ = load_sacc_file(input_path)
+    new_mean = original.mean * 2.0
+    metadata = {'concealed': True, 'creator': 'test_user', 'seed_smokescreen': 2112}
+
+    output_path = str(tmp_path / f"patched.{file_format}")
+    assert patch_sacc_file(input_path, output_path, original.mean, new_mean, metadata,
+                           output_format=file_format)
+
+    # the same file written through the sacc object
+    reference = original.copy()
+    for data_point, value in zip(reference.data, new_mean):
+        data_point.value = value
+    reference.metadata = metadata
+    reference_path = str(tmp_path / f"reference.{file_format}")
+    getattr(reference, f"save_{file_format}")(reference_path)
+
+    patched, _ = load_sacc_file(output_path)
+    expected, _ = load_sacc_file(reference_path)
+    assert patched == expected
+    np.testing.assert_array_equal(patched.mean, new_mean)
+    assert patched.metadata == metadata
+
+
+def test_patch_sacc_file_refuses(tmp_path):
+    input_path = "./examples/cosmic_shear/cosmicshear_sacc.fits"
+    original, _ = load_sacc_file(input_path)
+    output_path = str(tmp_path / "patched.fits")
+
+    # the file does not hold the given data
+    assert not patch_sacc_file(input_path, output_path, original.mean + 1.0,
+                               original.mean, {'concealed': True})
+    # different output format
+    assert not patch_sacc_file(input_path, output_path, original.mean,
+                               original.mean, {'concealed': True}, output_format='hdf5')
+    # not a SACC file
+    not_sacc = tmp_path / "not_sacc.txt"
+    not_sacc.write_text("not a sacc file")
+    assert not patch_sacc_file(str(not_sacc), output_path, original.mean,
+                               original.mean, {'concealed': True})
+    assert not os.path.exists(output_path)
+
+
+@pytest.mark.parametrize("file_format", ["fits", "hdf5"])
+def test_load_sacc_fileobj(file_format):
+    path = f"./examples/cosmic_shear/cosmicshear_sacc.{file_format}"
+    with open(path, "rb") as file:
+        content = io.BytesIO(file.read())
+    sacc_data, detected_format = load_sacc_fileobj(content)
+    assert detected_format == file_format
+    assert sacc_data._smokescreen_input_format == file_format
+    assert sacc_data == load_sacc_file(path)[0]
+
+
+def test_load_sacc_fileobj_metadata_and_invalid(tmp_path):
+    sacc_data, _ = load_sacc_file("./examples/cosmic_shear/cosmicshear_sacc.fits")
+    sacc_data.metadata['concealed'] = True
+    path = str(tmp_path / "with_metadata.fits")
+    sacc_data.save_fits(path)
+    with open(path, "rb") as file:
+        loaded, _ = load_sacc_fileobj(file)
+    assert loaded.metadata == {'concealed': True}
+
+    with pytest.raises(ValueError):
+        load_sacc_fileobj(io.BytesIO(b"not a sacc file"))
+
+
+def _newer_sacc_file(tmp_path, file_format):
+    # copy of the example written as if by a newer version of sacc
+    path = str(tmp_path / f"newer.{file_format}")
+    shutil.copy(f"./examples/cosmic_shear/cosmicshear_sacc.{file_format}", path)
+    if file_format == "fits":
+        from astropy.io import fits
+        with fits.open(path, mode="update") as hdu_list:
+            hdu_list[0].header["SACCFVER"] = 99
+    else:
+        import h5py
+        with h5py.File(path, "r+") as file:
+            del file["sacc_hdf5_version"]
+            file.create_dataset("sacc_hdf5_version", data=np.array([99], dtype="i4"))
+    return path
+
+
+@pytest.mark.parametrize("file_format", ["fits", "hdf5"])
+def test_load_sacc_newer_version(file_format, tmp_path):
+    path = _newer_sacc_file(tmp_path, file_format)
+    # rejected as by the loaders of sacc, not parsed
+    with pytest.raises(ValueError, match="version"):
+        load_sacc_file(path)
+    with pytest.raises(ValueError, match="version"):
+        load_sacc_file(path, lazy_covariance=True)
+    with open(path, "rb") as file:
+        with pytest.raises(ValueError, match=f"Unsupported SACC {file_format.upper()} version: 99"):
+            load_sacc_fileobj(file)
+
+
+@pytest.mark.parametrize("file_format", ["fits", "hdf5"])
+def test_detect_sacc_format(file_format, tmp_path):
+    path = f"./examples/cosmic_shear/cosmicshear_sacc.{file_format}"
+    assert detect_sacc_format(path) == file_format
+
+    # the content decides, not the extension
+    renamed = tmp_path / "data.sacc"
+    shutil.copy(path, renamed)
+    assert detect_sacc_format(str(renamed)) == file_format
+
+    # gzip-compressed files are detected from their content
+    compressed = tmp_path / f"data.{file_format}.gz"
+    with open(path, "rb") as source, gzip.open(compressed, "wb") as target:
+        target.write(source.read())
+    assert detect_sacc_format(str(compressed)) == file_format
+    loaded, detected = load_sacc_file(str(compressed))
+    assert detected == file_format
+    assert loaded == load_sacc_file(path)[0]
+
+
+def test_detect_sacc_format_unknown(tmp_path):
+    unknown = tmp_path / "unknown.sacc"
+    unknown.write_bytes(b"neither fits nor hdf5")
+    with pytest.raises(ValueError, match="neither a FITS nor an HDF5"):
+        detect_sacc_format(str(unknown))
+
+
+def test_load_sacc_file_loads_once_and_reports_errors(tmp_path):
+    path = "./examples/cosmic_shear/cosmicshear_sacc.fits"
+    with patch("smokescreen.utils.sacc.Sacc.load_hdf5") as mock_load_hdf5:
+        load_sacc_file(path)
+    mock_load_hdf5.assert_not_called()
+
+    # a corrupted HDF5 file reports the HDF5 error instead of a FITS one
+    corrupted = tmp_path / "corrupted.hdf5"
+    with open("./examples/cosmic_shear/cosmicshear_sacc.hdf5", "rb") as file:
+        corrupted.write_bytes(file.read()[:1000])
+    with pytest.raises(ValueError, match="as HDF5") as exc_info:
+        load_sacc_file(str(corrupted))
+    assert exc_info.value.__cause__ is not None
+
+
+@pytest.mark.parametrize("file_format", ["fits", "hdf5"])
+def test_peek_sacc_metadata(file_format, tmp_path):
+    sacc_data, _ = load_sacc_file("./examples/cosmic_shear/cosmicshear_sacc.fits")
+    path = str(tmp_path / f"concealed.{file_format}")
+    assert sacc_data.metadata == {}
+    getattr(sacc_data, f"save_{file_format}")(path)
+    assert peek_sacc_metadata(path) == {}
+
+    sacc_data.metadata['concealed'] = True
+    sacc_data.metadata['seed_smokescreen'] = 2112
+    getattr(sacc_data, f"save_{file_format}")(path, overwrite=True)
+    with patch("smokescreen.utils.sacc.Sacc.from_tables") as mock_from_tables:
+        metadata = peek_sacc_metadata(path)
+    mock_from_tables.assert_not_called()
+    assert metadata == {'concealed': True, 'seed_smokescreen': 2112}
+
+
+@pytest.mark.parametrize("file_format", ["fits", "hdf5"])
+def test_load_sacc_file_lazy_covariance(file_format):
+    path = f"./examples/cosmic_shear/cosmicshear_sacc.{file_format}"
+    eager, _ = load_sacc_file(path)
+    # copies keep the pending covariance
+    copied = pickle.loads(pickle.dumps(load_sacc_file(path, lazy_covariance=True)[0]))
+    assert not copied.covariance_loaded
+
+    with patch("smokescreen.utils._load_sacc_covariance",
+               wraps=smokescreen_utils._load_sacc_covariance) as mock_load_covariance:
+        lazy, detected_format = load_sacc_file(path, lazy_covariance=True)
+        assert isinstance(lazy, LazySacc)
+        assert detected_format == file_format
+        assert lazy._smokescreen_input_format == file_format
+        # the data points are available without touching the covariance
+        np.testing.assert_array_equal(lazy.mean, eager.mean)
+        assert not lazy.covariance_loaded
+        mock_load_covariance.assert_not_called()
+
+        np.testing.assert_array_equal(covariance_to_dense(lazy.covariance),
+                                      covariance_to_dense(eager.covariance))
+        assert lazy.covariance_loaded
+        lazy.covariance
+        mock_load_covariance.assert_called_once()
+    assert lazy == eager
+    assert copied == eager
+
+
+def test_load_sacc_file_lazy_covariance_set_and_missing(tmp_path):
+    lazy, _ = load_sacc_file("./examples/cosmic_shear/cosmicshear_sacc.fits",
+                             lazy_covariance=True)
+    # adding a covariance discards the one in the file
+    lazy.add_covariance(np.eye(len(lazy)), overwrite=True)
+    np.testing.assert_array_equal(lazy.covariance.dense, np.eye(len(lazy)))
+
+    sacc_data = sacc.Sacc()
+    sacc_data.add_tracer('misc', 'test')
+    sacc_data.add_data_point('galaxy_shear_cl_ee', ('test', 'test'), 1.0, ell=10)
+    path = str(tmp_path / "no_covariance.fits")
+    sacc_data.save_fits(path)
+    lazy, _ = load_sacc_file(path, lazy_covariance=True)
+    assert lazy.covariance is None
+
+
+def test_modify_default_params_returns_copy():
+    defaults = {"Omega_c": 0.25, "sigma8": 0.8, "systematic1": 0.0, "other": 1.0}
+    params = modify_default_params(defaults, {"Omega_c": 0.3, "sigma8": 0.7},
+                                   {"systematic1": 0.1})
+    assert params == {"Omega_c": 0.3, "sigma8": 0.7, "systematic1": 0.1, "other": 1.0}
+    # the defaults can be shared: they are not changed
+    assert defaults == {"Omega_c": 0.25, "sigma8": 0.8, "systematic1": 0.0, "other": 1.0}
+
+    class Params(dict):
+        lower_case = False
+    typed = Params(defaults)
+    typed.lower_case = True
+    copied = modify_default_params(typed, {"Omega_c": 0.3})
+    assert isinstance(copied, Params) and copied.lower_case
+    assert typed["Omega_c"] == 0.25
+
+
+@pytest.mark.parametrize("file_format", ["fits", "hdf5"])
+@pytest.mark.parametrize("lazy_covariance", [False, True])
+def test_load_sacc_file_and_content(file_format, lazy_covariance):
+    path = f"./examples/cosmic_shear/cosmicshear_sacc.{file_format}"
+    with patch("builtins.open", wraps=open) as mock_open:
+        sacc_data, detected_format, content, digest = load_sacc_file_and_content(
+            path, lazy_covariance=lazy_covariance)
+    # the file is read once, the sacc is parsed from its content
+    assert [c.args[0] for c in mock_open.call_args_list] == [path]
+    with open(path, "rb") as file:
+        assert content == file.read()
+    assert digest == hashlib.sha256(content).hexdigest()
+    assert detected_format == file_format
+    assert sacc_data._smokescreen_input_format == file_format
+    assert isinstance(sacc_data, LazySacc) == lazy_covariance
+    if lazy_covariance:
+        assert not sacc_data.covariance_loaded
+        # the pending covariance is kept by copies
+        copied = pickle.loads(pickle.dumps(sacc_data))
+        assert copied == load_sacc_file(path)[0]
+    assert sacc_data == load_sacc_file(path)[0]
+
+
+def test_load_sacc_file_and_content_compressed_and_invalid(tmp_path):
+    path = "./examples/cosmic_shear/cosmicshear_sacc.fits"
+    compressed = tmp_path / "cosmicshear_sacc.fits.gz"
+    with open(path, "rb") as file:
+        compressed.write_bytes(gzip.compress(file.read()))
+    sacc_data, detected_format, content, _ = load_sacc_file_and_content(str(compressed),
+                                                                        lazy_covariance=True)
+    # the compressed content is returned, the sacc is parsed from the decompressed one
+    assert content == compressed.read_bytes()
+    assert detected_format == 'fits'
+    assert sacc_data == load_sacc_file(path)[0]
+
+    with pytest.raises(ValueError, match="Cannot load SACC file"):
+        load_sacc_file_and_content(str(tmp_path / "missing.fits"))
+    not_sacc = tmp_path / "not_sacc.fits"
+    not_sacc.write_bytes(b"neither fits nor hdf5")
+    with pytest.raises(ValueError, match="neither a FITS nor an HDF5"):
+        load_sacc_file_and_content(str(not_sacc))
+    corrupted = tmp_path / "corrupted.hdf5"
+    with open("./examples/cosmic_shear/cosmicshear_sacc.hdf5", "rb") as file:
+        corrupted.write_bytes(file.read()[:1000])
+    with pytest.raises(ValueError, match="as HDF5"):
+        load_sacc_file_and_content(str(corrupted))
+    newer = _newer_sacc_file(tmp_path, "fits")
+    with pytest.raises(ValueError, match="version"):
+        load_sacc_file_and_content(newer, lazy_covariance=True)